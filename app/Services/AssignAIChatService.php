@@ -250,7 +250,9 @@ protected function callChat(
                 $payload['previous_merged_constraints'] = $previousMerged;
             }
 
+            // Tell the NLP service when we stop waiting, so it drops work we would discard
             $response = Http::timeout($this->timeout)
+                ->withHeaders(['X-Request-Timeout' => (string) $this->timeout])
                 ->post("{$this->nlpUrl}/chat", $payload);
 
             if ($response->successful()) {
@@ -0,0 +1,199 @@
+"""
+Inference Autotuner
+===================
+Measures, on the host it runs on, which inference settings serve the
+single-turn prompts in tests/test_cases.json best, and writes the choice to
+autotune.json for the service to pick up at startup.
+
+  1. beams      exact match of adaptive parsing with NLP_NUM_BEAMS = 4, 2, 1;
+                the fewest beams within --max-drop of 4 beams are kept
+                (beams only cost time when a greedy parse fails validation)
+  2. in-process every torch thread count (powers of two up to the core
+                count) × micro-batch size
+  3. pool       every inference pool size (NLP_INFERENCE_WORKERS, powers of
+                two up to the core count) × micro-batch size, with
+                CPUs / workers threads each
+
+Each configuration parses the prompts from --clients concurrent threads and
+records throughput and p50 / p95 latency.  Configurations that no other
+beats on both throughput and p95 form the Pareto front; the chosen one is
+the fastest on the front whose p95 stays within --max-p95-ms (default:
+twice the best p95 measured).
+
+autotune.json records the model fingerprint and the host (CPU model, core
+count, torch version); the service ignores it after a retrain or on other
+hardware, so re-running this script is the only step needed after either.
+Explicit NLP_* environment variables always override the tuned values.
+
+Usage:
+  python autotune.py
+  python autotune.py --clients 32 --max-p95-ms 400
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from quantize_gate import TEST_CASES, exact_match
+from semantic_parser import TUNED_FILE, SemanticParser, host_fingerprint
+
+DEFAULT_MAX_DROP = 0.02     # exact-match points fewer beams may lose
+DEFAULT_CLIENTS  = 16
+BATCH_SIZES      = (1, 4, 8, 16)
+BEAMS            = (4, 2, 1)
+
+
+def _powers_of_two(limit: int) -> List[int]:
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    if values[-1] != limit:
+        values.append(limit)
+    return values
+
+
+def measure(parser: SemanticParser, prompts: List[str], clients: int) -> Dict[str, float]:
+    """Throughput and latency of the model under `clients` concurrent callers (caches cleared)."""
+    def timed(text):
+        start = time.perf_counter()
+        parser._parse_t5(text)
+        return (time.perf_counter() - start) * 1000
+
+    parser._parse_t5(prompts[0])        # settle the new configuration, not timed
+    parser.clear_caches()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = sorted(pool.map(timed, prompts))
+    wall_s = time.perf_counter() - start
+    return {
+        "throughput_rps": round(len(prompts) / wall_s, 2),
+        "p50_ms":         round(statistics.median(latencies), 1),
+        "p95_ms":         round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+    }
+
+
+def choose_beams(parser: SemanticParser, cases: List[Dict], max_drop: float) -> Dict[str, Any]:
+    accuracy = {}
+    for beams in BEAMS:
+        parser._num_beams = beams
+        parser.clear_caches()
+        matches = sum(exact_match(parser._parse_t5(c["input"]), c["expected_output"]) for c in cases)
+        accuracy[beams] = round(matches / len(cases), 4)
+        print(f"   {beams} beam(s): exact match {accuracy[beams]:.1%}")
+    chosen = min(b for b in BEAMS if accuracy[b] >= accuracy[BEAMS[0]] - max_drop)
+    parser._num_beams = chosen
+    return {"chosen": chosen, "exact_match": accuracy}
+
+
+def pareto_front(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Points no other point beats on throughput and p95 at once, fastest first."""
+    def dominated(p):
+        return any(q["throughput_rps"] >= p["throughput_rps"] and q["p95_ms"] <= p["p95_ms"]
+                   and (q["throughput_rps"], q["p95_ms"]) != (p["throughput_rps"], p["p95_ms"])
+                   for q in points)
+
+    return sorted((p for p in points if not dominated(p)), key=lambda p: -p["throughput_rps"])
+
+
+def sweep(parser: SemanticParser, prompts: List[str], clients: int, cpus: int) -> List[Dict[str, Any]]:
+    import torch
+
+    points = []
+
+    def record(settings: Dict[str, Any]):
+        point = {"settings": settings, **measure(parser, prompts, clients)}
+        points.append(point)
+        print(f"   {json.dumps(settings):90s} {point['throughput_rps']:7.1f} req/s "
+              f"p50 {point['p50_ms']:7.1f}ms p95 {point['p95_ms']:7.1f}ms")
+
+    def each_batch_size(base: Dict[str, Any]):
+        for batch in BATCH_SIZES:
+            parser.disable_batching()
+            if batch > 1:
+                parser.enable_batching(max_batch_size=batch)
+            record({**base, "NLP_BATCHING": batch > 1, "NLP_BATCH_MAX_SIZE": batch})
+        parser.disable_batching()
+
+    default_threads = torch.get_num_threads()
+    for threads in _powers_of_two(cpus):
+        torch.set_num_threads(threads)
+        each_batch_size({"NLP_INFERENCE_WORKERS": 0, "NLP_TORCH_THREADS": threads})
+    torch.set_num_threads(default_threads)
+
+    for workers in _powers_of_two(cpus)[1:]:
+        threads = max(1, cpus // workers)
+        if parser.enable_pool(workers=workers, threads=threads) is None:
+            break
+        try:
+            each_batch_size({"NLP_INFERENCE_WORKERS": workers, "NLP_INFERENCE_WORKER_THREADS": threads})
+        finally:
+            parser.disable_pool()
+    return points
+
+
+def run_autotune(max_drop: float = DEFAULT_MAX_DROP, clients: int = DEFAULT_CLIENTS,
+                 max_p95_ms: Optional[float] = None, out: Path = TUNED_FILE) -> Dict[str, Any]:
+    print("=" * 60)
+    print("AssignAI  inference autotune")
+    print("=" * 60)
+
+    cases = [
+        tc for tc in json.loads(TEST_CASES.read_text(encoding="utf-8"))
+        if tc.get("type") != "multi_turn" and "expected_output" in tc
+    ]
+    parser = SemanticParser(defer_load=True)
+    if not parser.load():
+        raise RuntimeError("Fine-tuned T5 not available — run: python fine_tune_semantic.py")
+    cpus = os.cpu_count() or 1
+
+    print(f"\n Beams ({len(cases)} cases, max drop {max_drop:.1%})…")
+    beams = choose_beams(parser, cases, max_drop)
+
+    print(f"\n Throughput / latency ({len(cases)} prompts, {clients} clients, {cpus} cores)…")
+    points = sweep(parser, [c["input"] for c in cases], clients, cpus)
+    for point in points:
+        point["settings"]["NLP_NUM_BEAMS"] = beams["chosen"]
+
+    front = pareto_front(points)
+    budget = max_p95_ms if max_p95_ms is not None else 2 * min(p["p95_ms"] for p in points)
+    chosen = next((p for p in front if p["p95_ms"] <= budget), front[-1])
+
+    result = {
+        "model_version": parser.model_version,
+        "host":          host_fingerprint(),
+        "created_at":    time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "clients":       clients,
+        "max_p95_ms":    budget,
+        "beams":         beams,
+        "settings":      chosen["settings"],
+        "chosen":        chosen,
+        "pareto_front":  front,
+        "points":        points,
+    }
+    out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+    print(f"\n Pareto front (throughput vs p95):")
+    for p in front:
+        mark = "→" if p is chosen else " "
+        print(f"  {mark} {p['throughput_rps']:7.1f} req/s  p95 {p['p95_ms']:7.1f}ms  {json.dumps(p['settings'])}")
+    print(f"\n Chosen within p95 ≤ {budget:.0f}ms → {out}")
+    print("   The service applies it at startup; NLP_* variables still override it")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune threads, workers, batch size and beams on this host")
+    parser.add_argument("--max-drop", type=float, default=DEFAULT_MAX_DROP,
+                        help="Largest exact-match drop fewer beams may cause (absolute, 0.02 = 2 points)")
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS, help="Concurrent callers while measuring")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="Latency budget for the chosen configuration (default: 2x the best p95)")
+    args = parser.parse_args()
+    run_autotune(args.max_drop, args.clients, args.max_p95_ms)
+    sys.exit(0)
@@ -0,0 +1,190 @@
+"""
+Startup Benchmark
+=================
+Import time, load time and per-worker memory for three ways of running N
+workers:
+
+  read      every worker imports torch and reads the weights
+            (uvicorn main:app --workers N)
+  mmap      every worker imports torch and maps the weights
+            (NLP_MMAP_WEIGHTS=1 uvicorn main:app --workers N)
+  prefork   one process imports and maps, then forks N workers
+            (python serve_prefork.py --workers N)
+
+Each worker switches to T5 and runs one parse, so the weights are really
+touched, then waits while it is measured:
+
+  uss   memory only this worker holds — what one more worker costs
+  pss   its proportional share of everything it maps
+  rss   what top shows (shared pages counted again in every worker)
+
+total_pss sums every process involved (the prefork parent included) and is
+the real footprint of the whole setup.  The weights are usually already in
+the page cache after the first mode, so load times are warm-cache numbers.
+
+Usage:
+  python benchmark_startup.py
+  python benchmark_startup.py --workers 4 --out startup_benchmark.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import psutil
+
+PROBE = "2 from CCE and 1 from CTE, girls first"
+MODES = ("read", "mmap", "prefork")
+
+
+def _import_and_load(mmap_weights: bool) -> Tuple[Any, float, float]:
+    start = time.perf_counter()
+    import torch, transformers                              # noqa: F401,E401
+    from semantic_parser import SemanticParser
+    imported = time.perf_counter()
+    parser = SemanticParser(defer_load=True, mmap_weights=mmap_weights)
+    if not parser.preload():
+        raise RuntimeError("Fine-tuned T5 not available — run: python fine_tune_semantic.py")
+    loaded = time.perf_counter()
+    return parser, imported - start, loaded - imported
+
+
+def _touch(parser):
+    parser.load()
+    parser.parse(PROBE)
+
+
+def _memory(pid: int) -> Dict[str, float]:
+    info = psutil.Process(pid).memory_full_info()
+    return {
+        "uss_mb": info.uss / 1e6,
+        "pss_mb": getattr(info, "pss", info.uss) / 1e6,
+        "rss_mb": info.rss / 1e6,
+    }
+
+
+def _summarize(mode: str, workers: List[Dict], extra_pss_mb: float = 0.0, **timings) -> Dict[str, Any]:
+    """Per-worker means; timings measured once (prefork) override the workers' own."""
+    def mean(key):
+        return round(statistics.fmean(w[key] for w in workers), 3)
+
+    out = {"mode": mode, "workers": len(workers)}
+    for key in ("import_s", "load_s"):
+        out[key] = round(timings.pop(key), 3) if key in timings else mean(key)
+    out.update({k: round(v, 3) for k, v in timings.items()})
+    out.update({key: mean(key) for key in ("uss_mb", "pss_mb", "rss_mb")})
+    out["total_pss_mb"] = round(sum(w["pss_mb"] for w in workers) + extra_pss_mb, 1)
+    return out
+
+
+def run_independent(mode: str, n: int) -> Dict[str, Any]:
+    """N separate interpreters that each import and load, like uvicorn --workers N."""
+    procs = [
+        subprocess.Popen([sys.executable, __file__, "--worker", mode], cwd=Path(__file__).parent,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(n)
+    ]
+    workers = []
+    try:
+        for proc in procs:
+            line = proc.stdout.readline()
+            if not line:
+                raise RuntimeError(f"{mode} worker {proc.pid} exited during startup")
+            workers.append({**json.loads(line), **_memory(proc.pid)})
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+    return _summarize(mode, workers)
+
+
+def run_prefork(n: int) -> Dict[str, Any]:
+    """Load once here, gc.freeze(), fork N workers (serve_prefork.py's recipe)."""
+    gc.disable()
+    parser, import_s, load_s = _import_and_load(mmap_weights=True)
+    gc.freeze()
+
+    children: List[Tuple[int, int]] = []
+    start = time.perf_counter()
+    for _ in range(n):
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            gc.enable()
+            _touch(parser)
+            os.write(ready_w, b"1")
+            signal.pause()
+            os._exit(0)
+        os.close(ready_w)
+        children.append((pid, ready_r))
+    fork_s = (time.perf_counter() - start) / n
+
+    workers = []
+    try:
+        for pid, ready_r in children:
+            os.read(ready_r, 1)
+            os.close(ready_r)
+            workers.append(_memory(pid))
+        parent_pss = _memory(os.getpid())["pss_mb"]
+    finally:
+        for pid, _ in children:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        gc.unfreeze()
+        gc.enable()
+    return _summarize("prefork", workers, extra_pss_mb=parent_pss,
+                      import_s=import_s, load_s=load_s, fork_s=fork_s)
+
+
+def _worker(mode: str):
+    """Child side of run_independent: report timings, then stay alive until stdin closes."""
+    report, sys.stdout = sys.stdout, sys.stderr     # the parser's own prints go to stderr
+    parser, import_s, load_s = _import_and_load(mmap_weights=(mode == "mmap"))
+    _touch(parser)
+    print(json.dumps({"import_s": import_s, "load_s": load_s}), file=report, flush=True)
+    sys.stdin.read()
+
+
+def run(n: int, modes=MODES, out: Path = None) -> List[Dict[str, Any]]:
+    print("=" * 60)
+    print(f"AssignAI  startup benchmark ({n} workers)")
+    print("=" * 60)
+
+    results = []
+    for mode in modes:
+        print(f"\n Starting {n} '{mode}' workers…")
+        if mode == "prefork":
+            results.append(run_prefork(n))
+        else:
+            results.append(run_independent(mode, n))
+
+    print(f"\n {'mode':8s} {'import':>8s} {'load':>8s} {'uss/wkr':>9s} {'pss/wkr':>9s} {'rss/wkr':>9s} {'total':>9s}")
+    for r in results:
+        print(f" {r['mode']:8s} {r['import_s']:7.2f}s {r['load_s']:7.2f}s {r['uss_mb']:7.1f}MB"
+              f" {r['pss_mb']:7.1f}MB {r['rss_mb']:7.1f}MB {r['total_pss_mb']:7.1f}MB")
+    if out:
+        out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n Results → {out}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare worker startup time and memory across loading modes")
+    parser.add_argument("--workers", type=int, default=4, help="Workers per mode")
+    parser.add_argument("--modes",   nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--out",     type=Path, default=None, help="Write the results as JSON")
+    parser.add_argument("--worker",  choices=MODES[:2], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        _worker(args.worker)
+    else:
+        run(args.workers, args.modes, args.out)
@@ -0,0 +1,265 @@
+"""
+Constrained Decoding
+====================
+Schema-guided generation for the "parse constraint:" task.
+
+The fine-tuned T5 emits `json.dumps(schema)` from generate_semantic_data.py
+(", " / ": " separators, fixed key order, null fields omitted).  Split on
+spaces, every such label is a sequence of *words* drawn from a small regular
+grammar:
+
+  {"groups":  [{"count":  2,  "gender":  "F"}],  "global":  {"conflict_ok":  false}}
+
+ConstraintGrammar enumerates that grammar once per tokenizer, tokenizes each
+word (T5's Metaspace pre-tokenizer splits on spaces, so per-word token ids
+concatenate to exactly the ids of the whole label) and stores the words
+allowed in each grammar state as a token trie.  SchemaLogitsProcessor then
+masks every decoder step to the tokens the trie allows:
+
+  - structural tokens (braces, brackets, key names) have a single legal
+    continuation, so they are forced rather than chosen
+  - values can only be schema values (VALID_COLLEGES, M/F, new/old, …)
+  - EOS is only legal once the JSON object is closed
+
+The output is valid JSON by construction, so greedy decoding is safe and no
+repair pass is needed.  Because T5's vocab has no braces (they decode to
+<unk> and vanish under skip_special_tokens), the text is rebuilt from the
+chosen words rather than from tokenizer.decode.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from transformers import LogitsProcessor
+
+MAX_GROUPS = 6
+MAX_COUNT  = 50
+
+GROUP_FIELDS  = ("count", "college", "gender", "new_old", "height_min", "height_max")
+GLOBAL_FIELDS = ("conflict_ok", "priority_rules", "height_rule")
+
+END = ("end",)
+
+
+def _q(value: str) -> str:
+    return f'"{value}"'
+
+
+class _Node:
+    __slots__ = ("children", "word", "next_state", "allowed")
+
+    def __init__(self):
+        self.children: Dict[int, "_Node"] = {}
+        self.word: Optional[str] = None           # set when a word ends here
+        self.next_state: Optional[Tuple] = None
+        self.allowed: Optional[List[int]] = None
+
+
+class Cursor(NamedTuple):
+    """Position in the grammar: completed words, current state, trie node."""
+    words: Tuple[str, ...]
+    state: Tuple
+    node: _Node
+
+
+class ConstraintGrammar:
+    """
+    Word-level grammar of parse outputs, compiled to one token trie per state.
+
+    Args:
+        tokenizer: the service's T5 tokenizer (only used during construction).
+        colleges / genders / new_old / priority_rules / height_rules:
+            allowed values, normally the VALID_* sets from semantic_parser.
+    """
+
+    def __init__(self, tokenizer, colleges, genders, new_old, priority_rules, height_rules):
+        self.eos_token_id = tokenizer.eos_token_id
+        self._values = {
+            "count":      [str(n) for n in range(1, MAX_COUNT + 1)],
+            "college":    [_q(v) for v in sorted(colleges)],
+            "gender":     [_q(v) for v in sorted(genders)],
+            "new_old":    [_q(v) for v in sorted(new_old)],
+            "height_min": [str(n) for n in range(100, 251)],
+            "height_max": [str(n) for n in range(100, 251)],
+            "conflict_ok": ["true", "false"],
+            "height_rule": [_q(v) for v in sorted(height_rules)],
+        }
+        self._rules = sorted(priority_rules)
+
+        # Enumerate every reachable state, then tokenize all words in one call
+        self._edges: Dict[Tuple, List[Tuple[str, Tuple]]] = {}
+        pending = [("start",)]
+        while pending:
+            state = pending.pop()
+            if state in self._edges or state == END:
+                continue
+            self._edges[state] = self._words(state)
+            pending.extend(nxt for _, nxt in self._edges[state])
+
+        vocab = sorted({word for edges in self._edges.values() for word, _ in edges})
+        ids = tokenizer(vocab, add_special_tokens=False)["input_ids"]
+        self._word_ids = dict(zip(vocab, ids))
+
+        self._roots: Dict[Tuple, _Node] = {state: self._build_trie(edges)
+                                           for state, edges in self._edges.items()}
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def start(self) -> Cursor:
+        return Cursor((), ("start",), self._roots[("start",)])
+
+    def advance(self, cursor: Cursor, token_id: int) -> Optional[Cursor]:
+        """Cursor after consuming token_id, or None if the token is illegal."""
+        words, state, node = cursor
+        if token_id in node.children:
+            return Cursor(words, state, node.children[token_id])
+        if node.word is not None and node.next_state != END:
+            # The current word is complete; token_id must start the next one
+            root = self._roots[node.next_state]
+            if token_id in root.children:
+                return Cursor(words + (node.word,), node.next_state, root.children[token_id])
+        return None
+
+    def allowed(self, cursor: Cursor) -> List[int]:
+        node = cursor.node
+        if node.allowed is None:
+            allowed = list(node.children)
+            if node.word is not None:
+                if node.next_state == END:
+                    allowed.append(self.eos_token_id)
+                else:
+                    allowed.extend(self._roots[node.next_state].children)
+            node.allowed = allowed
+        return node.allowed
+
+    def text(self, token_ids: Sequence[int]) -> str:
+        """
+        Rebuild the JSON text for generated token ids (decoder start token
+        excluded).  Stops at EOS; a truncated output yields the words so far.
+        """
+        cursor = self.start()
+        for token_id in token_ids:
+            if token_id == self.eos_token_id:
+                break
+            nxt = self.advance(cursor, token_id)
+            if nxt is None:
+                break
+            cursor = nxt
+        words = cursor.words + ((cursor.node.word,) if cursor.node.word is not None else ())
+        return " ".join(words)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Internal
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _build_trie(self, edges: List[Tuple[str, Tuple]]) -> _Node:
+        root = _Node()
+        for word, nxt in edges:
+            node = root
+            for token_id in self._word_ids[word]:
+                node = node.children.setdefault(token_id, _Node())
+            if node.word is None:
+                node.word, node.next_state = word, nxt
+        return root
+
+    def _words(self, state: Tuple) -> List[Tuple[str, Tuple]]:
+        """(word, next state) pairs legal in `state`."""
+        kind = state[0]
+
+        if kind == "start":
+            return [
+                ('{"groups":',       ("group_key", 0, "[{", 1)),
+                ('{"global":',       ("global_key", 0, "{")),
+                ('{"is_confirming":', ("confirm",)),
+                ("{}",               END),
+            ]
+
+        if kind == "group_key":
+            _, first, prefix, n = state
+            return [(f'{prefix}"{field}":', ("group_value", i, n))
+                    for i, field in enumerate(GROUP_FIELDS) if i >= first]
+
+        if kind == "group_value":
+            _, i, n = state
+            tails = []
+            if i + 1 < len(GROUP_FIELDS):
+                tails.append((",", ("group_key", i + 1, "", n)))
+            if n < MAX_GROUPS:
+                tails.append(("},", ("group_key", 0, "{", n + 1)))
+            tails += [("}],", ("after_groups",)), ("}]}", END)]
+            return [(value + tail, nxt) for value in self._values[GROUP_FIELDS[i]] for tail, nxt in tails]
+
+        if kind == "after_groups":
+            return [('"global":', ("global_key", 0, "{")), ('"is_confirming":', ("confirm",))]
+
+        if kind == "global_key":
+            _, first, prefix = state
+            out = []
+            for i, field in enumerate(GLOBAL_FIELDS):
+                if i < first:
+                    continue
+                nxt = ("rules", frozenset()) if field == "priority_rules" else ("global_value", i)
+                out.append((f'{prefix}"{field}":', nxt))
+            return out
+
+        if kind == "global_value":
+            _, i = state
+            tails = [("},", ("after_global",)), ("}}", END)]
+            if i + 1 < len(GLOBAL_FIELDS):
+                tails.append((",", ("global_key", i + 1, "")))
+            return [(value + tail, nxt) for value in self._values[GLOBAL_FIELDS[i]] for tail, nxt in tails]
+
+        if kind == "rules":
+            used = state[1]
+            opener = "" if used else "["
+            out = []
+            for rule in self._rules:
+                if rule in used:
+                    continue
+                remaining = len(self._rules) - len(used) - 1
+                tails = [("],", ("global_key", 2, "")), ("]},", ("after_global",)), ("]}}", END)]
+                if remaining:
+                    tails.append((",", ("rules", used | {rule})))
+                out += [(opener + _q(rule) + tail, nxt) for tail, nxt in tails]
+            return out
+
+        if kind == "after_global":
+            return [('"is_confirming":', ("confirm",))]
+
+        if kind == "confirm":
+            return [("true}", END)]
+
+        raise ValueError(f"Unknown grammar state {state!r}")
+
+
+class SchemaLogitsProcessor(LogitsProcessor):
+    """
+    Masks decoder logits to the grammar's legal next tokens, row by row.
+    Rows that already emitted EOS (or left the grammar) are left untouched.
+    One instance per generate() call; cursors are memoized by prefix so each
+    step only advances the trie by one token.
+    """
+
+    def __init__(self, grammar: ConstraintGrammar):
+        self.grammar = grammar
+        self._cursors: Dict[Tuple[int, ...], Optional[Cursor]] = {(): grammar.start()}
+
+    def _cursor(self, prefix: Tuple[int, ...]) -> Optional[Cursor]:
+        if prefix not in self._cursors:
+            parent = self._cursor(prefix[:-1])
+            self._cursors[prefix] = None if parent is None else self.grammar.advance(parent, prefix[-1])
+        return self._cursors[prefix]
+
+    def __call__(self, input_ids, scores):
+        import torch
+
+        mask = torch.full_like(scores, float("-inf"))
+        for row, ids in enumerate(input_ids.tolist()):
+            prefix = tuple(ids[1:])                 # drop the decoder start token
+            cursor = None if self.grammar.eos_token_id in prefix else self._cursor(prefix)
+            if cursor is None:
+                mask[row] = 0
+            else:
+                mask[row, self.grammar.allowed(cursor)] = 0
+        return scores + mask
@@ -0,0 +1,318 @@
+"""
+Conversation State Store
+========================
+Server-side merged constraint state, keyed by conversation id.
+
+Without it, a /chat turn that arrives without `previous_merged_constraints`
+re-parses every earlier user turn, so a conversation's total T5 cost grows
+quadratically with its length.  With a store, each turn costs one parse plus
+one merge: the merged state is read by `conversation_id`, the new turn is
+merged in, and the result is written back.
+
+Backends (NLP_STATE_BACKEND):
+
+  memory   in-process LRU with TTL (default; one service node)
+  sqlite   local SQLite file, shared by the workers of one host
+  redis    any server speaking the Redis protocol (RESP), shared by nodes
+  none     disabled
+
+Stores never raise into the request path: a backend failure is counted,
+logged, and treated as a miss, so /chat falls back to the history re-parse.
+"""
+
+import json
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from inference_cache import MISSING, LRUCache
+from service_config import env_float, env_int, env_str
+
+DEFAULT_TTL_S       = 24 * 3600.0
+DEFAULT_MAX_SIZE    = 10_000
+DEFAULT_SQLITE_PATH = Path(__file__).parent / "conversation_state.db"
+DEFAULT_REDIS_URL   = "redis://localhost:6379/0"
+REDIS_KEY_PREFIX    = "assignai:conversation:"
+
+
+class ConversationStore:
+    """
+    Base class: JSON-serializable state per conversation id.
+    Subclasses implement _get / _put / _delete; counters live here.
+    """
+
+    backend = "none"
+
+    def __init__(self, ttl_s: Optional[float] = DEFAULT_TTL_S):
+        self.ttl_s = ttl_s if ttl_s and ttl_s > 0 else None
+        self._lock = threading.Lock()
+        self.hits   = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ConversationStore"]:
+        backend = env_str("NLP_STATE_BACKEND", "memory").lower()
+        ttl_s   = env_float("NLP_STATE_TTL_S", DEFAULT_TTL_S)
+        if backend == "none":
+            return None
+        if backend == "sqlite":
+            return SqliteConversationStore(env_str("NLP_STATE_SQLITE_PATH", str(DEFAULT_SQLITE_PATH)), ttl_s)
+        if backend == "redis":
+            return RedisConversationStore(env_str("NLP_STATE_REDIS_URL", DEFAULT_REDIS_URL), ttl_s)
+        if backend != "memory":
+            print(f"[ConversationStore] Unknown NLP_STATE_BACKEND={backend!r}, using memory")
+        return MemoryConversationStore(env_int("NLP_STATE_MAX_SIZE", DEFAULT_MAX_SIZE), ttl_s)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """The stored state, or None (missing, expired, corrupt, or backend error)."""
+        try:
+            raw = self._get(conversation_id)
+            state = None if raw is None else json.loads(raw)
+        except Exception as e:
+            self._record_error("get", e)
+            return None
+        with self._lock:
+            if state is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return state
+
+    def put(self, conversation_id: str, state: Dict[str, Any]):
+        try:
+            self._put(conversation_id, json.dumps(state))
+        except Exception as e:
+            self._record_error("put", e)
+            return
+        with self._lock:
+            self.writes += 1
+
+    def delete(self, conversation_id: str):
+        try:
+            self._delete(conversation_id)
+        except Exception as e:
+            self._record_error("delete", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend":   self.backend,
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "writes":    self.writes,
+                "errors":    self.errors,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        pass
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Internal
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _record_error(self, op: str, error: Exception):
+        with self._lock:
+            self.errors += 1
+        print(f"[ConversationStore] {self.backend} {op} failed ({error})")
+
+    def _get(self, conversation_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _put(self, conversation_id: str, value: str):
+        raise NotImplementedError
+
+    def _delete(self, conversation_id: str):
+        raise NotImplementedError
+
+
+class MemoryConversationStore(ConversationStore):
+    """In-process LRU; state is lost on restart and not shared between workers."""
+
+    backend = "memory"
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl_s: Optional[float] = DEFAULT_TTL_S):
+        super().__init__(ttl_s)
+        self._cache = LRUCache(max_size=max_size, ttl_s=self.ttl_s)
+
+    def _get(self, conversation_id: str) -> Optional[str]:
+        value = self._cache.get(conversation_id)
+        return None if value is MISSING else value
+
+    def _put(self, conversation_id: str, value: str):
+        self._cache.put(conversation_id, value)
+
+    def _delete(self, conversation_id: str):
+        self._cache.discard(conversation_id)
+
+    def stats(self) -> Dict[str, Any]:
+        out = super().stats()
+        out["size"] = len(self._cache)
+        return out
+
+
+class SqliteConversationStore(ConversationStore):
+    """Single-file store; WAL mode lets several worker processes share it."""
+
+    backend = "sqlite"
+    PURGE_EVERY = 256       # writes between expired-row sweeps
+
+    def __init__(self, path: str = str(DEFAULT_SQLITE_PATH), ttl_s: Optional[float] = DEFAULT_TTL_S):
+        super().__init__(ttl_s)
+        self.path = path
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_state ("
+            " conversation_id TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL)"
+        )
+        self._db.commit()
+        self._since_purge = 0
+
+    def _get(self, conversation_id: str) -> Optional[str]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT state FROM conversation_state"
+                " WHERE conversation_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (conversation_id, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _put(self, conversation_id: str, value: str):
+        expires_at = time.time() + self.ttl_s if self.ttl_s else None
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO conversation_state (conversation_id, state, expires_at)"
+                " VALUES (?, ?, ?)",
+                (conversation_id, value, expires_at),
+            )
+            self._since_purge += 1
+            if self._since_purge >= self.PURGE_EVERY:
+                self._db.execute("DELETE FROM conversation_state WHERE expires_at <= ?", (time.time(),))
+                self._since_purge = 0
+            self._db.commit()
+
+    def _delete(self, conversation_id: str):
+        with self._db_lock:
+            self._db.execute("DELETE FROM conversation_state WHERE conversation_id = ?", (conversation_id,))
+            self._db.commit()
+
+    def close(self):
+        with self._db_lock:
+            self._db.close()
+
+
+class RedisConversationStore(ConversationStore):
+    """
+    Minimal RESP client (GET / SET PX / DEL) over one persistent socket, so
+    any Redis-compatible server works without the redis package.  A dropped
+    connection is re-opened once per command.
+
+    Args:
+        url: redis://[:password@]host:port/db
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str = DEFAULT_REDIS_URL, ttl_s: Optional[float] = DEFAULT_TTL_S,
+                 timeout_s: float = 0.5):
+        super().__init__(ttl_s)
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db   = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.timeout_s = timeout_s
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._conn_lock = threading.Lock()
+
+    def _get(self, conversation_id: str) -> Optional[str]:
+        value = self._command("GET", REDIS_KEY_PREFIX + conversation_id)
+        return None if value is None else value.decode()
+
+    def _put(self, conversation_id: str, value: str):
+        args = ["SET", REDIS_KEY_PREFIX + conversation_id, value]
+        if self.ttl_s:
+            args += ["PX", str(int(self.ttl_s * 1000))]
+        self._command(*args)
+
+    def _delete(self, conversation_id: str):
+        self._command("DEL", REDIS_KEY_PREFIX + conversation_id)
+
+    def close(self):
+        with self._conn_lock:
+            self._disconnect()
+
+    # ── RESP ────────────────────────────────────────────────────────────────
+
+    def _command(self, *args: str) -> Any:
+        with self._conn_lock:
+            for attempt in (0, 1):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._roundtrip(args)
+                except (OSError, ConnectionError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout_s)
+        self._reader = self._sock.makefile("rb")
+        if self.password:
+            self._roundtrip(("AUTH", self.password))
+        if self.db:
+            self._roundtrip(("SELECT", str(self.db)))
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def _roundtrip(self, args) -> Any:
+        parts: List[bytes] = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg.encode() if isinstance(arg, str) else arg
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Redis error: {body.decode()}")
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"unexpected RESP reply {line!r}")
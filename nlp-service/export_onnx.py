@@ -0,0 +1,66 @@
+"""
+Export the fine-tuned T5 to ONNX
+================================
+Converts the current fine-tuned model (see model_registry.py) into ONNX Runtime graphs for the CPU-friendly
+inference backend:
+
+  encoder_model.onnx            encoder, run once per request
+  decoder_model.onnx            first decoder step (no past key/values)
+  decoder_with_past_model.onnx  every later step, reusing the KV cache
+
+Usage:
+  python export_onnx.py
+  python export_onnx.py --version v0003-1a2b3c4d --out semantic_model_onnx
+
+Then start the service with the ONNX backend:
+  NLP_INFERENCE_BACKEND=onnx uvicorn main:app --port 8001
+
+Notes:
+  - Requires the optional extras: pip install -r requirements-onnx.txt
+  - Re-run after every fine-tune; the service falls back to PyTorch when
+    the export was made from a different model version.
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Optional
+
+from model_registry import resolve_model
+from semantic_parser import ONNX_DIR, ONNX_MANIFEST
+
+
+def export(version: Optional[str] = None, out_dir: Path = ONNX_DIR):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    print("=" * 60)
+    print("AssignAI  T5 → ONNX export")
+    print("=" * 60)
+
+    source = resolve_model(version)
+    model_dir = source.model_dir
+    if not model_dir.exists():
+        raise FileNotFoundError(
+            f"Fine-tuned model not found at {model_dir}\n"
+            "Run: python fine_tune_semantic.py"
+        )
+
+    print(f"\n Exporting {source.name} from {model_dir} (encoder + decoder + decoder-with-past)…")
+    model = ORTModelForSeq2SeqLM.from_pretrained(str(model_dir), export=True, use_cache=True)
+    model.save_pretrained(str(out_dir))
+
+    manifest = {"source_model_version": source.version, "source_model": source.name}
+    (out_dir / ONNX_MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    for path in sorted(out_dir.glob("*.onnx")):
+        print(f"   {path.name:32s} {path.stat().st_size / 1e6:7.1f} MB")
+    print(f"\n Export complete → {out_dir}")
+    print("   Enable with: NLP_INFERENCE_BACKEND=onnx")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the fine-tuned T5 to ONNX")
+    parser.add_argument("--version", default=None, help="Registry version to export (default: CURRENT)")
+    parser.add_argument("--out",     type=Path, default=ONNX_DIR, help="Output directory for ONNX graphs")
+    args = parser.parse_args()
+    export(args.version, args.out)
@@ -0,0 +1,212 @@
+"""
+Rule Fast Path
+==============
+Deterministic parser for the short, high-frequency messages that make up a
+large share of /chat turns:
+
+  "yes"  "sige"  "go ahead"                → is_confirming
+  "3 volunteers"  "Need 5 people"          → one group with a count
+  "all female pls"  "From CCE"  "2 vets"   → one group with attributes
+  "girls first"  "no class conflicts"      → global rules
+
+The lexicon is compiled from the vocabulary generate_semantic_data.py trains
+T5 on (COLLEGES, GENDER_TERMS, NEW_TERMS, CONFIRM_PHRASES, PRIORITY_MAP,
+CONFLICT_*), so both parsers read the same words the same way.
+
+A message is answered only when *every* word is consumed by the lexicon and
+the result describes at most one group.  Anything else — an unknown word,
+"and", "except", "but", a second count, a height — returns None and is left
+to T5.
+"""
+
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from generate_semantic_data import (
+    COLLEGES, CONFIRM_PHRASES, CONFLICT_FALSE, CONFLICT_TRUE, GENDER_TERMS,
+    NEW_TERMS, PRIORITY_MAP, SLOT_VERBS,
+)
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "isa": 1, "dalawa": 2, "tatlo": 3, "apat": 4, "lima": 5,
+    "anim": 6, "pito": 7, "walo": 8, "siyam": 9, "sampu": 10,
+}
+EXTRA_VERBS   = ["need", "get", "want", "i need a", "we need"]
+PREPOSITIONS  = ["from", "mula sa", "taga"]
+FILLERS       = ["volunteer", "volunteers", "member", "members", "people", "person", "persons",
+                 "students", "tao", "only", "lang", "please", "pls", "po", "na", "just",
+                 "needed", "all", "now", "college"]
+CONFIRM_FILLERS = {"please", "pls", "po", "na", "now"}
+AMBIGUOUS_TERMS = {"it"}    # "IT" the program vs "it" the pronoun
+
+_ALLOWED_CHARS = re.compile(r"^[\w\s,.!?'-]*$")
+_WORD          = re.compile(r"[a-z0-9']+")
+_IRREGULAR     = {"freshman": "freshmen", "man": "men"}
+
+
+def _variants(term: str) -> List[str]:
+    """The term plus its plural (or singular) form, lowercased."""
+    term = term.lower()
+    *head, last = term.split()
+    forms = {term}
+    if last in _IRREGULAR:
+        forms.add(" ".join(head + [_IRREGULAR[last]]))
+    elif last.isalpha() and len(last) > 4 and last.endswith("s") and not last.endswith("ss"):
+        forms.add(" ".join(head + [last[:-1]]))
+    elif last.isalpha() and not last.endswith("s"):
+        forms.add(" ".join(head + [last + "s"]))
+    return sorted(forms)
+
+
+class RuleParser:
+    """
+    Longest-match phrase lexicon over normalized words.
+
+    parse() returns a raw schema dict (same shape as T5's labels, before
+    _validate) or None when the message needs the model.
+    """
+
+    def __init__(self):
+        self._lexicon: Dict[Tuple[str, ...], Tuple[str, Any]] = {}
+
+        for phrase in SLOT_VERBS + EXTRA_VERBS:
+            self._add(phrase, "verb", None)
+        for phrase in PREPOSITIONS:
+            self._add(phrase, "prep", None)
+        for phrase in FILLERS:
+            self._add(phrase, "filler", phrase)
+        for word, n in NUMBER_WORDS.items():
+            self._add(word, "count", n)
+        for code, terms in COLLEGES.items():
+            for term in terms:
+                for form in _variants(term):
+                    if form not in AMBIGUOUS_TERMS:
+                        self._add(form, "college", code)
+        for code, terms in GENDER_TERMS.items():
+            for term in terms:
+                for form in _variants(term):
+                    self._add(form, "gender", code)
+        for code, terms in NEW_TERMS.items():
+            for term in terms:
+                for form in _variants(term):
+                    self._add(form, "new_old", code)
+        # Multi-word rule phrases are added last so they win over their parts
+        for rule, phrases in PRIORITY_MAP.items():
+            for phrase in phrases:
+                self._add(phrase, "priority", rule)
+        for phrase in CONFLICT_FALSE:
+            self._add(phrase, "conflict_ok", False)
+        for phrase in CONFLICT_TRUE:
+            self._add(phrase, "conflict_ok", True)
+        for phrase in CONFIRM_PHRASES:
+            self._add(phrase, "confirm", True)
+
+        self._max_len = max(len(key) for key in self._lexicon)
+        self._lock = threading.Lock()
+        self.answered = 0
+        self.deferred = 0
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def parse(self, text: str) -> Optional[Dict[str, Any]]:
+        result = self._parse(text)
+        with self._lock:
+            if result is None:
+                self.deferred += 1
+            else:
+                self.answered += 1
+        return result
+
+    def answers(self, text: str) -> bool:
+        """Whether parse() would answer `text`, without counting it."""
+        return self._parse(text) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.answered + self.deferred
+            return {
+                "answered": self.answered,
+                "deferred": self.deferred,
+                "coverage": round(self.answered / total, 4) if total else 0.0,
+            }
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Internal
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _add(self, phrase: str, kind: str, value: Any):
+        words = tuple(_WORD.findall(phrase.lower().replace("-", " ")))
+        if words:
+            self._lexicon[words] = (kind, value)
+
+    def _tokenize(self, text: str) -> Optional[List[Tuple[str, Any]]]:
+        if not _ALLOWED_CHARS.match(text):
+            return None
+        words = _WORD.findall(text.lower().replace("-", " "))
+        items: List[Tuple[str, Any]] = []
+        i = 0
+        while i < len(words):
+            if words[i].isdigit():
+                if len(words[i]) > 3 or int(words[i]) == 0:
+                    return None
+                items.append(("count", int(words[i])))
+                i += 1
+                continue
+            for length in range(min(self._max_len, len(words) - i), 0, -1):
+                entry = self._lexicon.get(tuple(words[i:i + length]))
+                if entry is not None:
+                    items.append(entry)
+                    i += length
+                    break
+            else:
+                return None     # unknown word: not a message this engine understands
+        return items
+
+    def _parse(self, text: str) -> Optional[Dict[str, Any]]:
+        items = self._tokenize(text)
+        if not items:
+            return None
+
+        kinds = [kind for kind, _ in items]
+        if "confirm" in kinds:
+            # Pure confirmation ("yes", "sige na", "go ahead please") — nothing else allowed
+            if all(kind == "confirm" or (kind == "filler" and value in CONFIRM_FILLERS)
+                   for kind, value in items):
+                return {"is_confirming": True}
+            return None
+
+        group: Dict[str, Any] = {}
+        glob: Dict[str, Any] = {}
+        for pos, (kind, value) in enumerate(items):
+            if kind == "verb":
+                if pos != 0:
+                    return None
+            elif kind == "prep":
+                if pos + 1 >= len(items) or items[pos + 1][0] != "college":
+                    return None
+            elif kind in ("count", "college", "gender", "new_old"):
+                if group.get(kind, value) != value:
+                    return None     # two different values: a second group, or a contradiction
+                group[kind] = value
+            elif kind == "priority":
+                rules = glob.setdefault("priority_rules", [])
+                if value not in rules:
+                    rules.append(value)
+            elif kind == "conflict_ok":
+                if glob.get("conflict_ok", value) != value:
+                    return None
+                glob["conflict_ok"] = value
+
+        if not group and not glob:
+            return None
+        result: Dict[str, Any] = {}
+        if group:
+            result["groups"] = [group]
+        if glob:
+            result["global"] = glob
+        return result
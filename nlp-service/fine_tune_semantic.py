@@ -14,8 +14,10 @@ Usage:
   python fine_tune_semantic.py --epochs 5 --batch 16
 
 Output:
-  ./semantic_model/           fine-tuned T5 weights
-  ./semantic_tokenizer/       matching tokenizer
+  ./semantic_models/vNNNN-<hash>/   new registry version (weights, tokenizer,
+                                    manifest with content hash and training
+                                    metadata), made CURRENT unless --no-activate
+  A running service switches to it without a restart (see model_registry.py).
 
 Notes:
   - T5-small (60M params) trains in ~5 min on CPU with this dataset size.
@@ -27,6 +29,8 @@ import json
 import argparse
 import random
 import os
+import shutil
+import tempfile
 from pathlib import Path
 
 import torch
@@ -38,14 +42,14 @@ from transformers import (
 )
 from torch.optim import AdamW
 
+from model_registry import ModelRegistry, resolve_model
+
 # 
 # Config
 # 
 
 MODEL_NAME   = "t5-small"
 DATA_PATH    = Path(__file__).parent / "semantic_training_data.jsonl"
-MODEL_OUT    = Path(__file__).parent / "semantic_model"
-TOK_OUT      = Path(__file__).parent / "semantic_tokenizer"
 MAX_IN_LEN   = 128
 MAX_OUT_LEN  = 256
 VALID_SPLIT  = 0.1
@@ -119,17 +123,18 @@ def load_data():
 # Training
 # 
 
-def train(epochs: int = 3, batch_size: int = 8, lr: float = 3e-4):
+def train(epochs: int = 3, batch_size: int = 8, lr: float = 3e-4, activate: bool = True):
     print("=" * 60)
     print("AssignAI  Semantic Parser Fine-Tuning (T5-small)")
     print("=" * 60)
 
     # Load tokenizer + model (resume from checkpoint if available)
-    checkpoint_exists = MODEL_OUT.exists() and (MODEL_OUT / "model.safetensors").exists()
+    base = resolve_model()
+    checkpoint_exists = (base.model_dir / "model.safetensors").exists()
     if checkpoint_exists:
-        print(f"\n Resuming from checkpoint: {MODEL_OUT}")
-        tokenizer = T5TokenizerFast.from_pretrained(str(TOK_OUT))
-        model     = T5ForConditionalGeneration.from_pretrained(str(MODEL_OUT))
+        print(f"\n Resuming from checkpoint: {base.name} ({base.model_dir})")
+        tokenizer = T5TokenizerFast.from_pretrained(str(base.tok_dir))
+        model     = T5ForConditionalGeneration.from_pretrained(str(base.model_dir))
     else:
         print(f"\n Loading {MODEL_NAME} from HuggingFace")
         tokenizer = T5TokenizerFast.from_pretrained(MODEL_NAME)
@@ -169,8 +174,10 @@ def train(epochs: int = 3, batch_size: int = 8, lr: float = 3e-4):
         num_training_steps=total_steps,
     )
 
-    # Training loop
+    # Training loop; the best epoch is kept aside and published once at the end
     best_val_loss = float("inf")
+    best_em_pct   = None
+    best_dir      = Path(tempfile.mkdtemp(prefix="semantic-best-"))
     for epoch in range(1, epochs + 1):
         #  Train 
         model.train()
@@ -233,27 +240,35 @@ def train(epochs: int = 3, batch_size: int = 8, lr: float = 3e-4):
 
         if avg_val < best_val_loss:
             best_val_loss = avg_val
-            # Save to a temp dir first to avoid Windows file-lock errors
-            # when the live service has model.safetensors memory-mapped.
-            import tempfile, shutil
-            with tempfile.TemporaryDirectory(dir=MODEL_OUT.parent) as tmp:
-                tmp_model = Path(tmp) / "model"
-                tmp_tok   = Path(tmp) / "tok"
-                model.save_pretrained(tmp_model)
-                tokenizer.save_pretrained(tmp_tok)
-                # Atomic swap: remove old dirs, move new ones in
-                if MODEL_OUT.exists():
-                    shutil.rmtree(MODEL_OUT)
-                shutil.copytree(tmp_model, MODEL_OUT)
-                if TOK_OUT.exists():
-                    shutil.rmtree(TOK_OUT)
-                shutil.copytree(tmp_tok, TOK_OUT)
-            print(f"    Saved best model  {MODEL_OUT}")
+            best_em_pct   = em_pct
+            model.save_pretrained(best_dir / "model")
+            tokenizer.save_pretrained(best_dir / "tokenizer")
+            print(f"    Kept best epoch so far ({epoch})")
+
+    # The live service may have the current version's weights mapped, so a
+    # new version never overwrites it: it goes into its own directory and
+    # CURRENT is switched atomically
+    registry = ModelRegistry()
+    version = registry.publish(best_dir / "model", best_dir / "tokenizer", activate=activate, training={
+        "base":           base.name if checkpoint_exists else MODEL_NAME,
+        "epochs":         epochs,
+        "batch_size":     batch_size,
+        "lr":             lr,
+        "best_val_loss":  round(best_val_loss, 4),
+        "exact_match_pct": best_em_pct,
+        "train_size":     len(train_recs),
+        "val_size":       len(val_recs),
+    })
+    shutil.rmtree(best_dir, ignore_errors=True)
+    pruned = registry.prune()
 
     print("\n Fine-tuning complete!")
-    print(f"   Model: {MODEL_OUT}")
-    print(f"   Tokenizer: {TOK_OUT}")
+    print(f"   Version: {version.name}{' (CURRENT)' if activate else ''}")
+    print(f"   Model: {version.model_dir}")
+    print(f"   Tokenizer: {version.tok_dir}")
     print(f"   Best val loss: {best_val_loss:.4f}")
+    if pruned:
+        print(f"   Pruned old versions: {', '.join(pruned)}")
     print("\nTest it: python -c \"from semantic_parser import SemanticParser; "
           "p=SemanticParser(); print(p.parse('2 females from CCE and 1 male from CEE'))\"")
 
@@ -267,5 +282,7 @@ if __name__ == "__main__":
     parser.add_argument("--epochs", type=int,   default=3,    help="Training epochs (default 3)")
     parser.add_argument("--batch",  type=int,   default=8,    help="Batch size (default 8)")
     parser.add_argument("--lr",     type=float, default=3e-4, help="Learning rate (default 3e-4)")
+    parser.add_argument("--no-activate", action="store_true",
+                        help="Publish the new version without making it CURRENT")
     args = parser.parse_args()
-    train(epochs=args.epochs, batch_size=args.batch, lr=args.lr)
+    train(epochs=args.epochs, batch_size=args.batch, lr=args.lr, activate=not args.no_activate)
@@ -0,0 +1,216 @@
+"""
+Generation Limits
+=================
+Three ways of not paying for decoder steps whose output is thrown away.
+
+BalancedJsonStoppingCriteria (parse task)
+    Stops a row once its top-level JSON object has closed.  A malformed parse
+    often keeps going after the object is logically complete, and everything
+    after the final brace is ignored by the repair strategies anyway.
+
+    T5's vocab has no braces: "{" and "}" are emitted as <unk>, and runs like
+    "}}" collapse into a single <unk>.  Direction is inferred from context — an
+    <unk> at the start, or after ":", "[" or "," opens an object, anywhere
+    else it closes one.  Because one <unk> may close several objects, a
+    closing <unk> that is followed by anything but "," or "]" also ends the
+    object.
+
+OutputBudget (every task)
+    max_new_tokens derived from input length and the output lengths observed
+    so far, instead of fixed 256/128/150 ceilings:
+
+        budget(n) = clamp(headroom * (slope * n + q-quantile residual), floor, ceiling)
+
+    fitted by least squares over a sliding window of (input, output) token
+    counts.  Until `min_samples` outputs are seen the ceiling is used.  A
+    truncated output is recorded at the budget it hit, so if more than 1-q of
+    outputs are being cut short the budget rises again.
+
+CancelledStoppingCriteria (every task)
+    Stops every row once the chat turn that asked for the decode has been
+    cancelled or is past its deadline (inference_executor.Ticket).  The
+    caller discards the partial output.
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from transformers import StoppingCriteria
+
+DEFAULT_QUANTILE    = 0.99
+DEFAULT_HEADROOM    = 1.25
+DEFAULT_FLOOR       = 16
+DEFAULT_WINDOW      = 512
+DEFAULT_MIN_SAMPLES = 32
+REFIT_EVERY         = 16
+
+
+def _symbols(piece: str, unk_token: str) -> str:
+    """Collapse a token to the characters the brace tracker cares about."""
+    if piece == unk_token:
+        return "U"
+    out = []
+    for ch in piece:
+        if ch in "[],:":
+            out.append(ch)
+        elif ch not in "▁ " and (not out or out[-1] != "v"):
+            out.append("v")     # any value character (letters, digits, quotes)
+    return "".join(out)
+
+
+class BalancedJsonStoppingCriteria(StoppingCriteria):
+    """
+    Per-row "top-level object closed" detector for brace-less T5 output,
+    driven by a token_symbols() table.  One instance per generate() call;
+    row states are memoized by prefix, so each step only scans the newest
+    token (and beam reordering is harmless).
+    """
+
+    # state: (stack, previous significant symbol, pending close, opened, done)
+    _START = ((), None, False, False, False)
+
+    def __init__(self, symbols: List[str]):
+        self._symbols = symbols
+        self._states: Dict[Tuple[int, ...], Tuple] = {(): self._START}
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        done = [self._state(tuple(ids[1:]))[4] for ids in input_ids.tolist()]   # ids[0] is the decoder start
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    def _state(self, prefix: Tuple[int, ...]) -> Tuple:
+        if prefix not in self._states:
+            state = self._state(prefix[:-1])
+            token = prefix[-1]
+            if not state[4] and token < len(self._symbols):
+                for sym in self._symbols[token]:
+                    state = self._step(state, sym)
+                    if state[4]:
+                        break
+            self._states[prefix] = state
+        return self._states[prefix]
+
+    @staticmethod
+    def _step(state: Tuple, sym: str) -> Tuple:
+        stack, prev, pending, opened, _ = state
+        if pending and sym not in ",]U":
+            return stack, prev, False, opened, True         # fused "}}": object already complete
+        pending = False
+
+        if sym == "U":
+            if prev in (None, ":", "[", ","):
+                return stack + ("{",), "{", False, True, False
+            if stack and stack[-1] == "{":
+                stack = stack[:-1]
+            return stack, "}", True, opened, opened and not stack
+        if sym == "[":
+            return stack + ("[",), "[", False, opened, False
+        if sym == "]":
+            while stack and stack[-1] == "{":                # unclosed group objects
+                stack = stack[:-1]
+            stack = stack[:-1]
+            return stack, "]", False, opened, opened and not stack
+        return stack, sym, False, opened, False
+
+
+class CancelledStoppingCriteria(StoppingCriteria):
+    """Ends generate() at the next step once `ticket.stop_requested()`."""
+
+    def __init__(self, ticket):
+        self._ticket = ticket
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        stop = self._ticket.stop_requested()
+        return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
+
+def token_symbols(tokenizer) -> List[str]:
+    """Symbol string for every token id; build once per tokenizer and reuse."""
+    pieces = tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))
+    specials = set(tokenizer.all_special_tokens) - {tokenizer.unk_token}
+    return ["" if piece in specials else _symbols(piece, tokenizer.unk_token) for piece in pieces]
+
+
+class OutputBudget:
+    """
+    Adaptive max_new_tokens for one generation task (thread-safe).
+
+    Args:
+        ceiling:     hard upper bound (the task's previous fixed limit).
+        floor:       lower bound, so short outputs never starve.
+        quantile:    residual quantile the budget must cover (0.99 → p99).
+        headroom:    multiplicative safety margin on top of the fit.
+        window:      number of recent (input, output) samples kept.
+        min_samples: observations needed before the fit is trusted.
+    """
+
+    def __init__(self, ceiling: int, floor: int = DEFAULT_FLOOR, quantile: float = DEFAULT_QUANTILE,
+                 headroom: float = DEFAULT_HEADROOM, window: int = DEFAULT_WINDOW,
+                 min_samples: int = DEFAULT_MIN_SAMPLES):
+        self.ceiling     = ceiling
+        self.floor       = min(floor, ceiling)
+        self.quantile    = quantile
+        self.headroom    = headroom
+        self.min_samples = min_samples
+        self._samples: "deque[Tuple[int, int]]" = deque(maxlen=window)
+        self._fit: Optional[Tuple[float, float]] = None    # (slope, residual quantile)
+        self._since_fit = 0
+        self._lock = threading.Lock()
+
+        self.calls      = 0
+        self.steps      = 0     # decoder steps actually run
+        self.truncated  = 0
+        self.stopped_early = 0
+
+    def budget(self, input_tokens: int) -> int:
+        with self._lock:
+            fit = self._fit
+        if fit is None:
+            return self.ceiling
+        slope, residual = fit
+        want = math.ceil(self.headroom * (slope * input_tokens + residual))
+        return max(self.floor, min(self.ceiling, want))
+
+    def observe(self, input_tokens: int, output_tokens: int, budget: int, stopped_early: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.steps += output_tokens
+            self.truncated += output_tokens >= budget and not stopped_early
+            self.stopped_early += stopped_early
+            self._samples.append((input_tokens, output_tokens))
+            self._since_fit += 1
+            if len(self._samples) >= self.min_samples and (self._fit is None or self._since_fit >= REFIT_EVERY):
+                self._fit = self._refit()
+                self._since_fit = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            fit = self._fit
+            calls, steps = self.calls, self.steps
+            out = {
+                "ceiling":       self.ceiling,
+                "samples":       len(self._samples),
+                "calls":         calls,
+                "avg_steps":     round(steps / calls, 2) if calls else 0.0,
+                "truncated":     self.truncated,
+                "stopped_early": self.stopped_early,
+            }
+        out["fit"] = {"slope": round(fit[0], 4), "residual_q": round(fit[1], 2)} if fit else None
+        return out
+
+    def _refit(self) -> Tuple[float, float]:
+        """Least-squares slope (clamped ≥ 0) and residual quantile (lock held)."""
+        xs = [x for x, _ in self._samples]
+        ys = [y for _, y in self._samples]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        cov   = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+        slope = max(0.0, cov / var_x) if var_x else 0.0
+        residuals = sorted(y - slope * x for x, y in zip(xs, ys))
+        idx = min(len(residuals) - 1, math.ceil(self.quantile * len(residuals)) - 1)
+        return slope, residuals[max(0, idx)]
@@ -0,0 +1,240 @@
+"""
+Inference Batcher
+=================
+Dynamic micro-batching for T5 generation.
+
+Every /chat turn needs one or two short `model.generate` calls (parse, reply
+or Q&A).  Running them one sequence at a time leaves most of the CPU's matrix
+throughput unused when several organisers chat at once, so concurrent calls
+are collected into padded batches instead:
+
+  submit(prompt, **gen_kwargs)
+      → bucket by (task prefix, generation kwargs, input-length bucket)
+      → one batched generate per bucket
+      → each caller's Future receives its own decoded string
+
+A bucket is dispatched as soon as it is full (max_batch_size) or its oldest
+request has waited max_wait_ms, so a lone request on an idle service pays at
+most max_wait_ms of extra latency.
+
+stop() decodes everything already queued before the thread exits, so a hot
+reload doesn't fail requests that were waiting for company; submit() after
+stop() raises BatcherStopped at once and the caller decodes on its own.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from service_config import env_float, env_int
+
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT_MS    = 5.0
+DEFAULT_LENGTH_BUCKET  = 16     # input tokens per length bucket
+
+_STOP = object()
+
+
+class BatcherStopped(RuntimeError):
+    """Raised by submit() once stop() has been called."""
+
+
+class _Pending:
+    __slots__ = ("prompt", "gen_kwargs", "future", "enqueued_at")
+
+    def __init__(self, prompt: str, gen_kwargs: Dict, future: Future):
+        self.prompt      = prompt
+        self.gen_kwargs  = gen_kwargs
+        self.future      = future
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceBatcher:
+    """
+    Background scheduler that groups concurrent generation requests.
+
+    Args:
+        run_batch:      (prompts, gen_kwargs) -> decoded strings, one per prompt.
+                        Always called from the batcher thread, so the model and
+                        tokenizer are only ever driven by one thread at a time.
+        measure:        prompt -> input length in tokens (for length bucketing).
+        max_batch_size: upper bound on sequences per generate call.
+        submit_batch:   (prompts, gen_kwargs) -> Future of decoded strings.  When
+                        given it replaces run_batch and batches are handed off
+                        without waiting, so several decode at once (one per
+                        inference_pool worker).
+        max_wait_ms:    how long the oldest request may wait for company.
+        length_bucket:  width of an input-length bucket, in tokens. Keeps
+                        padding waste low by not mixing short and long prompts.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[str], Dict], List[str]],
+        measure: Optional[Callable[[str], int]] = None,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        length_bucket: int = DEFAULT_LENGTH_BUCKET,
+        submit_batch: Optional[Callable[[List[str], Dict], Future]] = None,
+    ):
+        self._run_batch     = run_batch
+        self._submit_batch  = submit_batch
+        self._measure       = measure or (lambda prompt: len(prompt.split()))
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait       = max(0.0, max_wait_ms) / 1000.0
+        self.length_bucket  = max(1, length_bucket)
+
+        self._incoming: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._buckets: Dict[Tuple, List[_Pending]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()       # orders submit() against stop()
+        self._stopped = False
+
+        self.stats = {"requests": 0, "batches": 0, "largest_batch": 0}
+
+    @classmethod
+    def from_env(cls, run_batch: Callable[[List[str], Dict], List[str]],
+                 measure: Optional[Callable[[str], int]] = None,
+                 submit_batch: Optional[Callable[[List[str], Dict], Future]] = None) -> "InferenceBatcher":
+        return cls(
+            run_batch,
+            measure=measure,
+            submit_batch=submit_batch,
+            max_batch_size=env_int("NLP_BATCH_MAX_SIZE", DEFAULT_MAX_BATCH_SIZE),
+            max_wait_ms=env_float("NLP_BATCH_MAX_WAIT_MS", DEFAULT_MAX_WAIT_MS),
+            length_bucket=env_int("NLP_BATCH_LENGTH_BUCKET", DEFAULT_LENGTH_BUCKET),
+        )
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def start(self) -> "InferenceBatcher":
+        with self._lock:
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._loop, name="inference-batcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Decode what is already queued, then end the thread; later submits raise BatcherStopped."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._stopped = True
+            self._incoming.put(_STOP)
+        thread.join(timeout)
+
+    def submit(self, prompt: str, **gen_kwargs) -> Future:
+        """Queue one prompt; the returned Future resolves to its decoded text."""
+        future: Future = Future()
+        with self._lock:
+            if self._stopped:
+                raise BatcherStopped("Inference batcher stopped")
+            self._incoming.put(_Pending(prompt, gen_kwargs, future))
+        return future
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Internal
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _bucket_key(self, item: _Pending) -> Tuple:
+        task = item.prompt.split(":", 1)[0] if ":" in item.prompt else ""
+        length = self._measure(item.prompt) // self.length_bucket
+        return (task, tuple(sorted(item.gen_kwargs.items())), length)
+
+    def _add(self, item: _Pending):
+        self._buckets.setdefault(self._bucket_key(item), []).append(item)
+
+    def _next_timeout(self) -> Optional[float]:
+        if not self._buckets:
+            return None
+        now = time.perf_counter()
+        oldest = min(items[0].enqueued_at for items in self._buckets.values())
+        return max(0.0, oldest + self.max_wait - now)
+
+    def _pick_ready(self) -> Optional[Tuple]:
+        """Most overdue bucket that is full or past its wait deadline."""
+        now = time.perf_counter()
+        ready = [
+            (items[0].enqueued_at, key)
+            for key, items in self._buckets.items()
+            if len(items) >= self.max_batch_size or now - items[0].enqueued_at >= self.max_wait
+        ]
+        return min(ready)[1] if ready else None
+
+    def _loop(self):
+        while True:
+            try:
+                item = self._incoming.get(timeout=self._next_timeout())
+            except queue.Empty:
+                item = None
+            # Drain everything that arrived meanwhile before deciding what to run
+            while item is not None:
+                if item is _STOP:
+                    self._drain()
+                    return
+                self._add(item)
+                try:
+                    item = self._incoming.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            key = self._pick_ready()
+            if key is not None:
+                items = self._buckets.pop(key)
+                batch, rest = items[: self.max_batch_size], items[self.max_batch_size:]
+                if rest:
+                    self._buckets[key] = rest
+                self._dispatch(batch)
+
+    def _dispatch(self, batch: List[_Pending]):
+        # Callers that gave up (cancelled futures) are dropped before decoding
+        batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        self.stats["requests"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+
+        prompts = [item.prompt for item in batch]
+        if self._submit_batch is not None:
+            try:
+                done = self._submit_batch(prompts, batch[0].gen_kwargs)
+            except Exception as e:
+                self._resolve(batch, None, e)
+                return
+            done.add_done_callback(lambda f: self._resolve(batch, None if f.exception() else f.result(),
+                                                           f.exception()))
+            return
+
+        try:
+            outputs = self._run_batch(prompts, batch[0].gen_kwargs)
+        except Exception as e:
+            self._resolve(batch, None, e)
+            return
+        self._resolve(batch, outputs, None)
+
+    @staticmethod
+    def _resolve(batch: List[_Pending], outputs: Optional[List[str]], error: Optional[BaseException]):
+        if error is None and len(outputs) != len(batch):
+            error = RuntimeError(f"Batch returned {len(outputs)} outputs for {len(batch)} prompts")
+        if error is not None:
+            for item in batch:
+                item.future.set_exception(error)
+            return
+        for item, output in zip(batch, outputs):
+            item.future.set_result(output)
+
+    def _drain(self):
+        """Dispatch every waiting bucket, oldest first, without waiting for company."""
+        for key in sorted(self._buckets, key=lambda k: self._buckets[k][0].enqueued_at):
+            items = self._buckets[key]
+            for i in range(0, len(items), self.max_batch_size):
+                self._dispatch(items[i:i + self.max_batch_size])
+        self._buckets.clear()
@@ -0,0 +1,113 @@
+"""
+Inference Cache
+===============
+Small in-process caches for T5 results.
+
+Organisers repeat the same short messages ("yes", "2 from CCE", "all female
+pls") constantly, and each one would otherwise pay for a full beam-search
+decode.  Entries are keyed on the model version as well as the input, so
+retraining or a hot reload to another version invalidates them automatically.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional
+
+MISSING = object()
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive cache key for a user message."""
+    return " ".join(text.lower().split())
+
+
+def model_fingerprint(model_dir: Path) -> str:
+    """
+    Cheap identity of a saved model: hashes file names, sizes and mtimes
+    rather than the (hundreds of MB of) weights themselves.
+    """
+    h = hashlib.sha1()
+    if model_dir.exists():
+        for path in sorted(p for p in model_dir.rglob("*") if p.is_file()):
+            st = path.stat()
+            h.update(f"{path.relative_to(model_dir)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()[:12]
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache with a per-entry time-to-live.
+    A max_size of 0 disables caching entirely.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_s: Optional[float] = 3600.0):
+        self.max_size = max(0, max_size)
+        self.ttl_s    = ttl_s if ttl_s and ttl_s > 0 else None
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits        = 0
+        self.misses      = 0
+        self.evictions   = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value, or MISSING."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size == 0:
+            return
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether a live entry exists; unlike get(), not counted and not refreshed."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[0] is None or time.monotonic() < entry[0])
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size":        len(self._data),
+                "max_size":    self.max_size,
+                "hits":        self.hits,
+                "misses":      self.misses,
+                "evictions":   self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio":   round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,347 @@
+"""
+Inference Executor
+==================
+Runs blocking torch inference off the asyncio event loop.
+
+`chat()` is `async def`, but T5 decoding is synchronous and can take
+hundreds of milliseconds.  Calling it inline freezes `/health` and every
+other request on the worker, so each chat turn is handed to a dedicated
+pool of inference threads instead:
+
+  - at most `max_in_flight` turns decode at once
+  - at most `max_queue` turns wait for a free slot
+  - anything beyond that is rejected immediately with InferenceQueueFull,
+    so callers get a fast 503 + Retry-After rather than hitting Laravel's
+    30s Http::timeout
+
+Waiting turns are not served first-come first-served.  Each carries a
+priority — CHEAP (fast-path parses, cache hits, confirmations), NORMAL (a
+T5 parse) or LONG (Q&A generation) — that counts as arriving that much later
+(PRIORITY_DELAY_S), so cheap turns overtake long ones without starving them.
+
+Each turn may also carry a deadline (time.monotonic()) and a cancel Event:
+
+  - a turn that cannot finish by its deadline, judging by how long turns
+    of its priority have been taking, is refused with DeadlineExceeded —
+    at submit() if the queue ahead of it is already too long, else when it
+    reaches the front
+  - a turn whose cancel Event is set (the client went away) while queued
+    never starts
+  - while it runs, the turn's Ticket is visible to the parser through
+    current_ticket(): decodes on the turn's own thread stop at the next step
+    once it is cancelled or past its deadline, and check_cancelled() /
+    wait_for() raise RequestCancelled or DeadlineExceeded between stages
+
+Queue depth, in-flight count, queue wait times and refused turns are kept
+in `stats()`.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+from service_config import env_int
+
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_MAX_QUEUE     = 32
+
+CHEAP, NORMAL, LONG = "cheap", "normal", "long"
+PRIORITY_DELAY_S = {CHEAP: 0.0, NORMAL: 1.0, LONG: 3.0}
+SERVICE_EWMA     = 0.2      # weight of the newest service time in the per-priority estimate
+CANCEL_POLL_S    = 0.05     # how often wait_for() looks at the ticket
+
+_ticket: contextvars.ContextVar = contextvars.ContextVar("inference_ticket", default=None)
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a turn cannot finish, or did not finish, before its deadline."""
+
+
+class RequestCancelled(Exception):
+    """Raised inside a turn whose caller has gone away."""
+
+
+class Ticket:
+    """Deadline and cancel flag of the turn running on the current thread."""
+
+    __slots__ = ("deadline", "cancel")
+
+    def __init__(self, deadline: Optional[float] = None, cancel: Optional[threading.Event] = None):
+        self.deadline = deadline
+        self.cancel = cancel
+
+    def stop_requested(self) -> bool:
+        return ((self.cancel is not None and self.cancel.is_set())
+                or (self.deadline is not None and time.monotonic() >= self.deadline))
+
+    def check(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise RequestCancelled("Client disconnected")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded("Deadline passed while processing")
+
+
+def current_ticket() -> Optional[Ticket]:
+    """The running turn's Ticket, or None outside the executor (warmup, batcher thread, scripts)."""
+    return _ticket.get()
+
+
+def check_cancelled():
+    """Raise if the running turn was cancelled or is past its deadline."""
+    ticket = _ticket.get()
+    if ticket is not None:
+        ticket.check()
+
+
+def wait_for(future: Future) -> Any:
+    """
+    future.result(), given up as soon as the running turn is cancelled or
+    past its deadline; a future nobody started yet is cancelled as well.
+    """
+    ticket = _ticket.get()
+    if ticket is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=CANCEL_POLL_S)
+        except FutureTimeout:
+            if ticket.stop_requested():
+                future.cancel()
+                ticket.check()
+
+
+class _Job:
+    __slots__ = ("fn", "args", "ctx", "future", "priority", "deadline", "cancel", "enqueued_at", "queued")
+
+    def __init__(self, fn, args, ctx, future, priority, deadline, cancel):
+        self.fn = fn
+        self.args = args
+        self.ctx = ctx
+        self.future = future
+        self.priority = priority
+        self.deadline = deadline
+        self.cancel = cancel
+        self.enqueued_at = time.monotonic()
+        self.queued = True
+
+
+class InferenceExecutor:
+    """Bounded, priority-ordered thread pool for blocking inference work."""
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 max_queue: int = DEFAULT_MAX_QUEUE):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue     = max(0, max_queue)
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._heap: List = []               # (order, seq, job)
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._idle = 0                      # waiting workers nobody has notified yet
+        self._shutdown = False
+
+        self._queued    = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected  = 0
+        self._expired   = 0
+        self._cancelled = 0
+        self._wait_total_ms   = 0.0
+        self._wait_max_ms     = 0.0
+        self._service_total_s = 0.0
+        self._service_s: Dict[str, float] = {}      # priority → EWMA of service time
+
+    @classmethod
+    def from_env(cls) -> "InferenceExecutor":
+        return cls(
+            max_in_flight=env_int("NLP_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT),
+            max_queue=env_int("NLP_MAX_QUEUE", DEFAULT_MAX_QUEUE),
+        )
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────
+
+    async def run(self, fn: Callable[..., Any], *args: Any, priority: str = NORMAL,
+                  deadline: Optional[float] = None, cancel: Optional[threading.Event] = None) -> Any:
+        """
+        Run `fn(*args)` on an inference thread and await its result.
+        Raises InferenceQueueFull without queueing when the queue is full.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, priority=priority, deadline=deadline, cancel=cancel))
+
+    def submit(self, fn: Callable[..., Any], *args: Any, priority: str = NORMAL,
+               deadline: Optional[float] = None, cancel: Optional[threading.Event] = None) -> Future:
+        """
+        run() for callers that don't wait on the result (the streaming /chat
+        sends events as `fn` produces them).  Raises InferenceQueueFull or
+        DeadlineExceeded immediately, before anything is queued.
+        """
+        future: Future = Future()
+        job = _Job(fn, args, contextvars.copy_context(), future, priority, deadline, cancel)
+        order = job.enqueued_at + PRIORITY_DELAY_S.get(priority, 0.0)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Inference executor is shut down")
+            # The whole backlog, not each half: in a burst the workers haven't
+            # claimed anything yet, so in_flight alone would never look full
+            if self._queued + self._in_flight >= self.max_queue + self.max_in_flight:
+                self._rejected += 1
+                raise InferenceQueueFull(self._retry_after())
+            if deadline is not None:
+                ahead = sum(self._expected_s(j.priority) for o, _, j in self._heap if o <= order and j.queued)
+                waiting = ahead / self.max_in_flight if self._in_flight >= self.max_in_flight else 0.0
+                if job.enqueued_at + waiting + self._expected_s(priority) > deadline:
+                    self._expired += 1
+                    raise DeadlineExceeded(f"Deadline cannot be met (about {waiting:.1f}s of queued work ahead)")
+            self._queued += 1
+            heapq.heappush(self._heap, (order, next(self._seq), job))
+            if self._idle > 0:
+                self._idle -= 1         # that worker is spoken for, even before it wakes
+                self._work.notify()
+            elif len(self._threads) < self.max_in_flight:
+                thread = threading.Thread(target=self._worker, name=f"inference_{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+        future.add_done_callback(lambda f: self._on_done(f, job))
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self._completed + self._in_flight
+            return {
+                "max_in_flight":    self.max_in_flight,
+                "max_queue":        self.max_queue,
+                "in_flight":        self._in_flight,
+                "queue_depth":      self._queued,
+                "completed":        self._completed,
+                "rejected":         self._rejected,
+                "expired":          self._expired,
+                "cancelled":        self._cancelled,
+                "avg_queue_wait_ms": round(self._wait_total_ms / started, 2) if started else 0.0,
+                "max_queue_wait_ms": round(self._wait_max_ms, 2),
+                "expected_service_ms": {p: round(s * 1000, 1) for p, s in self._service_s.items()},
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown = True
+            pending = [job for _, _, job in self._heap]
+            self._idle = 0
+            self._work.notify_all()
+        for job in pending:
+            job.future.cancel()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Internal
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            if not job.future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._in_flight -= 1
+                    self._cancelled += 1
+                continue
+            refusal = self._refusal(job)
+            if refusal is not None:
+                job.future.set_exception(refusal)
+                continue
+            self._run(job)
+
+    def _next_job(self) -> Optional[_Job]:
+        with self._work:
+            while True:
+                while not self._heap and not self._shutdown:
+                    self._idle += 1
+                    self._work.wait()
+                if not self._heap:
+                    return None
+                _, _, job = heapq.heappop(self._heap)
+                if job.queued:          # else cancelled while queued, already accounted for
+                    job.queued = False
+                    self._queued -= 1
+                    self._in_flight += 1    # claimed: holds an in-flight slot from here on
+                    return job
+
+    def _refusal(self, job: _Job) -> Optional[Exception]:
+        """Why a job that reached the front should not start, if it shouldn't."""
+        now = time.monotonic()
+        with self._lock:
+            if job.cancel is not None and job.cancel.is_set():
+                self._in_flight -= 1
+                self._cancelled += 1
+                return RequestCancelled("Client disconnected while queued")
+            if job.deadline is not None and now + self._expected_s(job.priority) > job.deadline:
+                self._in_flight -= 1
+                self._expired += 1
+                return DeadlineExceeded("Deadline cannot be met, dropped before starting")
+        return None
+
+    def _run(self, job: _Job):
+        start = time.monotonic()
+        wait_ms = (start - job.enqueued_at) * 1000
+        with self._lock:
+            self._wait_total_ms += wait_ms
+            self._wait_max_ms = max(self._wait_max_ms, wait_ms)
+        result, error = None, None
+        try:
+            result = job.ctx.run(self._call, job)
+        except BaseException as e:
+            error = e
+        # Accounted for before the caller can see the result, so stats() read
+        # right after a turn never counts it as still in flight
+        service_s = time.monotonic() - start
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            self._service_total_s += service_s
+            previous = self._service_s.get(job.priority)
+            self._service_s[job.priority] = (
+                service_s if previous is None else previous + SERVICE_EWMA * (service_s - previous))
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    @staticmethod
+    def _call(job: _Job) -> Any:
+        _ticket.set(Ticket(job.deadline, job.cancel))
+        return job.fn(*job.args)
+
+    def _on_done(self, future: Future, job: _Job):
+        # A job cancelled while queued releases its queue slot right away
+        if future.cancelled():
+            with self._lock:
+                if job.queued:
+                    job.queued = False
+                    self._queued -= 1
+                    self._cancelled += 1
+
+    def _expected_s(self, priority: str) -> float:
+        """Typical service time of a turn of this priority (called with the lock held)."""
+        return self._service_s.get(priority, 0.0)
+
+    def _retry_after(self) -> int:
+        """Seconds until a queue slot is likely free (called with the lock held)."""
+        avg_service_s = self._service_total_s / self._completed if self._completed else 1.0
+        backlog = self._queued + self._in_flight
+        return max(1, math.ceil(avg_service_s * backlog / self.max_in_flight))
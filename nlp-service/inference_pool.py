@@ -0,0 +1,294 @@
+"""
+Inference Pool
+==============
+Runs T5 generation in N worker processes instead of the service process.
+
+One Python process cannot keep a many-core box busy: the GIL serializes
+tokenization, logits processing and the generate loop itself, and torch's
+intra-op threads stop helping on short T5-small sequences.  The pool spawns
+N processes, each holding the model and running batches on its own cores:
+
+  SemanticParser._generate / parse_many / micro-batcher
+      → InferencePool.submit(prompts, gen_kwargs)           (returns a Future)
+      → the worker with the fewest outstanding prompts       (queue balancing)
+      → worker: SemanticParser._generate_batch(prompts, ...)
+      → result queue → collector thread → Future resolved
+        (with the worker's token and stage observations, replayed into /metrics)
+
+Workers map model.safetensors (see mmap_weights.py), so N workers share one
+copy of the weights through the page cache; each gets CPUs / N torch threads.
+Workers are started with "spawn", never fork: the service process already
+runs threads and torch's OpenMP pool, neither of which survives fork().
+
+A worker that dies fails its outstanding jobs and is taken out of rotation;
+the pool keeps serving on the rest.
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from service_config import env_int
+from service_metrics import REGISTRY
+
+DEFAULT_START_TIMEOUT_S = 300.0
+_STOP = None
+
+
+def _worker_main(worker_id: int, load_args: Tuple[str, str], enforce_quant_gate: bool, model,
+                 threads: int, jobs: "mp.Queue", results: "mp.Queue"):
+    """Worker process: load T5, warm it, then run (job_id, prompts, gen_kwargs) until told to stop."""
+    import torch
+
+    import service_metrics
+    from semantic_parser import SemanticParser
+
+    backend, quantize = load_args
+    parser = SemanticParser(backend=backend, quantize=quantize,
+                            enforce_quant_gate=enforce_quant_gate, mmap_weights=True, model=model)
+    torch.set_num_threads(threads)      # after loading, so NLP_TORCH_THREADS can't override it
+    if not parser.is_fine_tuned:
+        results.put((worker_id, None, "error", "T5 failed to load in the worker", 0.0, []))
+        return
+    results.put((worker_id, None, "ready", parser.warmup(), 0.0, []))
+    service_metrics.forward_observations()     # token counts and stage times go back with each result
+
+    while True:
+        job = jobs.get()
+        if job is _STOP:
+            return
+        job_id, prompts, gen_kwargs = job
+        start = time.perf_counter()
+        try:
+            if gen_kwargs.get("constrained") and parser._grammar is None:
+                parser.enable_constrained_decoding()
+            outputs = parser._generate_batch(prompts, gen_kwargs)
+            results.put((worker_id, job_id, "ok", outputs, time.perf_counter() - start,
+                         service_metrics.take_forwarded()))
+        except Exception as e:
+            results.put((worker_id, job_id, "error", f"{type(e).__name__}: {e}", time.perf_counter() - start,
+                         service_metrics.take_forwarded()))
+
+
+class _Worker:
+    __slots__ = ("id", "process", "jobs", "outstanding", "prompts_queued",
+                 "jobs_done", "prompts_done", "busy_s", "warmup", "alive")
+
+    def __init__(self, worker_id: int, process, jobs):
+        self.id             = worker_id
+        self.process        = process
+        self.jobs           = jobs
+        self.outstanding: Dict[int, Tuple[Future, int]] = {}   # job_id → (future, prompts)
+        self.prompts_queued = 0
+        self.jobs_done      = 0
+        self.prompts_done   = 0
+        self.busy_s         = 0.0
+        self.warmup: Optional[Dict[str, Any]] = None
+        self.alive          = True
+
+
+class InferencePool:
+    """
+    Process pool for T5 generate calls.
+
+    Args:
+        workers:   worker processes (default: one per CPU).
+        load_args: (backend, quantize) the workers load T5 with.
+        threads:   torch intra-op threads per worker (default: CPUs / workers).
+        model:     ModelVersion the workers load (default: the registry's CURRENT),
+                   so every worker serves the same version as the parser.
+    """
+
+    def __init__(self, workers: Optional[int] = None, load_args: Tuple[str, str] = ("torch", ""),
+                 threads: Optional[int] = None, enforce_quant_gate: bool = True, model=None):
+        cpus = os.cpu_count() or 1
+        self.size      = max(1, workers or cpus)
+        self.threads   = max(1, threads or cpus // self.size)
+        self.load_args = load_args
+        self._enforce_quant_gate = enforce_quant_gate
+        self.model     = model
+
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._next_job = 0
+        self._next_worker = 0
+        self._collector: Optional[threading.Thread] = None
+        self._closed = False
+
+    @classmethod
+    def from_env(cls, load_args: Tuple[str, str], enforce_quant_gate: bool = True, model=None) -> "InferencePool":
+        return cls(
+            workers=env_int("NLP_INFERENCE_WORKERS", 0) or None,
+            load_args=load_args,
+            threads=env_int("NLP_INFERENCE_WORKER_THREADS", 0) or None,
+            enforce_quant_gate=enforce_quant_gate,
+            model=model,
+        )
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def start(self, timeout_s: float = DEFAULT_START_TIMEOUT_S) -> "InferencePool":
+        """Spawn the workers and wait until every one has loaded and warmed T5."""
+        for worker_id in range(self.size):
+            jobs = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_worker_main, name=f"inference-worker-{worker_id}", daemon=True,
+                args=(worker_id, self.load_args, self._enforce_quant_gate, self.model,
+                      self.threads, jobs, self._results),
+            )
+            process.start()
+            self._workers.append(_Worker(worker_id, process, jobs))
+
+        deadline = time.monotonic() + timeout_s
+        pending = {w.id for w in self._workers}
+        while pending:
+            try:
+                worker_id, _, status, payload, _, _ = self._results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.close()
+                raise RuntimeError(f"inference workers {sorted(pending)} not ready after {timeout_s:.0f}s")
+            if status != "ready":
+                self.close()
+                raise RuntimeError(f"inference worker {worker_id}: {payload}")
+            self._workers[worker_id].warmup = payload
+            pending.discard(worker_id)
+
+        self._collector = threading.Thread(target=self._collect, name="inference-pool", daemon=True)
+        self._collector.start()
+        return self
+
+    def submit(self, prompts: List[str], gen_kwargs: Dict[str, Any]) -> Future:
+        """Queue one batch on the least-loaded worker; the Future resolves to its decoded strings."""
+        future: Future = Future()
+        # Running from the start: the batch is on a worker's queue and can't be
+        # taken back, so a turn that gives up (wait_for) must not cancel it
+        # under the collector's feet.
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            live = [w for w in self._workers if w.alive]
+            if self._closed or not live:
+                future.set_exception(RuntimeError("Inference pool is not running"))
+                return future
+            # Fewest queued prompts wins; ties rotate so idle workers share the load
+            start = self._next_worker % len(live)
+            worker = min(live[start:] + live[:start], key=lambda w: w.prompts_queued)
+            self._next_worker += 1
+            job_id = self._next_job
+            self._next_job += 1
+            worker.outstanding[job_id] = (future, len(prompts))
+            worker.prompts_queued += len(prompts)
+        worker.jobs.put((job_id, list(prompts), dict(gen_kwargs)))
+        return future
+
+    def warmup_info(self) -> Dict[str, Any]:
+        """Workers warm up in parallel at start(); the slowest one bounds readiness."""
+        infos = [w.warmup for w in self._workers if w.warmup]
+        return {
+            "ms":          max((i["ms"] for i in infos), default=0.0),
+            "generates":   sum(i["generates"] for i in infos),
+            "batch_sizes": infos[0]["batch_sizes"] if infos else [],
+            "workers":     len(infos),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers":          self.size,
+                "alive":            sum(w.alive for w in self._workers),
+                "threads_per_worker": self.threads,
+                "per_worker": [
+                    {
+                        "pid":          w.process.pid,
+                        "alive":        w.alive,
+                        "queued":       w.prompts_queued,
+                        "jobs":         w.jobs_done,
+                        "prompts":      w.prompts_done,
+                        "busy_s":       round(w.busy_s, 3),
+                    }
+                    for w in self._workers
+                ],
+            }
+
+    def close(self, timeout_s: float = 5.0):
+        with self._lock:
+            self._closed = True
+        for w in self._workers:
+            if w.process.is_alive():
+                w.jobs.put(_STOP)
+        for w in self._workers:
+            w.process.join(timeout_s)
+            if w.process.is_alive():
+                w.process.terminate()
+        # Workers finish their queued jobs before _STOP; let the collector hand
+        # those results out before failing whatever is left
+        if self._collector is not None:
+            self._collector.join(timeout_s)
+            self._collector = None
+        with self._lock:
+            for w in self._workers:
+                self._fail(w, RuntimeError("Inference pool closed"))
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Internal
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _collect(self):
+        """Resolve futures as results arrive; notice dead workers between results."""
+        while True:
+            try:
+                worker_id, job_id, status, payload, busy_s, observations = self._results.get(timeout=1.0)
+            except queue.Empty:
+                with self._lock:
+                    if self._closed and not any(w.process.is_alive() for w in self._workers):
+                        return
+                    for w in self._workers:
+                        if w.alive and not w.process.is_alive():
+                            print(f"[InferencePool] Worker {w.id} (pid {w.process.pid}) died, "
+                                  f"failing {len(w.outstanding)} jobs")
+                            self._fail(w, RuntimeError(f"inference worker {w.id} died"))
+                continue
+            except (EOFError, OSError) as e:
+                # The result queue is gone: nothing will resolve what is outstanding
+                with self._lock:
+                    outstanding = sum(len(w.outstanding) for w in self._workers)
+                    expected = self._closed and not outstanding     # torn down after close()
+                    for w in self._workers:
+                        self._fail(w, RuntimeError(f"inference result queue failed ({e})"))
+                if not expected:
+                    print(f"[InferencePool] Result queue failed ({e}), failing {outstanding} jobs")
+                return
+
+            REGISTRY.replay(observations)      # before the caller can see the result
+            with self._lock:
+                worker = self._workers[worker_id]
+                entry = worker.outstanding.pop(job_id, None)
+                if entry is None:
+                    continue
+                future, n_prompts = entry
+                worker.prompts_queued -= n_prompts
+                worker.jobs_done += 1
+                worker.prompts_done += n_prompts
+                worker.busy_s += busy_s
+            if future.done():
+                continue
+            if status == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _fail(self, worker: _Worker, error: Exception):
+        """Fail every outstanding job of `worker` and take it out of rotation (lock held)."""
+        worker.alive = False
+        for future, _ in worker.outstanding.values():
+            if not future.done():
+                future.set_exception(error)
+        worker.outstanding.clear()
+        worker.prompts_queued = 0
@@ -0,0 +1,186 @@
+"""
+Intent Router
+=============
+Decides once, before any T5 decode, whether a /chat message is a constraint
+request or a question for the Q&A task.
+
+A multinomial Naive Bayes keyword classifier over word unigrams and bigrams,
+trained at startup on the same generators T5 is fine-tuned on:
+
+  constraint   parse-task inputs (gen_single_college … gen_height) and the
+               [INTENT:constraint] texts of gen_intent_classification
+  question     gen_organization_qa questions and the [INTENT:question] texts
+
+Messages the rule fast path can parse ("yes", "3 girls please") are routed
+to constraint without scoring.  Everything else goes to the Q&A task when
+its log-odds are below -QUESTION_MARGIN, or below zero with no feature that
+favours constraint and a question word or greeting ("help", "who?",
+"hello").  The Q&A corpus is small, so a single question-ish word
+("how", "can") must not be enough, and bare replies to a proposal ("no",
+"no thanks") stay on the constraint path, the previous heuristic's default
+for ambiguous messages.
+
+Training takes well under a second at startup and classification is a
+dictionary lookup per word, so a misrouted constraint message no longer
+costs a wasted Q&A decode before it is re-parsed.
+"""
+
+import math
+import random
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import generate_semantic_data as data
+from fast_path import RuleParser
+
+CONSTRAINT = "constraint"
+QUESTION   = "question"
+
+PARSE_GENERATORS = (
+    data.gen_single_college, data.gen_multi_college, data.gen_three_colleges,
+    data.gen_gender_count, data.gen_gender_split, data.gen_new_old,
+    data.gen_college_gender, data.gen_college_new_old, data.gen_college_gender_new,
+    data.gen_multi_group_mixed, data.gen_conflict, data.gen_priority,
+    data.gen_combined_global, data.gen_college_with_global, data.gen_confirm,
+    data.gen_free_form, data.gen_tagalog_mixed, data.gen_height,
+)
+SEED = 42
+QUESTION_MARGIN = 2.0   # log-odds a message needs in favour of "question"
+
+# Constraint-side replies the generators don't cover, which the previous
+# keyword heuristic sent to the parser: bare refusals and corrections of a
+# proposed assignment, and follow-ups that borrow question words.  Routing
+# data only; the T5 corpus is left alone.
+ROUTER_CONSTRAINT_EXAMPLES = (
+    "no", "no.", "nope", "nah", "no thanks", "no, that's not right", "no, change it",
+    "not that", "wrong", "cancel", "never mind", "hindi", "hindi po", "ayaw ko",
+    "Can I get 3 males from CTE?", "Can we add 1 more from CAE?", "How about females first",
+    "What about 2 from CCJE instead?", "Change CEE to CAE", "Anyone but CTE", "Yes, that's good",
+)
+
+_WORD = re.compile(r"[a-z]+|\d+|\?")
+
+# The previous heuristic's question indicators, plus greetings the Q&A task
+# answers: without one of these, a message with only weak evidence for Q&A
+# stays on the constraint path
+_QUESTION_CUE = re.compile(r"\?|\b(?:what|how|who|when|where|why|which|show me|list|tell me|explain|help"
+                           r"|hi|hello|hey|good (?:morning|afternoon|evening)|thanks?|thank you|bye)\b")
+
+
+def _slot_pattern() -> "re.Pattern":
+    """Longest-first alternation of every college / gender / new-old term."""
+    terms = {term.lower() for vocab in (data.COLLEGES, data.GENDER_TERMS, data.NEW_TERMS)
+             for values in vocab.values() for term in values}
+    terms.discard("it")     # the pronoun, far more often than the program
+    alternation = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternation})s?\b")
+
+
+_SLOT = _slot_pattern()
+
+
+def _features(text: str) -> List[str]:
+    """
+    Unigrams and bigrams.  Slot values collapse to one word ("CCE",
+    "computing", "freshies" → slot) and numbers to num; "?" is kept.
+    """
+    text = _SLOT.sub(" slot ", text.lower())
+    words = ["num" if w.isdigit() else w for w in _WORD.findall(text)]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _strip_prefix(prompt: str) -> str:
+    return prompt.split(": ", 1)[1] if ": " in prompt else prompt
+
+
+def training_examples() -> List[Tuple[str, str]]:
+    """(text, intent) pairs from generate_semantic_data, without disturbing the global RNG."""
+    state = random.getstate()
+    random.seed(SEED)
+    try:
+        examples = [(_strip_prefix(prompt), CONSTRAINT)
+                    for gen in PARSE_GENERATORS for prompt, _ in gen()]
+        examples += [(_strip_prefix(prompt), QUESTION) for prompt, _ in data.gen_organization_qa()]
+        examples += [(text, CONSTRAINT if label == "[INTENT:constraint]" else QUESTION)
+                     for text, label in data.gen_intent_classification()]
+        examples += [(text, CONSTRAINT) for text in ROUTER_CONSTRAINT_EXAMPLES]
+    finally:
+        random.setstate(state)
+    return examples
+
+
+class IntentRouter:
+    """
+    Naive Bayes constraint/question classifier behind the rule fast path.
+
+    Args:
+        examples: (text, intent) pairs; defaults to training_examples().
+        alpha:    additive (Laplace) smoothing.
+        margin:   log-odds below -margin are routed to the Q&A task.
+    """
+
+    def __init__(self, examples: Iterable[Tuple[str, str]] = None, alpha: float = 1.0,
+                 margin: float = QUESTION_MARGIN):
+        counts: Dict[str, Counter] = {CONSTRAINT: Counter(), QUESTION: Counter()}
+        for text, intent in (training_examples() if examples is None else examples):
+            counts[intent].update(_features(text))
+
+        vocab = set(counts[CONSTRAINT]) | set(counts[QUESTION])
+        sizes = {intent: sum(c.values()) for intent, c in counts.items()}
+        # Smoothing pseudo-counts scale with corpus size, so a feature neither
+        # class has seen scores 0 instead of leaning towards the smaller
+        # (Q&A) corpus; `alpha` is the pseudo-count of the smaller class.
+        beta = alpha / min(sizes.values())
+
+        def log_p(intent: str, f: str) -> float:
+            return math.log((counts[intent][f] + beta * sizes[intent]) / (sizes[intent] * (1 + beta * len(vocab))))
+
+        # log P(feature | constraint) - log P(feature | question), per feature
+        self._weights: Dict[str, float] = {f: log_p(CONSTRAINT, f) - log_p(QUESTION, f) for f in vocab}
+
+        self.margin = margin
+        self._rules = RuleParser()
+        self._lock = threading.Lock()
+        self._routed = Counter()
+        self.redirected = 0
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def score(self, message: str) -> float:
+        """Log-odds of constraint vs question (> 0 leans constraint); unseen features are ignored."""
+        return sum(self._weights.get(f, 0.0) for f in _features(message))
+
+    def classify(self, message: str) -> str:
+        intent = self.route(message)
+        with self._lock:
+            self._routed[intent] += 1
+        return intent
+
+    def route(self, message: str) -> str:
+        """classify() without counting the message (used to schedule it)."""
+        weights = [self._weights.get(f, 0.0) for f in _features(message)]
+        score = sum(weights)
+        if self._rules.answers(message):
+            return CONSTRAINT
+        if score < -self.margin:
+            return QUESTION         # clearly a question
+        if score < 0 and max(weights) <= 0 and _QUESTION_CUE.search(message.lower()):
+            return QUESTION         # asks something, and nothing in it reads as a constraint
+        return CONSTRAINT
+
+    def record_redirect(self):
+        """The Q&A model answered [INTENT:constraint] for a message routed as a question."""
+        with self._lock:
+            self.redirected += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "constraint": self._routed[CONSTRAINT],
+                "question":   self._routed[QUESTION],
+                "redirected": self.redirected,
+            }
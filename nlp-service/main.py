@@ -3,12 +3,31 @@ AssignAI NLP Microservice
 FastAPI service for semantic constraint parsing (T5-small fine-tuned).
 """
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hmac
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import closing, contextmanager
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
 
-from semantic_parser import SemanticParser
+from conversation_store import ConversationStore
+from inference_executor import (CHEAP, LONG, NORMAL, DeadlineExceeded, InferenceExecutor,
+                                InferenceQueueFull, RequestCancelled)
+from intent_router import QUESTION, IntentRouter
+from model_registry import ModelRegistry, resolve_model
+import profiling
+import request_timing
+from semantic_parser import SemanticParser, tuned_settings
+from service_config import env_bool, env_float, env_int, env_str, use_tuned
+from service_metrics import CHAT_SECONDS, CONTENT_TYPE, REGISTRY, STAGE_SECONDS, family
 
 
 # ─── Pydantic Models ────────────────────────────────────────────────────────
@@ -16,6 +35,10 @@ from semantic_parser import SemanticParser
 class HealthResponse(BaseModel):
     status: str
     semantic_parser_type: str = "none"  # 't5-fine-tuned' | 'fallback' | 'none'
+    inference_backend: Optional[str] = None  # 'torch' | 'onnx' when T5 is loaded
+    quantization: Optional[str] = None       # 'int8' when NLP_QUANTIZE is active
+    ready: bool = False                      # warmup finished; see /health/ready
+    model_version: Optional[str] = None      # registry version serving T5 ('legacy' for ./semantic_model)
 
 
 class ChatEventContext(BaseModel):
@@ -34,6 +57,20 @@ class ChatRequest(BaseModel):
     conversation_history: Optional[List[ChatMessage]] = None
     event_context: Optional[ChatEventContext] = None
     previous_merged_constraints: Optional[Dict] = None
+    conversation_id: Optional[str] = Field(
+        None, max_length=128, description="Stable id of the conversation; lets the service keep its merged state"
+    )
+
+
+class ReloadRequest(BaseModel):
+    version: Optional[str] = Field(None, description="Registry version to load (default: the registry's CURRENT)")
+
+
+class ProfileRequest(BaseModel):
+    mode: str = Field(profiling.DETERMINISTIC, pattern="^(deterministic|sampling)$")
+    requests: Optional[int] = Field(None, ge=1, le=10000, description="Chat turns to profile (default 20 if seconds is unset too)")
+    seconds: Optional[float] = Field(None, gt=0, le=profiling.MAX_SECONDS, description="Stop after this long")
+    operators: bool = Field(True, description="Also record torch.profiler operator traces (deterministic mode)")
 
 
 class ChatResponse(BaseModel):
@@ -42,6 +79,8 @@ class ChatResponse(BaseModel):
     natural_reply: str
     is_confirming: bool = False
     response_type: str = "constraint"  # "constraint" or "answer"
+    decode_path: Optional[str] = None  # how the message was parsed: rules | cache | coalesced | greedy | escalated | beam | constrained | fallback
+    timings: Optional[Dict] = None     # stage / T5 breakdown, only when asked for with X-Debug-Timing: 1
 
 
 # ─── App Setup ───────────────────────────────────────────────────────────────
@@ -63,68 +102,255 @@ app.add_middleware(
 )
 
 semantic_parser: Optional[SemanticParser] = None
+inference_executor: Optional[InferenceExecutor] = None
+intent_router: Optional[IntentRouter] = None
+conversation_store: Optional[ConversationStore] = None
+service_ready = threading.Event()   # set once warmup has finished
+
+# Requests hold a lease on the parser they started with, so a hot reload can
+# swap `semantic_parser` at any time and still retire the old one only after
+# its in-flight requests are done (see reload_model)
+_parser_swap = threading.Condition()
+_parser_leases: Counter = Counter()     # parser → requests in flight on it
+_reload_lock = threading.Lock()
+
+DISCONNECT_POLL_S = 0.25    # how often a waiting /chat checks whether its client is still there
 
 
 # ─── Helper Functions ────────────────────────────────────────────────────────
 
-def classify_intent(message: str) -> str:
+@contextmanager
+def _lease_parser():
+    """The serving parser, kept from being retired until the caller is done with it."""
+    with _parser_swap:
+        parser = semantic_parser
+        _parser_leases[parser] += 1
+    try:
+        yield parser
+    finally:
+        with _parser_swap:
+            _parser_leases[parser] -= 1
+            if _parser_leases[parser] <= 0:
+                del _parser_leases[parser]
+                _parser_swap.notify_all()
+
+
+def _constraint_response(parser: SemanticParser, request: ChatRequest) -> ChatResponse:
+    """Parse the message as a constraint turn and merge it into the conversation state."""
+    response = _constraint_turn(parser, request)
+    merged = response.merged_constraints
+
+    # Use T5 for dynamic reply generation if model is ready
+    start = time.perf_counter()
+    if parser.is_fine_tuned:
+        response.natural_reply = parser.generate_reply_from_json(merged)
+    else:
+        response.natural_reply = parser.generate_reply(merged)
+    _record_stage("reply", start)
+    return response
+
+
+def _constraint_turn(parser: SemanticParser, request: ChatRequest) -> ChatResponse:
+    """Parse and merge a constraint turn; natural_reply is left for the caller to write."""
+    start = time.perf_counter()
+    parsed = parser.parse(request.message)
+    decode_path = parser.decode_path
+    _record_stage("parse", start)
+
+    stored = None
+    if request.previous_merged_constraints is None and request.conversation_id and conversation_store:
+        stored = conversation_store.get(request.conversation_id)
+
+    if request.previous_merged_constraints is not None:
+        # O(1) path: frontend echoes back the last merged state
+        base = request.previous_merged_constraints
+    elif stored is not None:
+        # O(1) path: merged state kept server-side for this conversation
+        base = stored
+    else:
+        # Fallback: rebuild from history (written back to the store below)
+        base: Dict = {
+            "groups": [],
+            "global": {"conflict_ok": None, "priority_rules": []},
+            "is_confirming": False,
+        }
+        start = time.perf_counter()
+        history = request.conversation_history or []
+        user_turns = [turn.content for turn in history if turn.role == "user"]
+        for turn_parsed in parser.parse_many(user_turns):   # one batched decode
+            base = parser.merge(base, turn_parsed)
+        _record_stage("history", start)
+
+    start = time.perf_counter()
+    merged = parser.merge(base, parsed)
+    _record_stage("merge", start)
+    if request.conversation_id and conversation_store:
+        conversation_store.put(request.conversation_id, merged)
+
+    return ChatResponse(
+        parsed_constraints=parsed,
+        merged_constraints=merged,
+        natural_reply="",
+        is_confirming=bool(parsed.get("is_confirming", False)),
+        response_type="constraint",
+        decode_path=decode_path,
+    )
+
+
+def apply_tuning():
+    """Install autotune.py's settings for this host and model as defaults; NLP_* variables still win."""
+    try:
+        source = resolve_model()
+    except (OSError, ValueError, KeyError):
+        return
+    if not source.model_dir.exists():
+        return
+    tuned, reason = tuned_settings(source.version)
+    if tuned is None:
+        print(f"Autotune: {reason}")
+        return
+    use_tuned(tuned)
+    print("Autotuned: " + ", ".join(f"{name}={value}" for name, value in sorted(tuned.items())))
+
+
+def _prepare_model(parser: SemanticParser):
+    """Runs after T5's weights are loaded, before traffic switches to it."""
+    if env_int("NLP_INFERENCE_WORKERS", 0) > 0:
+        parser.enable_pool()
+    if env_bool("NLP_BATCHING", True):
+        parser.enable_batching()
+    if env_bool("NLP_CONSTRAINED_DECODING", False):
+        parser.enable_constrained_decoding()
+    if env_bool("NLP_WARMUP", True):
+        try:
+            parser.warmup(all_batch_sizes=env_bool("NLP_WARMUP_ALL_BATCH_SIZES", False))
+        except Exception as e:
+            print(f"WARNING: Warmup failed ({e}); serving cold")
+
+
+def _bring_up_model():
+    """Load and warm T5, switch traffic to it, then mark the worker ready."""
+    try:
+        if semantic_parser.load(before_ready=_prepare_model):
+            print("✅ T5 loaded and warmed — now serving /chat")
+        else:
+            print("⚠️  T5 unavailable — serving with the fallback parser")
+    except Exception as e:
+        print(f"ERROR: T5 load failed ({e}); serving with the fallback parser")
+    finally:
+        service_ready.set()
+
+
+def reload_model(version: Optional[str] = None) -> Dict:
     """
-    Lightweight heuristic to determine if a message is a constraint query or general question.
-    Returns: 'constraint' or 'question'
+    Hot-swap T5 without downtime: load `version` (default: the registry's
+    CURRENT) beside the serving parser, prepare and warm it, switch new
+    requests to it, then retire the old parser once the requests still
+    running on it have finished (at most NLP_RELOAD_DRAIN_S seconds).
+
+    Parse and reply caches are keyed on the model version, so the new parser
+    never answers from the old model's results.
     """
-    msg_lower = message.lower()
-    
-    # Strong constraint indicators
-    constraint_keywords = [
-        'cce', 'cte', 'cee', 'cae', 'ccje', 'cbae', 'che', 'chse', 'case', 'cafe',  # colleges
-        'from', 'male', 'female', 'freshie', 'veteran', 'new member', 'old member',
-        'prioritize', 'priority', 'no class conflict', 'conflict', 'attendance first',
-        'get me', 'i need', 'i want', 'assign', 'kumuha', 'kailangan'
-    ]
-    
-    # Check for numbers (often indicates "X volunteers from...")
-    has_number = any(c.isdigit() for c in message)
-    
-    # Check for constraint keywords
-    has_constraint_keyword = any(keyword in msg_lower for keyword in constraint_keywords)
-    
-    # Strong question indicators
-    question_indicators = [
-        'what', 'how', 'who', 'when', 'where', 'why', 'which',
-        'show me', 'list', 'tell me', 'explain', 'help',
-        'what is', 'how many', 'who are'
-    ]
-    
-    has_question_word = any(indicator in msg_lower for indicator in question_indicators)
-    
-    # Decision logic
-    if has_constraint_keyword or has_number:
-        return 'constraint'
-    elif has_question_word:
-        return 'question'
-    else:
-        # Default to constraint for ambiguous cases (original behavior)
-        return 'constraint'
+    global semantic_parser
+
+    with _reload_lock:
+        target = resolve_model(version)     # KeyError / OSError: no such version
+        old = semantic_parser
+        if old is not None and old.is_fine_tuned and old.model_version == target.version:
+            return {"status": "unchanged", "model": old.model_name, "model_version": old.model_version}
+
+        print(f"Hot reload: loading {target.name} beside {old.model_name if old else None}…")
+        start = time.perf_counter()
+        parser = SemanticParser(model=target)
+        if not parser.is_fine_tuned:
+            raise RuntimeError(f"model {target.name} failed to load")
+        _prepare_model(parser)
+        load_s = time.perf_counter() - start
+
+        with _parser_swap:
+            semantic_parser = parser        # new requests lease the new parser from here on
+        drained = _retire_parser(old, env_float("NLP_RELOAD_DRAIN_S", 30.0)) if old is not None else True
+        print(f"✅ Hot reload: now serving {target.name} (loaded in {load_s:.1f}s, "
+              f"old parser {'drained' if drained else 'still busy, released anyway'})")
+        return {
+            "status":        "reloaded",
+            "model":         target.name,
+            "model_version": target.version,
+            "previous":      old.model_name if old else None,
+            "load_s":        round(load_s, 3),
+            "drained":       drained,
+        }
+
+
+def _retire_parser(parser: SemanticParser, timeout_s: float) -> bool:
+    """Wait for the requests leasing `parser` to finish, then stop its batcher and pool."""
+    with _parser_swap:
+        drained = _parser_swap.wait_for(lambda: _parser_leases[parser] <= 0, timeout_s)
+    # Stragglers past the timeout keep working: prompts already queued in the
+    # batcher or sent to pool workers are decoded before those stop (see
+    # InferenceBatcher.stop / InferencePool.close), and later calls decode in
+    # the straggler's own thread
+    parser.disable_batching()
+    parser.disable_pool()
+    return drained
+
+
+def _watch_registry(interval_s: float):
+    """Reload whenever the registry's CURRENT changes (NLP_MODEL_WATCH_S)."""
+    service_ready.wait()
+    registry = ModelRegistry()
+    failed = None       # don't retry a version that failed until CURRENT moves again
+    while True:
+        time.sleep(interval_s)
+        name = registry.current_name()
+        if name is None or name == failed or (semantic_parser and semantic_parser.model_name == name):
+            continue
+        try:
+            reload_model(name)
+            failed = None
+        except Exception as e:
+            print(f"ERROR: Hot reload of {name} failed ({e}); still serving the previous model")
+            failed = name
 
 
 # ─── Startup ─────────────────────────────────────────────────────────────────
 
 @app.on_event("startup")
 async def startup_event():
-    global semantic_parser
+    global semantic_parser, inference_executor, intent_router, conversation_store
 
     print("=" * 60)
     print("AssignAI NLP Service Starting...")
     print("=" * 60)
 
     try:
+        apply_tuning()
         print("Initializing semantic parser (T5-based primary)...")
-        semantic_parser = SemanticParser()
+        # With background loading the fallback parser and the rule fast path
+        # answer /chat while T5 loads; /health/ready stays 503 until it's warm
+        background = env_bool("NLP_BACKGROUND_LOAD", True)
+        if semantic_parser is None:     # serve_prefork.py hands workers an already loaded parser
+            semantic_parser = SemanticParser(defer_load=True)
+        intent_router = IntentRouter()
+        conversation_store = ConversationStore.from_env()
+        print(f"Conversation state store: {conversation_store.backend if conversation_store else 'off'}")
+        inference_executor = InferenceExecutor.from_env()
+        print(f"Inference executor: {inference_executor.max_in_flight} in flight, "
+              f"queue {inference_executor.max_queue}")
+
+        if background:
+            threading.Thread(target=_bring_up_model, name="model-load", daemon=True).start()
+            print("Loading T5 in the background — serving with the fallback parser meanwhile")
+        else:
+            _bring_up_model()
+            parser_type = "t5-fine-tuned" if semantic_parser.is_fine_tuned else "fallback (rule-based)"
+            print(f"✅ Semantic parser ready — mode: {parser_type}")
 
-        parser_type = "t5-fine-tuned" if semantic_parser.is_fine_tuned else "fallback (rule-based)"
-        print(f"✅ Semantic parser ready — mode: {parser_type}")
+        watch_s = env_float("NLP_MODEL_WATCH_S", 10.0)
+        if watch_s > 0:
+            threading.Thread(target=_watch_registry, args=(watch_s,), name="model-watch", daemon=True).start()
         print("=" * 60)
-        print("Service ready! Docs: http://localhost:8001/docs")
+        print("Service started! Docs: http://localhost:8001/docs")
         print("=" * 60)
 
     except Exception as e:
@@ -132,6 +358,16 @@ async def startup_event():
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if semantic_parser is not None:
+        semantic_parser.disable_pool()
+    if inference_executor is not None:
+        inference_executor.shutdown()
+    if conversation_store is not None:
+        conversation_store.close()
+
+
 # ─── Endpoints ───────────────────────────────────────────────────────────────
 
 @app.get("/", response_model=Dict)
@@ -156,11 +392,115 @@ async def health_check():
             else "fallback" if semantic_parser
             else "none"
         ),
+        inference_backend=semantic_parser.backend,
+        quantization=semantic_parser.quantization,
+        ready=service_ready.is_set(),
+        model_version=semantic_parser.model_name,
     )
 
 
+@app.get("/health/live", response_model=Dict)
+async def liveness():
+    """The process is up and serving HTTP (restart it if this fails)."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", response_model=Dict)
+async def readiness():
+    """The model is loaded and warmed up (route traffic here only when this is 200)."""
+    if semantic_parser is None or not service_ready.is_set():
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready", "warmup": semantic_parser.stats()["warmup"]}
+
+
+@app.get("/stats", response_model=Dict)
+async def stats():
+    """Inference queue and batching counters (JSON)."""
+    return {
+        "executor": inference_executor.stats() if inference_executor else None,
+        "intent_routing": intent_router.stats() if intent_router else None,
+        "conversation_store": conversation_store.stats() if conversation_store else None,
+        **(semantic_parser.stats() if semantic_parser else {}),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency, token counts, caches, queue (see service_metrics.py)."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def _collect_service_metrics():
+    """Gauges and counters the components already keep, read when /metrics is scraped."""
+    parser = semantic_parser
+    yield family("nlp_ready", "gauge", "1 once T5 is loaded and warmed up.", [(None, int(service_ready.is_set()))])
+    if parser is not None:
+        stats = parser.stats()
+        caches = {"parse": stats["parse_cache"], "reply": stats["reply_cache"]}
+        if conversation_store is not None:
+            caches["conversation"] = conversation_store.stats()
+        yield family("nlp_cache_hits_total", "counter", "Cache hits.",
+                     [({"cache": name}, c["hits"]) for name, c in caches.items()])
+        yield family("nlp_cache_misses_total", "counter", "Cache misses.",
+                     [({"cache": name}, c["misses"]) for name, c in caches.items()])
+        yield family("nlp_cache_hit_ratio", "gauge", "Hits / lookups since start.",
+                     [({"cache": name}, c["hit_ratio"]) for name, c in caches.items()])
+        decoding = stats["decoding"]
+        yield family("nlp_parse_decodes_total", "counter", "T5 parse decodes by decoding path.", [
+            ({"path": "greedy"}, decoding["greedy_accepted"]),
+            ({"path": "escalated"}, decoding["escalated"]),
+            ({"path": "beam"}, decoding["beam_only"]),
+            ({"path": "constrained"}, decoding["constrained"]),
+        ])
+        flights = stats["single_flight"]["tasks"]
+        yield family("nlp_single_flight_leaders_total", "counter", "T5 runs that identical concurrent requests could join.",
+                     [({"task": task}, c["leaders"]) for task, c in flights.items()])
+        yield family("nlp_coalesced_requests_total", "counter", "Requests that joined an identical in-flight T5 run.",
+                     [({"task": task}, c["coalesced"]) for task, c in flights.items()])
+        if stats["fast_path"]:
+            yield family("nlp_fast_path_answered_total", "counter", "Parses answered by the rule fast path.",
+                         [(None, stats["fast_path"]["answered"])])
+        if stats["batcher"]:
+            yield family("nlp_batches_total", "counter", "Micro-batches decoded.", [(None, stats["batcher"]["batches"])])
+            yield family("nlp_batched_requests_total", "counter", "Decodes that went through the micro-batcher.",
+                         [(None, stats["batcher"]["requests"])])
+        if stats["pool"]:
+            yield family("nlp_pool_workers_alive", "gauge", "Live inference pool workers.",
+                         [(None, stats["pool"]["alive"])])
+            yield family("nlp_pool_queued_prompts", "gauge", "Prompts waiting in inference pool workers.",
+                         [(None, sum(w["queued"] for w in stats["pool"]["per_worker"]))])
+    if inference_executor is not None:
+        executor = inference_executor.stats()
+        yield family("nlp_requests_in_flight", "gauge", "Chat turns running on the inference executor.",
+                     [(None, executor["in_flight"])])
+        yield family("nlp_requests_queued", "gauge", "Chat turns waiting for an inference slot.",
+                     [(None, executor["queue_depth"])])
+        yield family("nlp_requests_completed_total", "counter", "Chat turns finished.", [(None, executor["completed"])])
+        yield family("nlp_requests_rejected_total", "counter", "Chat turns rejected with 503 (queue full).",
+                     [(None, executor["rejected"])])
+        yield family("nlp_requests_expired_total", "counter", "Chat turns dropped because their deadline could not be met.",
+                     [(None, executor["expired"])])
+        yield family("nlp_requests_cancelled_total", "counter", "Chat turns dropped because the client went away.",
+                     [(None, executor["cancelled"])])
+    if intent_router is not None:
+        routing = intent_router.stats()
+        yield family("nlp_intents_total", "counter", "Messages by routed intent.",
+                     [({"intent": intent}, routing[intent]) for intent in ("constraint", "question")])
+        yield family("nlp_intent_redirects_total", "counter", "Questions the Q&A model handed back as constraints.",
+                     [(None, routing["redirected"])])
+
+
+REGISTRY.register_collector(_collect_service_metrics)
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    http_response: Response,
+    x_debug_timing: Optional[str] = Header(None),
+    x_request_timeout: Optional[str] = Header(None),
+):
     """
     Multi-turn chat for AssignAI with multi-task support.
 
@@ -169,96 +509,387 @@ async def chat(request: ChatRequest):
     2. General Q&A: "What is UMAL?", "Show me CCE members"
     
     The system automatically routes between constraint parsing and conversational Q&A.
+
+    With `X-Debug-Timing: 1` the response also carries a Server-Timing header
+    and a `timings` block (see request_timing.py).
+
+    `X-Request-Timeout` (seconds, default NLP_REQUEST_TIMEOUT_S) is when the
+    caller gives up: a turn that can't be served by then gets a 504 without
+    running, or stops where it is.  A turn whose client disconnects is
+    cancelled, queued or running.
     """
-    if semantic_parser is None:
+    if semantic_parser is None or inference_executor is None:
+        raise HTTPException(status_code=503, detail="Semantic parser not initialized")
+
+    # T5 inference blocks, so it runs on a bounded inference pool; that keeps
+    # the event loop free and lets concurrent turns meet in the micro-batcher.
+    start = time.perf_counter()
+    timings = request_timing.start() if request_timing.requested(x_debug_timing) else None
+    cancel = threading.Event()
+    try:
+        turn = inference_executor.submit(_handle_chat, request, priority=_priority(request),
+                                         deadline=_deadline(x_request_timeout), cancel=cancel)
+        response = await _await_turn(http_request, turn, cancel)
+    except InferenceQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail="NLP service is at capacity, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RequestCancelled:
+        return Response(status_code=499)    # nobody is listening any more
+    CHAT_SECONDS.observe(time.perf_counter() - start, "chat", response.response_type)
+    if timings is not None:
+        response.timings = timings.as_dict()
+        http_response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
+
+@app.get("/admin/models", response_model=Dict)
+async def admin_models():
+    """Published model versions (manifests without per-file hashes) and the one being served."""
+    registry = ModelRegistry()
+    return {
+        "serving": semantic_parser.model_name if semantic_parser else None,
+        "current": registry.current_name(),
+        "versions": [
+            {key: value for key, value in manifest.items() if key != "files"}
+            for manifest in registry.versions()
+        ],
+    }
+
+
+def _require_admin(http_request: Request, x_admin_token: Optional[str]):
+    """
+    Admin endpoints are protected by NLP_ADMIN_TOKEN (sent as X-Admin-Token);
+    without a token configured only local callers may use them.
+    """
+    token = env_str("NLP_ADMIN_TOKEN", "")
+    if token:
+        if not x_admin_token or not hmac.compare_digest(x_admin_token, token):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+    elif http_request.client is None or http_request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Set NLP_ADMIN_TOKEN to use admin endpoints from another host")
+
+
+@app.post("/admin/reload", response_model=Dict)
+async def admin_reload(
+    http_request: Request,
+    request: Optional[ReloadRequest] = None,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Load a model version beside the serving one, warm it, swap it in and
+    drain the old one — no restart, no cold start.
+
+    Admin only (see _require_admin).
+    """
+    _require_admin(http_request, x_admin_token)
+    if not service_ready.is_set():
+        raise HTTPException(status_code=409, detail="Initial model load still in progress")
+
+    version = request.version if request else None
+    try:
+        return await run_in_threadpool(reload_model, version)
+    except (KeyError, OSError) as e:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {version!r}: {e}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving the previous model: {e}")
+
+
+@app.post("/admin/profile", response_model=Dict)
+async def admin_profile_start(
+    http_request: Request,
+    request: Optional[ProfileRequest] = None,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Profile the next `requests` chat turns or `seconds` seconds, whichever
+    ends first (see profiling.py).  Admin only.
+    """
+    _require_admin(http_request, x_admin_token)
+    request = request or ProfileRequest()
+    try:
+        session = profiling.start(request.mode, request.requests, request.seconds, request.operators)
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.describe()
+
+
+@app.delete("/admin/profile", response_model=Dict)
+async def admin_profile_stop(http_request: Request, x_admin_token: Optional[str] = Header(None)):
+    """End the running profiling session now and write its files.  Admin only."""
+    _require_admin(http_request, x_admin_token)
+    session = await run_in_threadpool(profiling.stop)
+    if session is None:
+        raise HTTPException(status_code=404, detail="No profiling session is running")
+    return session.describe()
+
+
+@app.get("/admin/profile", response_model=Dict)
+async def admin_profile_status(http_request: Request, x_admin_token: Optional[str] = Header(None)):
+    """The running session, if any, and finished sessions with their files.  Admin only."""
+    _require_admin(http_request, x_admin_token)
+    session = profiling.active()
+    return {
+        "active": session.describe() if session else None,
+        "sessions": [
+            {**s, "downloads": [f"/admin/profile/{s['id']}/{name}" for name in s["files"]]}
+            for s in profiling.sessions()
+        ],
+    }
+
+
+@app.get("/admin/profile/{session_id}/{filename}")
+async def admin_profile_download(
+    session_id: str,
+    filename: str,
+    http_request: Request,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """Download one file of a finished profiling session.  Admin only."""
+    _require_admin(http_request, x_admin_token)
+    try:
+        path = profiling.session_file(session_id, filename)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"No profile file {session_id}/{filename}")
+    return FileResponse(path, filename=f"{session_id}-{filename}")
+
+
+@app.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    x_debug_timing: Optional[str] = Header(None),
+    x_request_timeout: Optional[str] = Header(None),
+):
+    """
+    /chat as Server-Sent Events, so the constraints don't wait for the reply:
+
+      event: parse   the response without natural_reply, as soon as the
+                     message is parsed and merged
+      event: token   {"text": …} pieces of natural_reply as T5 decodes them
+      event: done    the complete ChatResponse, as /chat would return it
+      event: error   {"detail": …}
+
+    Streams count against the same in-flight limit, priorities and
+    X-Request-Timeout deadline as /chat; closing the connection stops the
+    decode.  With `X-Debug-Timing: 1` the done event carries the `timings`
+    block.
+    """
+    if semantic_parser is None or inference_executor is None:
         raise HTTPException(status_code=503, detail="Semantic parser not initialized")
 
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    disconnected = threading.Event()
+
+    def emit(event: Optional[str], data: Optional[Dict] = None):
+        if not disconnected.is_set():
+            loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    if request_timing.requested(x_debug_timing):
+        request_timing.start()      # before submit, which copies this context
+    try:
+        turn = inference_executor.submit(_stream_chat, request, emit, disconnected, time.perf_counter(),
+                                         priority=_priority(request), deadline=_deadline(x_request_timeout),
+                                         cancel=disconnected)
+    except InferenceQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail="NLP service is at capacity, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+    def refused(future):
+        # Dropped before _stream_chat ran (deadline passed while queued, or
+        # shutdown): nothing else will end the stream
+        if future.cancelled():
+            emit("error", {"detail": "NLP service is shutting down"})
+        elif future.exception() is not None:
+            emit("error", {"detail": str(future.exception())})
+        else:
+            return
+        emit(None)
+
+    turn.add_done_callback(refused)
+
+    async def body():
+        try:
+            while True:
+                event, data = await events.get()
+                if event is None:
+                    return
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            disconnected.set()      # stops the decode if the client went away
+
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _stream_chat(request: ChatRequest, emit, disconnected: threading.Event, submitted: float):
+    """Inference-thread side of /chat/stream: run the turn, emitting events as they are ready."""
+    _record_queue_wait()
+    try:
+        with profiling.request(), _lease_parser() as parser, closing(_chat_events(parser, request)) as events:
+            for event, data in events:
+                if disconnected.is_set():
+                    return
+                emit(event, data)
+                if event == "done":
+                    CHAT_SECONDS.observe(time.perf_counter() - submitted, "chat_stream", data["response_type"])
+    except Exception as e:
+        emit("error", {"detail": f"Chat processing failed: {str(e)}"})
+    finally:
+        emit(None)
+
+
+def _chat_events(parser: SemanticParser, request: ChatRequest):
+    """The /chat turn (see _chat_turn) as (event, data) pairs."""
+    if _classify(request.message) == QUESTION:
+        start = time.perf_counter()
+        kind, pieces = parser.stream_answer(request.message)
+        if kind != "redirect":
+            head = ChatResponse(
+                parsed_constraints={},
+                merged_constraints={},
+                natural_reply="",
+                is_confirming=False,
+                response_type="query" if kind == "query" else "answer",
+            )
+            yield from _reply_events(head, pieces, "answer", start)
+            return
+        _record_stage("redirect", start)
+        intent_router.record_redirect()
+
+    head = _constraint_turn(parser, request)
+    start = time.perf_counter()
+    yield from _reply_events(head, parser.stream_reply_from_json(head.merged_constraints), "reply", start)
+
+
+def _reply_events(head: ChatResponse, pieces, stage: str, start: float):
+    yield "parse", head.model_dump(exclude={"natural_reply"})
+    reply = []
+    for piece in pieces:
+        reply.append(piece)
+        yield "token", {"text": piece}
+    _record_stage(stage, start)
+    head.natural_reply = "".join(reply).strip()
+    timings = request_timing.current()
+    if timings is not None:
+        head.timings = timings.as_dict()
+    yield "done", head.model_dump()
+
+
+def _deadline(x_request_timeout: Optional[str]) -> float:
+    """time.monotonic() deadline from X-Request-Timeout (seconds), else NLP_REQUEST_TIMEOUT_S."""
+    timeout = env_float("NLP_REQUEST_TIMEOUT_S", 30.0)    # Laravel's services.nlp.timeout
+    if x_request_timeout:
+        try:
+            timeout = float(x_request_timeout)
+        except ValueError:
+            pass
+    return time.monotonic() + max(0.0, timeout)
+
+
+def _priority(request: ChatRequest) -> str:
+    """
+    Scheduling class of a turn, judged on the event loop without running it:
+    Q&A generation is LONG; a constraint turn whose message the fast path or
+    parse cache answers, with no history to re-parse, is CHEAP.
+    """
+    if intent_router is not None and intent_router.route(request.message) == QUESTION:
+        return LONG
+    history_known = (request.previous_merged_constraints is not None or request.conversation_id
+                     or not any(turn.role == "user" for turn in request.conversation_history or []))
+    if history_known and semantic_parser is not None and semantic_parser.is_cheap(request.message):
+        return CHEAP
+    return NORMAL
+
+
+async def _await_turn(http_request: Request, turn, cancel: threading.Event):
+    """The turn's result; if the client disconnects first, the turn is cancelled."""
+    waiting = asyncio.wrap_future(turn)
+    while True:
+        done, _ = await asyncio.wait({waiting}, timeout=DISCONNECT_POLL_S)
+        if done:
+            return waiting.result()
+        if await http_request.is_disconnected():
+            cancel.set()
+            turn.cancel()
+            raise RequestCancelled("Client disconnected")
+
+
+def _record_stage(stage: str, start: float):
+    """Observe a pipeline stage in /metrics and, if asked for, in the request's timings."""
+    elapsed = time.perf_counter() - start
+    STAGE_SECONDS.observe(elapsed, stage)
+    timings = request_timing.current()
+    if timings is not None:
+        timings.add(stage, elapsed)
+
+
+def _record_queue_wait():
+    """Time the request spent waiting for an inference slot (timings only)."""
+    timings = request_timing.current()
+    if timings is not None:
+        timings.add("queue", time.perf_counter() - timings.started)
+
+
+def _classify(message: str) -> str:
+    start = time.perf_counter()
+    intent = intent_router.classify(message)
+    _record_stage("intent", start)
+    return intent
+
+
+def _handle_chat(request: ChatRequest) -> ChatResponse:
+    _record_queue_wait()
+    with profiling.request(), _lease_parser() as parser:
+        return _chat_turn(parser, request)
+
+
+def _chat_turn(parser: SemanticParser, request: ChatRequest) -> ChatResponse:
     try:
-        # Classify intent
-        intent = classify_intent(request.message)
-        
-        if intent == 'constraint':
-            # ─── Constraint Parsing Path ───
-            parsed = semantic_parser.parse(request.message)
-
-            if request.previous_merged_constraints is not None:
-                # O(1) path: frontend echoes back the last merged state
-                base = request.previous_merged_constraints
-            else:
-                # Fallback: re-parse all history
-                base: Dict = {
-                    "groups": [],
-                    "global": {"conflict_ok": None, "priority_rules": []},
-                    "is_confirming": False,
-                }
-                history = request.conversation_history or []
-                for turn in history:
-                    if turn.role == "user":
-                        turn_parsed = semantic_parser.parse(turn.content)
-                        base = semantic_parser.merge(base, turn_parsed)
-
-            merged = semantic_parser.merge(base, parsed)
-            
-            # Use T5 for dynamic reply generation if model is ready
-            if semantic_parser.is_fine_tuned:
-                natural_reply = semantic_parser.generate_reply_from_json(merged)
-            else:
-                natural_reply = semantic_parser.generate_reply(merged)
+        # Intent is settled here, before any T5 decode
+        if _classify(request.message) != QUESTION:
+            return _constraint_response(parser, request)
 
+        # ─── General Q&A Path ───
+        start = time.perf_counter()
+        qa_response = parser.answer_question(request.message)
+        _record_stage("redirect" if qa_response["type"] == "redirect" else "answer", start)
+
+        if qa_response["type"] == "query":
+            # Return the raw query directive for Laravel to parse
             return ChatResponse(
-                parsed_constraints=parsed,
-                merged_constraints=merged,
-                natural_reply=natural_reply,
-                is_confirming=bool(parsed.get("is_confirming", False)),
-                response_type="constraint",
+                parsed_constraints={},
+                merged_constraints={},
+                natural_reply=qa_response['content'],  # Pass through unchanged
+                is_confirming=False,
+                response_type="query",  # Needs data from Laravel
             )
-        
+        elif qa_response["type"] == "redirect":
+            # Q&A model read it as a constraint after all: handle it as a
+            # normal constraint turn, merged with the conversation so far
+            intent_router.record_redirect()
+            return _constraint_response(parser, request)
         else:
-            # ─── General Q&A Path ───
-            qa_response = semantic_parser.answer_question(request.message)
-            
-            if qa_response["type"] == "query":
-                # Return the raw query directive for Laravel to parse
-                return ChatResponse(
-                    parsed_constraints={},
-                    merged_constraints={},
-                    natural_reply=qa_response['content'],  # Pass through unchanged
-                    is_confirming=False,
-                    response_type="query",  # Needs data from Laravel
-                )
-            elif qa_response["type"] == "redirect":
-                # Model detected this should be handled as constraint
-                # Recursively call with constraint handling
-                parsed = semantic_parser.parse(request.message)
-                merged = parsed  # First turn, no merge needed
-                natural_reply = semantic_parser.generate_reply_from_json(merged) if semantic_parser.is_fine_tuned else semantic_parser.generate_reply(merged)
-                
-                return ChatResponse(
-                    parsed_constraints=parsed,
-                    merged_constraints=merged,
-                    natural_reply=natural_reply,
-                    is_confirming=False,
-                    response_type="constraint",
-                )
-            elif qa_response["type"] == "error":
-                # Error in Q&A generation
-                return ChatResponse(
-                    parsed_constraints={},
-                    merged_constraints={},
-                    natural_reply=qa_response["content"],
-                    is_confirming=False,
-                    response_type="answer",  # Just an answer, no recommendations
-                )
-            else:
-                # Normal answer
-                return ChatResponse(
-                    parsed_constraints={},
-                    merged_constraints={},
-                    natural_reply=qa_response["content"],
-                    is_confirming=False,
-                    response_type="answer",  # Just an answer, no recommendations
-                )
-                
+            # Normal answer, or an error in Q&A generation
+            return ChatResponse(
+                parsed_constraints={},
+                merged_constraints={},
+                natural_reply=qa_response["content"],
+                is_confirming=False,
+                response_type="answer",  # Just an answer, no recommendations
+            )
+
+    except (RequestCancelled, DeadlineExceeded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
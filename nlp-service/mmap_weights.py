@@ -0,0 +1,90 @@
+"""
+Memory-mapped Weights
+=====================
+Loads the fine-tuned T5 straight from `model.safetensors` without copying it.
+
+from_pretrained() reads every tensor into anonymous process memory, so each
+uvicorn worker holds its own ~240 MB of identical weights.  Here the file is
+mapped privately (safetensors' safe_open), the model is built on the meta
+device, and the mapped tensors are assigned as its parameters.  The weights
+then live in the kernel page cache: every process that maps the file shares
+the same physical pages, and loading costs page faults instead of a read.
+
+Inference never writes to the parameters, so no page is ever copied.  int8
+quantization replaces the Linear weights with new tensors and therefore gives
+up the sharing (main.py still works, it just doesn't save memory).
+"""
+
+from pathlib import Path
+from typing import Dict, List
+
+WEIGHTS_FILE = "model.safetensors"
+
+
+def read_safetensors(path: Path) -> Dict[str, "torch.Tensor"]:
+    """Every tensor in a .safetensors file, backed by a private mapping of it."""
+    from safetensors import safe_open
+
+    with safe_open(str(path), framework="pt") as f:
+        return {name: f.get_tensor(name) for name in f.keys()}
+
+
+def load_t5_mmap(model_dir: Path):
+    """
+    T5ForConditionalGeneration whose parameters are the mapped file's pages.
+
+    Raises if the directory has no safetensors file or a parameter is missing
+    from it (the caller falls back to from_pretrained).
+    """
+    import torch
+    from transformers import GenerationConfig, T5Config, T5ForConditionalGeneration
+
+    weights = Path(model_dir) / WEIGHTS_FILE
+    if not weights.exists():
+        raise FileNotFoundError(f"{weights} missing — mmap loading needs safetensors weights")
+
+    config = T5Config.from_pretrained(str(model_dir))
+    with torch.device("meta"):
+        model = T5ForConditionalGeneration(config)
+    model.load_state_dict(read_safetensors(weights), strict=False, assign=True)
+    model.tie_weights()     # embed_tokens / lm_head are stored once, as shared.weight
+
+    missing = meta_tensors(model)
+    if missing:
+        raise RuntimeError(f"{len(missing)} tensors not in {WEIGHTS_FILE} (e.g. {missing[0]})")
+    if (Path(model_dir) / "generation_config.json").exists():
+        model.generation_config = GenerationConfig.from_pretrained(str(model_dir))
+    model.requires_grad_(False)
+    return model.eval()
+
+
+def meta_tensors(model) -> List[str]:
+    """Names of parameters and buffers that were never materialized."""
+    tensors = list(model.named_parameters()) + list(model.named_buffers())
+    return [name for name, t in tensors if t.is_meta]
+
+
+def mapped_fraction(model, path: Path) -> float:
+    """
+    Share of the model's parameter bytes that point into a mapping of `path`
+    (Linux only; 0.0 where /proc/self/maps is unavailable).
+    """
+    path = str(Path(path).resolve())
+    ranges = []
+    try:
+        with open("/proc/self/maps", encoding="utf-8") as maps:
+            for line in maps:
+                fields = line.split()
+                if len(fields) >= 6 and fields[5] == path:
+                    start, end = (int(x, 16) for x in fields[0].split("-"))
+                    ranges.append((start, end))
+    except OSError:
+        return 0.0
+
+    total = mapped = 0
+    for p in {id(p): p for p in model.parameters()}.values():
+        size = p.numel() * p.element_size()
+        total += size
+        if any(start <= p.data_ptr() < end for start, end in ranges):
+            mapped += size
+    return mapped / total if total else 0.0
@@ -0,0 +1,180 @@
+"""
+Model Registry
+==============
+Versioned fine-tuned checkpoints, so publishing a new model never touches
+files a running service is reading.
+
+  semantic_models/
+    v0001-3fa9c2e1/
+      model/          T5 weights and config (save_pretrained)
+      tokenizer/      matching tokenizer
+      manifest.json   name, content hash, per-file hashes, training metadata
+    v0002-…/
+    CURRENT           name of the active version, replaced atomically
+
+publish() copies a checkpoint into a staging directory, hashes it, writes the
+manifest, renames the directory into place and only then points CURRENT at
+it, so a reader sees the old version or the new one, never a partial one.
+Older versions stay on disk (the newest KEEP_VERSIONS) for rollback and for
+requests still draining from them.
+
+A version's content hash is also the parser's model_version: parse and reply
+caches, the int8 gate, the ONNX export and autotune.json are keyed on it, so
+they stop applying as soon as a different version is loaded.
+
+Without a registry, the legacy ./semantic_model and ./semantic_tokenizer
+directories are used as before.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from inference_cache import model_fingerprint
+
+REGISTRY_DIR  = Path(__file__).parent / "semantic_models"
+CURRENT_FILE  = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+KEEP_VERSIONS = 5
+
+
+class ModelVersion(NamedTuple):
+    """One loadable checkpoint: a registry version or the legacy directories."""
+    name: str           # "v0003-1a2b3c4d", or "legacy"
+    model_dir: Path
+    tok_dir: Path
+    version: str        # content hash prefix (registry) or file fingerprint (legacy)
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_hashes(root: Path) -> Dict[str, str]:
+    """sha256 of every file under `root`, keyed by its relative path."""
+    return {
+        path.relative_to(root).as_posix(): _file_sha256(path)
+        for path in sorted(p for p in root.rglob("*") if p.is_file())
+    }
+
+
+def _combined_hash(files: Dict[str, str]) -> str:
+    h = hashlib.sha256()
+    for name, digest in sorted(files.items()):
+        h.update(f"{name}:{digest};".encode())
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    """Versioned checkpoints under one directory (see module docstring)."""
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root or REGISTRY_DIR)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def current_name(self) -> Optional[str]:
+        try:
+            return (self.root / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+        except OSError:
+            return None
+
+    def manifest(self, name: str) -> Dict[str, Any]:
+        return json.loads((self.root / name / MANIFEST_FILE).read_text(encoding="utf-8"))
+
+    def get(self, name: str) -> ModelVersion:
+        # `name` may come straight from /admin/reload: only published versions
+        # are accepted, so it can never point outside the registry.
+        if "/" in name or "\\" in name or name not in self._names():
+            raise KeyError(name)
+        manifest = self.manifest(name)
+        return ModelVersion(name, self.root / name / "model", self.root / name / "tokenizer",
+                            manifest["content_hash"][:12])
+
+    def versions(self) -> List[Dict[str, Any]]:
+        """Manifests of every published version, oldest first."""
+        return [self.manifest(name) for name in self._names()]
+
+    def publish(self, model_dir: Path, tok_dir: Path, training: Optional[Dict[str, Any]] = None,
+                activate: bool = True) -> ModelVersion:
+        """
+        Add a checkpoint as a new version (or return the existing version with
+        identical content) and, by default, make it CURRENT.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = self.root / f".staging-{os.getpid()}-{time.time_ns()}"
+        try:
+            shutil.copytree(model_dir, staging / "model")
+            shutil.copytree(tok_dir, staging / "tokenizer")
+            files = content_hashes(staging)
+            content_hash = _combined_hash(files)
+
+            existing = next((m["name"] for m in self.versions() if m["content_hash"] == content_hash), None)
+            if existing is not None:
+                shutil.rmtree(staging)
+                name = existing
+            else:
+                number = 1 + max((int(m["name"][1:5]) for m in self.versions()), default=0)
+                name = f"v{number:04d}-{content_hash[:8]}"
+                manifest = {
+                    "name":         name,
+                    "content_hash": content_hash,
+                    "created_at":   time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "training":     training or {},
+                    "files":        files,
+                }
+                (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+                os.rename(staging, self.root / name)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(name)
+        return self.get(name)
+
+    def activate(self, name: str):
+        """Point CURRENT at `name`; running services pick it up on their next reload."""
+        self.get(name)
+        tmp = self.root / f"{CURRENT_FILE}.tmp"
+        tmp.write_text(name + "\n", encoding="utf-8")
+        os.replace(tmp, self.root / CURRENT_FILE)
+
+    def prune(self, keep: int = KEEP_VERSIONS) -> List[str]:
+        """Delete all but the newest `keep` versions; CURRENT is always kept."""
+        current = self.current_name()
+        names = [m["name"] for m in self.versions()]
+        doomed = [n for n in names[:max(0, len(names) - keep)] if n != current]
+        for name in doomed:
+            shutil.rmtree(self.root / name, ignore_errors=True)
+        return doomed
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Internal
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _names(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / MANIFEST_FILE).exists())
+
+
+def resolve_model(name: Optional[str] = None, registry: Optional[ModelRegistry] = None) -> ModelVersion:
+    """The named version, else the registry's CURRENT, else the legacy directories."""
+    from semantic_parser import MODEL_DIR, TOK_DIR
+
+    registry = registry or ModelRegistry()
+    name = name or registry.current_name()
+    if name:
+        return registry.get(name)
+    return ModelVersion("legacy", MODEL_DIR, TOK_DIR, model_fingerprint(MODEL_DIR))
@@ -0,0 +1,341 @@
+"""
+On-demand Profiling
+===================
+Profiles the running service for the next N chat turns or T seconds, without
+a restart, and keeps the results as files an admin can download.
+
+Two modes:
+
+  deterministic  every profiled turn runs under cProfile (Python calls) and
+                 torch.profiler (operators, with input shapes).  Turns are
+                 profiled one at a time; a turn that arrives while another
+                 is being profiled runs normally and does not count.
+  sampling       a background thread records every thread's Python stack
+                 NLP_PROFILE_SAMPLE_HZ times a second (default 100).  Costs
+                 far less than cProfile and sees the micro-batcher, stream
+                 and executor threads alike, at the price of precision.
+
+A session writes to profiles/<id>/ (NLP_PROFILE_DIR):
+
+  session.json        settings, turns captured, files
+  python.pstats       cProfile stats of all turns, merged (pstats / snakeviz)
+  python.txt          the same, top functions by cumulative time
+  torch-NNN.json      one Chrome trace per turn (chrome://tracing, Perfetto)
+  torch_ops.txt       operators of all turns by self CPU time
+  stacks.txt          sampled stacks in collapsed format (flamegraph.pl, speedscope)
+  sampling.txt        top functions by samples on top of the stack
+
+torch.profiler records all threads where the installed torch supports it, so
+decodes on the micro-batcher or the /chat/stream reply thread are included —
+and so are operators of unprofiled turns running at the same time.  With the
+inference pool on, decodes run in worker processes and only their round trip
+is seen here.  Under serve_prefork.py each worker process profiles itself.
+
+While no session is running, request() is one global read and a shared
+nullcontext: no profiler hooks are installed.
+
+Usage:
+  curl -X POST localhost:8000/admin/profile -H "X-Admin-Token: $NLP_ADMIN_TOKEN" \\
+       -H "Content-Type: application/json" -d '{"requests": 20}'
+  curl localhost:8000/admin/profile -H "X-Admin-Token: $NLP_ADMIN_TOKEN"
+  curl -O localhost:8000/admin/profile/<id>/python.pstats -H "X-Admin-Token: $NLP_ADMIN_TOKEN"
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from service_config import env_float, env_str
+
+DETERMINISTIC = "deterministic"
+SAMPLING      = "sampling"
+MODES         = (DETERMINISTIC, SAMPLING)
+
+DEFAULT_REQUESTS  = 20
+DEFAULT_SAMPLE_HZ = 100.0
+MAX_SECONDS       = 600.0
+
+_NULL = contextlib.nullcontext()
+
+
+class ProfilerBusy(Exception):
+    """Raised when a session is started while another is still running."""
+
+
+def profile_dir() -> Path:
+    return Path(env_str("NLP_PROFILE_DIR", str(Path(__file__).parent / "profiles")))
+
+
+class ProfileSession:
+    """One capture: the next `requests` turns or `seconds` seconds, whichever ends first."""
+
+    def __init__(self, mode: str = DETERMINISTIC, requests: Optional[int] = None,
+                 seconds: Optional[float] = None, operators: bool = True, root: Optional[Path] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {MODES}")
+        if requests is None and seconds is None:
+            requests = DEFAULT_REQUESTS
+        now = time.time()
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{os.getpid()}"
+        self.mode = mode
+        self.requests = requests
+        self.seconds = min(seconds, MAX_SECONDS) if seconds is not None else MAX_SECONDS
+        self.operators = operators and mode == DETERMINISTIC
+        self.dir = Path(root or profile_dir()) / self.id
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.captured = 0
+        self.skipped = 0            # deterministic turns that overlapped a profiled one
+        self.files: List[str] = []
+        self.error: Optional[str] = None
+
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._capturing = threading.Lock()
+        self._stats: Optional[pstats.Stats] = None
+        self._ops: Dict[str, List[float]] = {}     # operator → [calls, self µs, total µs]
+        self._samples: Counter = Counter()          # collapsed stack → samples
+        self._sampler: Optional[threading.Thread] = None
+        self._timer = threading.Timer(self.seconds, self.finish)
+        self._timer.daemon = True
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def start(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._timer.start()
+        if self.mode == SAMPLING:
+            self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+            self._sampler.start()
+        print(f"[Profiler] Session {self.id}: {self.mode}, "
+              f"{self.requests or 'unlimited'} turn(s) within {self.seconds:.0f}s → {self.dir}")
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Profile one chat turn (deterministic mode) and count it."""
+        if self.done:
+            yield
+            return
+        if self.mode == SAMPLING:
+            yield
+            self._count()
+            return
+        if not self._capturing.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            yield
+            return
+        try:
+            profile = cProfile.Profile()
+            operators = self._torch_profiler() if self.operators else None
+            with operators or _NULL:
+                profile.enable()
+                try:
+                    yield
+                finally:
+                    profile.disable()
+            self._collect(profile, operators)
+        finally:
+            self._capturing.release()
+        self._count()
+
+    def finish(self):
+        """End the session and write its files; safe to call more than once."""
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._done.set()
+        self._timer.cancel()
+        if self._sampler is not None:
+            self._sampler.join()
+        with self._capturing:               # let a turn being profiled finish first
+            try:
+                self._write()
+            except Exception as e:
+                self.error = str(e)
+                print(f"[Profiler] Writing session {self.id} failed: {e}")
+        global _session
+        with _session_lock:
+            if _session is self:
+                _session = None
+        print(f"[Profiler] Session {self.id} finished: {self.captured} turn(s), {len(self.files)} file(s)")
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id":         self.id,
+            "mode":       self.mode,
+            "status":     "done" if self.done else "running",
+            "started_at": self.started_at,
+            "requests":   self.requests,
+            "seconds":    self.seconds,
+            "operators":  self.operators,
+            "captured":   self.captured,
+            "skipped":    self.skipped,
+            "files":      list(self.files),
+            "error":      self.error,
+        }
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Internal
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _count(self):
+        with self._lock:
+            self.captured += 1
+            limit_reached = self.requests is not None and self.captured >= self.requests
+        if limit_reached:
+            # Writing the files should not hold up the turn that completed the session
+            threading.Thread(target=self.finish, name="profile-finish", daemon=True).start()
+
+    def _torch_profiler(self):
+        try:
+            from torch.profiler import ProfilerActivity, profile
+        except ImportError:
+            return None
+        kwargs = {"activities": [ProfilerActivity.CPU], "record_shapes": True}
+        try:
+            from torch._C._profiler import _ExperimentalConfig
+            kwargs["experimental_config"] = _ExperimentalConfig(profile_all_threads=True)
+        except (ImportError, TypeError):
+            pass        # older torch: operators of the request thread only
+        return profile(**kwargs)
+
+    def _collect(self, profile: cProfile.Profile, operators):
+        """Fold one turn's results into the session (runs under _capturing)."""
+        if self._stats is None:
+            self._stats = pstats.Stats(profile)
+        else:
+            self._stats.add(profile)
+        if operators is None:
+            return
+        name = f"torch-{self.captured + 1:03d}.json"
+        operators.export_chrome_trace(str(self.dir / name))
+        self.files.append(name)
+        for event in operators.key_averages():
+            totals = self._ops.setdefault(event.key, [0, 0.0, 0.0])
+            totals[0] += event.count
+            totals[1] += event.self_cpu_time_total
+            totals[2] += event.cpu_time_total
+
+    def _sample(self):
+        interval = 1.0 / max(1.0, env_float("NLP_PROFILE_SAMPLE_HZ", DEFAULT_SAMPLE_HZ))
+        me = threading.get_ident()
+        while not self._done.wait(interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._samples[";".join(reversed(stack))] += 1
+
+    def _write(self):
+        if self._stats is not None:
+            self._stats.dump_stats(str(self.dir / "python.pstats"))
+            text = io.StringIO()
+            pstats.Stats(str(self.dir / "python.pstats"), stream=text).sort_stats("cumulative").print_stats(60)
+            (self.dir / "python.txt").write_text(text.getvalue(), encoding="utf-8")
+            self.files += ["python.pstats", "python.txt"]
+
+        if self._ops:
+            lines = [f"{'operator':48s} {'calls':>8s} {'self ms':>10s} {'total ms':>10s}"]
+            for op, (calls, self_us, total_us) in sorted(self._ops.items(), key=lambda kv: -kv[1][1]):
+                lines.append(f"{op[:48]:48s} {calls:8d} {self_us / 1000:10.2f} {total_us / 1000:10.2f}")
+            (self.dir / "torch_ops.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+            self.files.append("torch_ops.txt")
+
+        if self._samples:
+            (self.dir / "stacks.txt").write_text(
+                "".join(f"{stack} {n}\n" for stack, n in self._samples.most_common()), encoding="utf-8")
+            leaves = Counter()
+            for stack, n in self._samples.items():
+                leaves[stack.rsplit(";", 1)[-1]] += n
+            total = sum(leaves.values())
+            (self.dir / "sampling.txt").write_text(
+                "".join(f"{n:8d} {n / total:6.1%}  {leaf}\n" for leaf, n in leaves.most_common(60)),
+                encoding="utf-8")
+            self.files += ["stacks.txt", "sampling.txt"]
+
+        (self.dir / "session.json").write_text(json.dumps(self.describe(), indent=2), encoding="utf-8")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Module API
+# ─────────────────────────────────────────────────────────────────────────────
+
+_session: Optional[ProfileSession] = None
+_session_lock = threading.Lock()
+
+
+def start(mode: str = DETERMINISTIC, requests: Optional[int] = None, seconds: Optional[float] = None,
+          operators: bool = True, root: Optional[Path] = None) -> ProfileSession:
+    """Begin a session; raises ProfilerBusy if one is already running."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            raise ProfilerBusy(f"Profiling session {_session.id} is still running")
+        session = ProfileSession(mode, requests, seconds, operators, root)
+        session.start()
+        _session = session
+    return session
+
+
+def stop() -> Optional[ProfileSession]:
+    """End the running session early, if any, and return it."""
+    session = _session
+    if session is not None:
+        session.finish()
+    return session
+
+
+def active() -> Optional[ProfileSession]:
+    return _session
+
+
+def request():
+    """Context manager around one chat turn: profiles it when a session wants it."""
+    session = _session
+    if session is None:
+        return _NULL
+    return session.capture()
+
+
+def sessions(root: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Finished sessions on disk, newest first."""
+    root = Path(root or profile_dir())
+    if not root.exists():
+        return []
+    found = []
+    for path in sorted(root.glob("*/session.json"), reverse=True):
+        try:
+            found.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return found
+
+
+def session_file(session_id: str, name: str, root: Optional[Path] = None) -> Path:
+    """Path of a file a finished session listed; raises FileNotFoundError otherwise."""
+    root = Path(root or profile_dir())
+    listed = next((s["files"] for s in sessions(root) if s["id"] == session_id), [])
+    if name not in listed:
+        raise FileNotFoundError(f"{session_id}/{name}")
+    return root / session_id / name
@@ -0,0 +1,142 @@
+"""
+int8 Quantization Gate
+======================
+Decides whether the service may run T5 with dynamic int8 Linear layers
+(NLP_QUANTIZE=int8) on CPU workers.
+
+Runs every single-turn case in tests/test_cases.json through the fp32 model
+and an int8 copy side by side, then compares:
+
+  exact match   parsed schema == expected_output (groups order-insensitive,
+                only the global fields the case specifies)
+  latency       p50 / mean parse time per case
+  size          serialized state_dict size
+
+int8 is approved only when its exact-match rate is at most --max-drop below
+fp32.  The verdict is written to quantization_gate.json together with the
+model fingerprint, so retraining revokes the approval until the gate is re-run.
+
+Usage:
+  python quantize_gate.py
+  python quantize_gate.py --max-drop 0.02
+
+Then start the service with:
+  NLP_QUANTIZE=int8 uvicorn main:app --port 8001
+"""
+
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from semantic_parser import QUANT_GATE_FILE, SemanticParser
+
+TEST_CASES = Path(__file__).parent / "tests" / "test_cases.json"
+DEFAULT_MAX_DROP = 0.02     # absolute exact-match points int8 may lose
+
+
+def _canonical_groups(groups: List[Dict]) -> List[str]:
+    return sorted(json.dumps(g, sort_keys=True) for g in groups)
+
+
+def exact_match(result: Dict[str, Any], expected: Dict[str, Any]) -> bool:
+    """Same groups (any order) and the same value for every expected global field."""
+    if _canonical_groups(result.get("groups", [])) != _canonical_groups(expected.get("groups", [])):
+        return False
+    result_global = result.get("global", {})
+    for key, value in expected.get("global", {}).items():
+        if key == "priority_rules":
+            if sorted(result_global.get(key) or []) != sorted(value or []):
+                return False
+        elif result_global.get(key) != value:
+            return False
+    if "is_confirming" in expected and result.get("is_confirming") != expected["is_confirming"]:
+        return False
+    return True
+
+
+def state_dict_mb(model) -> float:
+    import torch
+
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return buf.tell() / 1e6
+
+
+def evaluate(parser: SemanticParser, cases: List[Dict]) -> Dict[str, Any]:
+    """Exact match and latency of the model itself (no parse cache, no rule fast path)."""
+    matches, latencies, outputs = 0, [], []
+    parser._parse_t5(cases[0]["input"])     # warm-up, not timed
+    for case in cases:
+        start = time.perf_counter()
+        result = parser._parse_t5(case["input"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        outputs.append(result)
+        matches += exact_match(result, case["expected_output"])
+    return {
+        "exact_match": round(matches / len(cases), 4),
+        "p50_ms":      round(statistics.median(latencies), 2),
+        "mean_ms":     round(statistics.fmean(latencies), 2),
+        "outputs":     outputs,
+    }
+
+
+def run_gate(max_drop: float = DEFAULT_MAX_DROP, out: Path = QUANT_GATE_FILE) -> Dict[str, Any]:
+    print("=" * 60)
+    print("AssignAI  int8 quantization gate")
+    print("=" * 60)
+
+    cases = [
+        tc for tc in json.loads(TEST_CASES.read_text(encoding="utf-8"))
+        if tc.get("type") != "multi_turn" and "expected_output" in tc
+    ]
+
+    fp32 = SemanticParser(backend="torch", quantize="")
+    int8 = SemanticParser(backend="torch", quantize="int8", enforce_quant_gate=False)
+    if not (fp32.is_fine_tuned and int8.quantization == "int8"):
+        raise RuntimeError("Fine-tuned T5 not available — run: python fine_tune_semantic.py")
+
+    print(f"\n Evaluating {len(cases)} cases (fp32 vs int8)…")
+    fp32_eval = evaluate(fp32, cases)
+    int8_eval = evaluate(int8, cases)
+
+    disagreements = sum(a != b for a, b in zip(fp32_eval["outputs"], int8_eval["outputs"]))
+    drop = round(fp32_eval["exact_match"] - int8_eval["exact_match"], 4)
+    gate = {
+        "model_version":    fp32.model_version,
+        "approved":         drop <= max_drop,
+        "max_drop":         max_drop,
+        "drop":             drop,
+        "cases":            len(cases),
+        "disagreements":    disagreements,
+        "fp32_exact_match": fp32_eval["exact_match"],
+        "int8_exact_match": int8_eval["exact_match"],
+        "fp32_p50_ms":      fp32_eval["p50_ms"],
+        "int8_p50_ms":      int8_eval["p50_ms"],
+        "fp32_size_mb":     round(state_dict_mb(fp32._model), 1),
+        "int8_size_mb":     round(state_dict_mb(int8._model), 1),
+    }
+    out.write_text(json.dumps(gate, indent=2), encoding="utf-8")
+
+    print(f"\n {'':14s} {'fp32':>10s} {'int8':>10s}")
+    print(f"   exact match  {gate['fp32_exact_match']:10.1%} {gate['int8_exact_match']:10.1%}")
+    print(f"   p50 latency  {gate['fp32_p50_ms']:8.1f}ms {gate['int8_p50_ms']:8.1f}ms")
+    print(f"   weights      {gate['fp32_size_mb']:8.1f}MB {gate['int8_size_mb']:8.1f}MB")
+    print(f"   outputs that differ: {disagreements}/{len(cases)}")
+    verdict = "APPROVED" if gate["approved"] else "REJECTED"
+    print(f"\n int8 {verdict} (drop {drop:.1%}, allowed {max_drop:.1%}) → {out}")
+    if gate["approved"]:
+        print("   Enable with: NLP_QUANTIZE=int8")
+    return gate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Approve or reject int8 quantization for the fine-tuned T5")
+    parser.add_argument("--max-drop", type=float, default=DEFAULT_MAX_DROP,
+                        help="Largest allowed exact-match drop (absolute, 0.02 = 2 points)")
+    args = parser.parse_args()
+    sys.exit(0 if run_gate(args.max_drop)["approved"] else 1)
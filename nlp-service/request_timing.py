@@ -0,0 +1,101 @@
+"""
+Request Timing
+==============
+Opt-in timing breakdown of one chat turn, so a slow turn logged by Laravel
+can be explained without attaching a profiler.
+
+A caller sends `X-Debug-Timing: 1`; /chat then answers with a Server-Timing
+header and a `timings` block in the body (/chat/stream puts the block in its
+"done" event):
+
+  "timings": {
+    "total_ms": 412.3,
+    "stages":   {"queue": 0.4, "intent": 0.2, "parse": 180.1, "merge": 0.1, "reply": 231.0},
+    "decodes":  [{"task": "parse constraint", "ms": 61.2, "beams": 1, "sequences": 1, "steps": 23},
+                 {"task": "parse constraint", "ms": 118.4, "beams": 4, "sequences": 1, "steps": 25},
+                 {"task": "generate reply",   "ms": 230.2, "beams": 1, "sequences": 1, "steps": 31}]
+  }
+
+Stages (ms, summed if a stage runs more than once):
+
+  queue      waiting for an inference slot
+  intent     question vs constraint routing
+  history    re-parsing conversation_history (no stored or echoed state)
+  parse      the message itself (rules, cache or T5)
+  merge      merging into the conversation state
+  reply      natural_reply
+  answer     Q&A answer
+  redirect   Q&A output that turned out to be a constraint (then parsed too)
+
+`decodes` lists every T5 call with its beams and decoder steps.  Steps are
+counted from the decoded text (plus EOS), because the decode itself may
+have run on the micro-batcher thread or in a pool worker.
+
+The breakdown lives in a ContextVar set by the endpoint; InferenceExecutor
+runs the turn in a copy of that context, so the parser adds to it from the
+inference thread.  Without the header nothing is recorded.
+"""
+
+import contextvars
+import time
+from typing import Any, Dict, List, Optional
+
+HEADER = "X-Debug-Timing"
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Stage durations and T5 calls of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.decodes: List[Dict[str, Any]] = []
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def decode(self, task: str, seconds: float, beams: int, sequences: int, steps: int):
+        self.decodes.append({
+            "task":      task,
+            "ms":        round(seconds * 1000, 2),
+            "beams":     beams,
+            "sequences": sequences,
+            "steps":     steps,
+        })
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages":   {stage: round(ms, 2) for stage, ms in self.stages.items()},
+            "decodes":  list(self.decodes),
+        }
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: every stage, the T5 calls, and the total."""
+        metrics = [f"{stage};dur={ms:.2f}" for stage, ms in self.stages.items()]
+        if self.decodes:
+            beams = sorted({d["beams"] for d in self.decodes})
+            desc = (f'{len(self.decodes)} calls, {sum(d["steps"] for d in self.decodes)} steps, '
+                    f'beams {"/".join(map(str, beams))}')
+            metrics.append(f't5;dur={sum(d["ms"] for d in self.decodes):.2f};desc="{desc}"')
+        metrics.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+def requested(value: Optional[str]) -> bool:
+    """Whether an X-Debug-Timing header value asks for timings."""
+    return (value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def start() -> RequestTimings:
+    """Begin collecting for the current request context."""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def current() -> Optional[RequestTimings]:
+    """The current request's breakdown, or None when it didn't ask for one."""
+    return _current.get()
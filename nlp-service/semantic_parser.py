@@ -21,10 +21,26 @@ Schema output:
 }
 """
 
+import contextlib
+import contextvars
+import copy
+import itertools
 import json
+import os
 import re
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from inference_batcher import BatcherStopped
+from inference_cache import MISSING, LRUCache, normalize_text
+from inference_executor import DeadlineExceeded, RequestCancelled, check_cancelled, current_ticket, wait_for
+from model_registry import ModelVersion, resolve_model
+import request_timing
+from service_config import env_bool, env_float, env_int, env_str
+from service_metrics import INPUT_TOKENS, OUTPUT_TOKENS, REPAIR_SECONDS, STAGE_SECONDS
+from single_flight import SingleFlight
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Constants
@@ -32,6 +48,11 @@ from typing import Any, Dict, List, Optional
 
 MODEL_DIR = Path(__file__).parent / "semantic_model"
 TOK_DIR   = Path(__file__).parent / "semantic_tokenizer"
+ONNX_DIR  = Path(__file__).parent / "semantic_model_onnx"   # written by export_onnx.py
+
+ONNX_MANIFEST = "export_manifest.json"
+QUANT_GATE_FILE = Path(__file__).parent / "quantization_gate.json"   # written by quantize_gate.py
+TUNED_FILE      = Path(__file__).parent / "autotune.json"             # written by autotune.py
 
 PREFIX      = "parse constraint: "
 MAX_IN_LEN  = 128
@@ -43,6 +64,10 @@ VALID_NEW_OLD   = {"new", "old"}
 VALID_PRIORITY  = {"male_first", "female_first", "new_first", "old_first", "attendance_first"}
 VALID_HEIGHT_RULES = {"male_taller_than_female", "female_taller_than_male", "tallest_first", "shortest_first"}
 
+# How the latest parse() in the current context was produced:
+# 'rules' | 'cache' | 'greedy' | 'escalated' | 'beam' | 'constrained' | 'fallback'
+_decode_path: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("decode_path", default=None)
+
 EMPTY_RESULT: Dict[str, Any] = {
     "groups":       [],
     "global":       {"conflict_ok": None, "priority_rules": [], "height_rule": None},
@@ -107,6 +132,54 @@ def _validate(raw: Dict) -> Dict[str, Any]:
     return result
 
 
+def int8_gate_status(model_version: Optional[str]) -> Tuple[bool, str]:
+    """Whether quantize_gate.py approved int8 for these exact weights."""
+    if not QUANT_GATE_FILE.exists():
+        return False, "no quantization gate result — run: python quantize_gate.py"
+    try:
+        gate = json.loads(QUANT_GATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        return False, f"unreadable quantization gate result: {e}"
+    if gate.get("model_version") != model_version:
+        return False, "quantization gate result is for other weights — re-run: python quantize_gate.py"
+    if not gate.get("approved"):
+        return False, f"quantization gate rejected int8 (exact-match drop {gate.get('drop')})"
+    return True, "approved"
+
+
+def host_fingerprint() -> str:
+    """CPU model, core count and torch version: what autotune.py's numbers depend on."""
+    import platform
+
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    except OSError:
+        pass
+    try:
+        import torch
+        runtime = f"torch {torch.__version__}"
+    except ImportError:
+        runtime = "no torch"
+    return f"{cpu} x{os.cpu_count()} / {runtime}"
+
+
+def tuned_settings(model_version: Optional[str]) -> Tuple[Optional[Dict[str, Any]], str]:
+    """autotune.py's chosen NLP_* settings, if they were measured on this host for these weights."""
+    if not TUNED_FILE.exists():
+        return None, "no autotune result — run: python autotune.py"
+    try:
+        tuned = json.loads(TUNED_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        return None, f"unreadable autotune result: {e}"
+    if tuned.get("model_version") != model_version:
+        return None, "autotune result is for other weights — re-run: python autotune.py"
+    if tuned.get("host") != host_fingerprint():
+        return None, "autotune result is from other hardware — re-run: python autotune.py"
+    return tuned.get("settings") or {}, "tuned"
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Main class
 # ─────────────────────────────────────────────────────────────────────────────
@@ -117,38 +190,215 @@ class SemanticParser:
     Falls back to legacy ConstraintParser if fine-tuned model is absent.
     """
 
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None, quantize: Optional[str] = None,
+                 enforce_quant_gate: bool = True, defer_load: bool = False,
+                 mmap_weights: Optional[bool] = None, model: Optional[ModelVersion] = None):
+        """
+        Args:
+            backend:  T5 runtime, 'torch' or 'onnx'. Defaults to the
+                      NLP_INFERENCE_BACKEND environment variable (else 'torch').
+            quantize: 'int8' for dynamic int8 Linear layers on the torch CPU
+                      backend, '' for full precision. Defaults to NLP_QUANTIZE.
+            enforce_quant_gate: only honour 'int8' when quantize_gate.py has
+                      approved the current weights (disabled by the gate itself).
+            defer_load: don't load T5 yet; serve from the fallback until load()
+                      is called (the service calls it on a background thread).
+            mmap_weights: map model.safetensors instead of reading it, so
+                      processes share the weights through the page cache
+                      (see mmap_weights.py). Defaults to NLP_MMAP_WEIGHTS.
+            model:    checkpoint to load (see model_registry.py). Defaults to
+                      the registry's CURRENT version when T5 is loaded, else
+                      ./semantic_model.
+        """
         self._model     = None
         self._tokenizer = None
         self._device    = None
         self._fallback  = None
         self._ready     = False
+        self._batcher   = None
+        self._pool      = None      # InferencePool when generation runs in worker processes
+        self._grammar   = None      # ConstraintGrammar when constrained decoding is on
+        self._warmup: Optional[Dict[str, Any]] = None   # result of the last warmup()
+        self._tok_lock  = threading.Lock()
+        self._model_version: Optional[str] = None
+        self._backend: Optional[str] = None    # 'torch' | 'onnx' once T5 is loaded
+        self._quantization: Optional[str] = None   # 'int8' when quantized
+        self._enforce_quant_gate = enforce_quant_gate
+        self._mmap_weights = env_bool("NLP_MMAP_WEIGHTS", False) if mmap_weights is None else mmap_weights
+        self._source = model        # ModelVersion; resolved in _load() when not given
+
+        # Per-task adaptive max_new_tokens, and early stop once a parse's JSON closes
+        self._budgets: Dict[str, Any] = {}
+        self._budgets_enabled = env_bool("NLP_OUTPUT_BUDGETS", True)
+        self._stop_balanced   = env_bool("NLP_BALANCED_JSON_STOP", True)
+        self._stop_symbols: Optional[List[str]] = None
+
+        # Deterministic rules answer simple messages before T5 (see fast_path.py)
+        self._fast_path = None
+        if env_bool("NLP_FAST_PATH", True):
+            from fast_path import RuleParser
+            self._fast_path = RuleParser()
+
+        # Greedy first, beam search only when the greedy parse fails validation
+        self._adaptive = env_bool("NLP_ADAPTIVE_DECODING", True)
+        self._num_beams = max(1, env_int("NLP_NUM_BEAMS", 4))
+        self._decode_lock  = threading.Lock()
+        self._decode_stats = {"greedy": 0, "escalated": 0, "beam": 0, "constrained": 0,
+                              "greedy_ms": 0.0, "escalated_greedy_ms": 0.0, "beam_ms": 0.0}
+
+        # Validated parse results keyed on (model version, normalized text)
+        self._parse_cache = LRUCache(
+            max_size=env_int("NLP_PARSE_CACHE_SIZE", 1024),
+            ttl_s=env_float("NLP_PARSE_CACHE_TTL_S", 3600.0),
+        )
+        # Natural replies keyed on (model version, canonical cleaned constraints)
+        self._reply_cache = LRUCache(
+            max_size=env_int("NLP_REPLY_CACHE_SIZE", 2048),
+            ttl_s=env_float("NLP_REPLY_CACHE_TTL_S", 3600.0),
+        )
+        # Identical parses / replies / answers already decoding are joined, not repeated
+        self._flights = SingleFlight(enabled=env_bool("NLP_SINGLE_FLIGHT", True))
+
+        if quantize is None:
+            quantize = env_str("NLP_QUANTIZE", "")
+        self._load_args = (backend or env_str("NLP_INFERENCE_BACKEND", "torch"), quantize.lower())
+        if defer_load:
+            self._init_fallback()       # answers parse() until T5 is switched in
+        else:
+            self.load()
+
+    def load(self, before_ready: Optional[Callable[["SemanticParser"], None]] = None) -> bool:
+        """
+        Load T5 and switch parse() / replies / Q&A over to it.
 
-        self._load()
+        `before_ready(self)` runs after the weights are loaded but before the
+        switch (batching, constrained decoding, warmup), so callers never see
+        a half-prepared model: until it returns, the fallback keeps serving.
+        Returns False if T5 could not be loaded (the fallback stays in place).
+        """
+        if self._ready:
+            return True
+        if not self.preload():
+            return False
+        if before_ready is not None:
+            before_ready(self)
+        self._ready = True      # single assignment: requests switch atomically
+        return True
+
+    def preload(self) -> bool:
+        """
+        Load T5's weights without switching to them.  serve_prefork.py calls
+        this before forking so every worker inherits the loaded model; each
+        worker's load() then only prepares it and switches.
+        """
+        return self._model is not None or self._load(*self._load_args)
 
-    def _load(self):
-        if MODEL_DIR.exists() and TOK_DIR.exists():
+    def _load(self, backend: str, quantize: str = "") -> bool:
+        try:
+            self._source = self._source or resolve_model()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[SemanticParser] Model registry unreadable ({e}) — using ConstraintParser fallback")
+            self._init_fallback()
+            return False
+        source = self._source
+        if source.model_dir.exists() and source.tok_dir.exists():
             try:
                 import torch
-                from transformers import T5ForConditionalGeneration, T5TokenizerFast
-
-                print("[SemanticParser] Loading fine-tuned T5-small model…")
-                self._tokenizer = T5TokenizerFast.from_pretrained(str(TOK_DIR))
-                self._model     = T5ForConditionalGeneration.from_pretrained(str(MODEL_DIR))
-                self._device    = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+                from transformers import T5TokenizerFast
+
+                from generation_limits import token_symbols
+
+                threads = env_int("NLP_TORCH_THREADS", 0)
+                if threads > 0:
+                    torch.set_num_threads(threads)
+                self._tokenizer = T5TokenizerFast.from_pretrained(str(source.tok_dir))
+                self._stop_symbols = token_symbols(self._tokenizer)
+                self._model_version = source.version
+                self._model     = self._load_model(backend.lower())
+                if quantize == "int8":
+                    self._model = self._quantize_int8(self._model)
+                on_gpu = self._backend == "torch" and self._quantization is None
+                self._device    = torch.device("cuda" if torch.cuda.is_available() and on_gpu else "cpu")
                 self._model.to(self._device)
-                self._model.eval()
-                self._ready = True
-                print(f"[SemanticParser] T5 ready on {self._device} ✓")
+                if self._backend == "torch":
+                    self._model.eval()
+                runtime = self._backend + (f", {self._quantization}" if self._quantization else "")
+                print(f"[SemanticParser] T5 {source.name} ready on {self._device} ({runtime}) ✓")
+                return True
             except Exception as e:
                 print(f"[SemanticParser] T5 load failed ({e}), falling back to ConstraintParser")
+                self._model = None
+                self._model_version = None
+                self._backend = None
+                self._quantization = None
                 self._init_fallback()
         else:
             print("[SemanticParser] Fine-tuned model not found — using ConstraintParser fallback")
             print("  Run: python generate_semantic_data.py && python fine_tune_semantic.py")
             self._init_fallback()
+        return False
+
+    def _load_model(self, backend: str):
+        """Load the T5 weights under the requested runtime ('torch' or 'onnx')."""
+        if backend == "onnx":
+            try:
+                model = self._load_onnx_model()
+                self._backend = "onnx"
+                return model
+            except Exception as e:
+                print(f"[SemanticParser] ONNX backend unavailable ({e}), using PyTorch")
+
+        from transformers import T5ForConditionalGeneration
+
+        self._backend = "torch"
+        if self._mmap_weights:
+            from mmap_weights import load_t5_mmap
+
+            try:
+                print("[SemanticParser] Mapping fine-tuned T5-small weights (shared page cache)…")
+                return load_t5_mmap(self._source.model_dir)
+            except Exception as e:
+                print(f"[SemanticParser] mmap loading unavailable ({e}), reading the weights")
+        print("[SemanticParser] Loading fine-tuned T5-small model…")
+        return T5ForConditionalGeneration.from_pretrained(str(self._source.model_dir))
+
+    def _load_onnx_model(self):
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        manifest_path = ONNX_DIR / ONNX_MANIFEST
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"{manifest_path} missing — run: python export_onnx.py")
+        exported_from = json.loads(manifest_path.read_text(encoding="utf-8")).get("source_model_version")
+        if exported_from != self._model_version:
+            raise RuntimeError("ONNX export is stale (model was retrained) — re-run: python export_onnx.py")
+
+        print("[SemanticParser] Loading fine-tuned T5-small model (ONNX Runtime, KV-cached decoder)…")
+        return ORTModelForSeq2SeqLM.from_pretrained(str(ONNX_DIR), use_cache=True)
+
+    def _quantize_int8(self, model):
+        """
+        Dynamic int8 quantization of every nn.Linear (weights int8, activations
+        quantized on the fly). CPU-only; leaves the model unchanged if the gate
+        has not approved these weights or the backend is not torch.
+        """
+        if self._backend != "torch":
+            print(f"[SemanticParser] NLP_QUANTIZE=int8 ignored for the {self._backend} backend")
+            return model
+        if self._enforce_quant_gate:
+            approved, reason = int8_gate_status(self._model_version)
+            if not approved:
+                print(f"[SemanticParser] int8 not enabled ({reason}), using fp32")
+                return model
+
+        import torch
+
+        model = torch.ao.quantization.quantize_dynamic(model.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+        self._quantization = "int8"
+        return model
 
     def _init_fallback(self):
+        if self._fallback is not None:
+            return
         try:
             from parser import ConstraintParser
             self._fallback = ConstraintParser()
@@ -159,6 +409,185 @@ class SemanticParser:
     def is_fine_tuned(self) -> bool:
         return self._ready
 
+    @property
+    def backend(self) -> Optional[str]:
+        """Inference runtime for T5: 'torch', 'onnx', or None in fallback mode."""
+        return self._backend
+
+    @property
+    def quantization(self) -> Optional[str]:
+        """'int8' when the T5 Linear layers are dynamically quantized, else None."""
+        return self._quantization
+
+    @property
+    def model_version(self) -> Optional[str]:
+        """Fingerprint of the loaded T5 weights (None in fallback mode)."""
+        return self._model_version
+
+    @property
+    def model_name(self) -> Optional[str]:
+        """Registry version of the loaded T5 ("legacy" for ./semantic_model; None in fallback mode)."""
+        return self._source.name if self._model is not None else None
+
+    def enable_batching(self, max_batch_size: Optional[int] = None,
+                        max_wait_ms: Optional[float] = None):
+        """
+        Route all T5 generation through a dynamic micro-batcher so concurrent
+        callers share one padded `generate` call per (task, length) bucket.
+        Settings default to the NLP_BATCH_* environment variables.
+        """
+        if self._model is None or self._batcher is not None:
+            return self._batcher
+        from inference_batcher import InferenceBatcher
+
+        submit_batch = self._pool.submit if self._pool is not None else None
+        batcher = InferenceBatcher.from_env(self._generate_batch, measure=self._count_tokens,
+                                            submit_batch=submit_batch)
+        if max_batch_size is not None:
+            batcher.max_batch_size = max(1, max_batch_size)
+        if max_wait_ms is not None:
+            batcher.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._batcher = batcher.start()
+        print(f"[SemanticParser] Micro-batching on (max_batch_size={batcher.max_batch_size}, "
+              f"max_wait={batcher.max_wait * 1000:.1f}ms)")
+        return self._batcher
+
+    def disable_batching(self):
+        if self._batcher is not None:
+            batcher, self._batcher = self._batcher, None     # new calls decode in-process meanwhile
+            batcher.stop()
+
+    def enable_pool(self, workers: Optional[int] = None, threads: Optional[int] = None):
+        """
+        Run every generate call in worker processes (see inference_pool.py),
+        each holding the model and its share of the CPUs.  Blocks until all
+        workers have loaded and warmed T5; on failure generation stays in this
+        process.  Settings default to NLP_INFERENCE_WORKERS /
+        NLP_INFERENCE_WORKER_THREADS.
+        """
+        if self._model is None or self._pool is not None:
+            return self._pool
+        from inference_pool import InferencePool
+
+        pool = InferencePool.from_env(self._load_args, self._enforce_quant_gate, model=self._source)
+        if workers is not None:
+            pool.size = max(1, workers)
+        if threads is not None:
+            pool.threads = max(1, threads)
+        try:
+            self._pool = pool.start()
+        except Exception as e:
+            print(f"[SemanticParser] Inference pool unavailable ({e}), generating in-process")
+            return None
+        if self._batcher is not None:   # re-point the batcher at the pool
+            self.disable_batching()
+            self.enable_batching()
+        print(f"[SemanticParser] Inference pool on ({pool.size} workers × {pool.threads} threads)")
+        return self._pool
+
+    def disable_pool(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            if self._batcher is not None:
+                self.disable_batching()
+                self.enable_batching()
+            pool.close()
+
+    def enable_constrained_decoding(self):
+        """
+        Decode parses greedily under the output-schema grammar (see
+        constrained_decoding.py): valid JSON by construction, no repair pass.
+        """
+        if self._model is None or self._grammar is not None:
+            return self._grammar
+        from constrained_decoding import ConstraintGrammar
+
+        with self._tok_lock:
+            self._grammar = ConstraintGrammar(
+                self._tokenizer, VALID_COLLEGES, VALID_GENDERS, VALID_NEW_OLD,
+                VALID_PRIORITY, VALID_HEIGHT_RULES,
+            )
+        self._parse_cache.clear()     # cached parses came from free decoding
+        print("[SemanticParser] Schema-constrained decoding on")
+        return self._grammar
+
+    def disable_constrained_decoding(self):
+        if self._grammar is not None:
+            self._grammar = None
+            self._parse_cache.clear()
+
+    def clear_caches(self):
+        self._parse_cache.clear()
+        self._reply_cache.clear()
+
+    def warmup(self, all_batch_sizes: bool = False) -> Dict[str, Any]:
+        """
+        Run representative parse (greedy and beam search), reply and Q&A generations
+        once, so lazy initialisation and allocator growth are paid here rather
+        than by the first real request.  With all_batch_sizes, each prompt is
+        also run at every power-of-two batch size up to the micro-batcher's
+        max_batch_size.  Caches and decode stats are left untouched.
+        """
+        if self._model is None:
+            self._warmup = {"ms": 0.0, "generates": 0, "batch_sizes": []}
+            return self._warmup
+        if self._pool is not None:      # each worker warmed itself before reporting ready
+            self._warmup = self._pool.warmup_info()
+            return self._warmup
+
+        max_batch = self._batcher.max_batch_size if self._batcher is not None else 1
+        sizes = [1]
+        while all_batch_sizes and sizes[-1] * 2 < max_batch:
+            sizes.append(sizes[-1] * 2)
+        if all_batch_sizes and max_batch > 1:
+            sizes.append(max_batch)
+
+        parse_prompt = f"{PREFIX}2 females from CCE and 1 veteran male from CEE, no class conflicts"
+        reply_prompt = "generate reply: " + json.dumps(self._clean_reply_constraints(
+            {"groups": [{"count": 2, "college": "CCE", "gender": "F"}],
+             "global": {"conflict_ok": False, "priority_rules": ["attendance_first"]}}
+        ), ensure_ascii=False)
+        jobs = [
+            (parse_prompt, {"max_new_tokens": MAX_OUT_LEN, "num_beams": 1}),
+            (parse_prompt, {"max_new_tokens": MAX_OUT_LEN, "num_beams": self._num_beams}),
+            (reply_prompt, {"max_new_tokens": 128, "num_beams": 1, "temperature": 0.0}),
+            ("answer question: What is UMAL?", {"max_new_tokens": 150, "num_beams": 1, "temperature": 0.3}),
+        ]
+        if self._grammar is not None:
+            jobs.append((parse_prompt, {"max_new_tokens": MAX_OUT_LEN, "num_beams": 1, "constrained": True}))
+
+        start = time.perf_counter()
+        for size in sizes:
+            for prompt, gen_kwargs in jobs:
+                self._generate_batch([prompt] * size, gen_kwargs)
+        self._warmup = {
+            "ms":          round((time.perf_counter() - start) * 1000, 1),
+            "generates":   len(sizes) * len(jobs),
+            "batch_sizes": sizes,
+        }
+        print(f"[SemanticParser] Warmed up in {self._warmup['ms']:.0f}ms "
+              f"({self._warmup['generates']} generate calls, batch sizes {sizes})")
+        return self._warmup
+
+    def stats(self) -> Dict[str, Any]:
+        """Runtime counters, reported by the service's /stats endpoint."""
+        return {
+            "batcher":     dict(self._batcher.stats) if self._batcher else None,
+            "pool":        self._pool.stats() if self._pool else None,
+            "parse_cache": self._parse_cache.stats(),
+            "reply_cache": self._reply_cache.stats(),
+            "single_flight": self._flights.stats(),
+            "fast_path":   self._fast_path.stats() if self._fast_path else None,
+            "decoding":    self._decoding_stats(),
+            "output_budgets": {task: budget.stats() for task, budget in list(self._budgets.items())},
+            "warmup":      self._warmup,
+        }
+
+    @property
+    def decode_path(self) -> Optional[str]:
+        """How the most recent parse() in the current request context was decoded."""
+        return _decode_path.get()
+
     # ─────────────────────────────────────────────────────────────────────────
     # Public API
     # ─────────────────────────────────────────────────────────────────────────
@@ -167,13 +596,83 @@ class SemanticParser:
         """
         Parse natural language into structured constraint dict.
         Always returns a valid schema even on failure.
+
+        Unambiguous simple messages ("yes", "3 volunteers", "all female pls")
+        are answered by the rule fast path without touching T5.
+
+        T5 results are cached per (model version, normalized text); callers
+        always receive a private deep copy, so merging can't corrupt the cache.
+        Concurrent parses of the same text share one decode (single_flight.py).
         """
+        if self._fast_path is not None:
+            raw = self._fast_path.parse(text)
+            if raw is not None:
+                _decode_path.set("rules")
+                return _validate(raw)
         if self._ready:
-            return self._parse_t5(text)
+            key = (self._model_version, normalize_text(text))
+            cached = self._parse_cache.get(key)
+            if cached is not MISSING:
+                _decode_path.set("cache")
+                return copy.deepcopy(cached)
+
+            def decode():
+                result = self._parse_t5(text)
+                self._parse_cache.put(key, result)      # cached before the flight ends: no gap
+                return result
+
+            result, shared = self._flights.do("parse", key, decode)
+            if shared:
+                _decode_path.set("coalesced")
+            return copy.deepcopy(result)
+        _decode_path.set("fallback")
         if self._fallback:
             return self._parse_legacy(text)
         return dict(EMPTY_RESULT)
 
+    def is_cheap(self, text: str) -> bool:
+        """
+        Whether parse(text) will be answered without a T5 decode — by the rule
+        fast path or the parse cache.  For scheduling: counts nothing and
+        leaves the cache's LRU order alone.
+        """
+        if self._fast_path is not None and self._fast_path.answers(text):
+            return True
+        return self._ready and (self._model_version, normalize_text(text)) in self._parse_cache
+
+    def parse_many(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        parse() for several messages at once, e.g. to rebuild a conversation's
+        state from its history.  Fast-path answers and parse-cache hits are
+        taken as they are; the remaining messages (deduplicated) share one
+        padded generate call per decoding stage instead of one decode each.
+        Results are cached like parse() results.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        pending: Dict[Tuple[str, str], List[int]] = {}
+        for i, text in enumerate(texts):
+            raw = self._fast_path.parse(text) if self._fast_path is not None else None
+            if raw is not None:
+                results[i] = _validate(raw)
+            elif not self._ready:
+                results[i] = self._parse_legacy(text) if self._fallback else dict(EMPTY_RESULT)
+            else:
+                key = (self._model_version, normalize_text(text))
+                cached = self._parse_cache.get(key)
+                if cached is not MISSING:
+                    results[i] = copy.deepcopy(cached)
+                else:
+                    pending.setdefault(key, []).append(i)
+
+        if pending:
+            keys = list(pending)
+            decoded = self._decode_parses([texts[pending[key][0]] for key in keys], self._generate_all)
+            for key, result in zip(keys, decoded):
+                self._parse_cache.put(key, copy.deepcopy(result))
+                for i in pending[key]:
+                    results[i] = copy.deepcopy(result)
+        return results
+
     def merge(self, base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
         """
         Merge two parsed constraint dicts across turns.
@@ -332,44 +831,126 @@ class SemanticParser:
         """
         Use T5 to dynamically convert JSON constraints to natural language.
         Falls back to template-based generation if model not ready.
+
+        Replies are cached on the canonical (sorted-key) form of the cleaned
+        constraints, so a merged state that has been seen before — including
+        turns that leave the state unchanged — costs no decoder steps, and
+        concurrent requests for the same state share one decode.
         """
         if not self._ready:
             return self.generate_reply(constraints)  # Fallback to templates
         
         try:
-            # Clean constraints to match training data format:
-            # 1. Remove is_confirming (not in Task B training)
-            # 2. Remove null/empty global fields (height_rule, empty lists, etc.)
-            clean_constraints = {}
-            
-            # Copy groups as-is
-            if 'groups' in constraints:
-                clean_constraints['groups'] = constraints['groups']
-            
-            # Clean global object - only include non-null, non-empty values
-            if 'global' in constraints:
-                clean_global = {}
-                for key, value in constraints['global'].items():
-                    # Include if: not None, not empty list, not 'height_rule' (not in training)
-                    if value is not None and not (isinstance(value, list) and len(value) == 0) and key != 'height_rule':
-                        clean_global[key] = value
-                        
-                # Only include global if it has content
-                if clean_global:
-                    clean_constraints['global'] = clean_global
-                    
-            json_str = json.dumps(clean_constraints, ensure_ascii=False)
-            prompt = f"generate reply: {json_str}"
-            # Use deterministic decoding (temp=0) to prevent hallucination
-            response = self._generate_text(prompt, max_tokens=128, temperature=0.0)
-            # Basic sanity check - if response is too short or looks like JSON, fall back
-            if len(response) < 10 or response.strip().startswith('{'):
-                return self.generate_reply(constraints)
-            return response
+            key, prompt = self._reply_prompt(constraints)
+            cached = self._reply_cache.get(key)
+            if cached is not MISSING:
+                # None records that T5 failed the sanity check for this state
+                return cached if cached is not None else self.generate_reply(constraints)
+
+            def decode():
+                # Use deterministic decoding (temp=0) to prevent hallucination
+                response = self._generate_text(prompt, max_tokens=128, temperature=0.0)
+                # Basic sanity check - if response is too short or looks like JSON, fall back
+                if len(response) < 10 or response.strip().startswith('{'):
+                    response = None
+                self._reply_cache.put(key, response)
+                return response
+
+            response, _ = self._flights.do("reply", key, decode)
+            return response if response is not None else self.generate_reply(constraints)
+        except (RequestCancelled, DeadlineExceeded):
+            raise       # the turn was abandoned: no fallback, nobody is waiting for it
         except Exception as e:
             print(f"[SemanticParser] Reply generation failed ({e}), using template")
             return self.generate_reply(constraints)
 
+    def stream_reply_from_json(self, constraints: Dict[str, Any]) -> Iterator[str]:
+        """
+        generate_reply_from_json, yielded in pieces as T5 decodes them.
+
+        The first ~10 characters are held back until the sanity check can be
+        applied, so a reply that fails it is replaced by the template before
+        anything is sent.  Cached replies and templates come as one piece.
+        """
+        if not self._ready:
+            yield self.generate_reply(constraints)
+            return
+        try:
+            key, prompt = self._reply_prompt(constraints)
+            cached = self._reply_cache.get(key)
+        except Exception as e:
+            print(f"[SemanticParser] Reply generation failed ({e}), using template")
+            yield self.generate_reply(constraints)
+            return
+        if cached is not MISSING:
+            yield cached if cached is not None else self.generate_reply(constraints)
+            return
+
+        pieces: List[str] = []
+        held = ""
+        try:
+            with contextlib.closing(self._stream_text(prompt, max_tokens=128, temperature=0.0)) as stream:
+                for delta in stream:
+                    if pieces:
+                        pieces.append(delta)
+                        yield delta
+                        continue
+                    held += delta
+                    if len(held.strip()) >= 10:
+                        if held.strip().startswith('{'):
+                            break
+                        pieces.append(held.lstrip())
+                        yield pieces[0]
+        except (RequestCancelled, DeadlineExceeded):
+            raise       # the turn was abandoned: no fallback, nobody is waiting for it
+        except Exception as e:
+            if pieces:
+                raise       # part of the reply is already out; nothing sensible to replace it with
+            print(f"[SemanticParser] Reply generation failed ({e}), using template")
+            yield self.generate_reply(constraints)
+            return
+
+        if not pieces:
+            # Too short or JSON-looking: same fallback as generate_reply_from_json
+            self._reply_cache.put(key, None)
+            yield self.generate_reply(constraints)
+            return
+        self._reply_cache.put(key, "".join(pieces).strip())
+
+    def _reply_prompt(self, constraints: Dict[str, Any]) -> Tuple[Tuple[Optional[str], str], str]:
+        """Reply-cache key and T5 prompt for a merged constraint state."""
+        clean_constraints = self._clean_reply_constraints(constraints)
+        key = (self._model_version, json.dumps(clean_constraints, sort_keys=True, ensure_ascii=False))
+        json_str = json.dumps(clean_constraints, ensure_ascii=False)
+        return key, f"generate reply: {json_str}"
+
+    @staticmethod
+    def _clean_reply_constraints(constraints: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Clean constraints to match training data format:
+        1. Remove is_confirming (not in Task B training)
+        2. Remove null/empty global fields (height_rule, empty lists, etc.)
+        """
+        clean_constraints = {}
+        
+        # Copy groups as-is
+        if 'groups' in constraints:
+            clean_constraints['groups'] = constraints['groups']
+        
+        # Clean global object - only include non-null, non-empty values
+        if 'global' in constraints:
+            clean_global = {}
+            for key, value in constraints['global'].items():
+                # Include if: not None, not empty list, not 'height_rule' (not in training)
+                if value is not None and not (isinstance(value, list) and len(value) == 0) and key != 'height_rule':
+                    clean_global[key] = value
+                    
+            # Only include global if it has content
+            if clean_global:
+                clean_constraints['global'] = clean_global
+
+        return clean_constraints
+
     def answer_question(self, question: str, context: Optional[Dict] = None) -> Dict[str, Any]:
         """
         Use T5 to answer general organization questions.
@@ -379,6 +960,8 @@ class SemanticParser:
         - 'answer': Direct text answer
         - 'query': Needs data from Laravel (e.g., [QUERY:members:college=CCE])
         - 'error': Failed to generate response
+
+        Concurrent identical questions (normalized) share one decode.
         """
         if not self._ready:
             return {
@@ -388,82 +971,391 @@ class SemanticParser:
         
         try:
             prompt = f"answer question: {question}"
+            key = (self._model_version, normalize_text(question))
             # Lower temperature for more consistent Q&A responses
-            response = self._generate_text(prompt, max_tokens=150, temperature=0.3)
-            
-            # Check if model is requesting data
-            if response.startswith("[QUERY:"):
-                return {
-                    "type": "query",
-                    "content": response
-                }
-            
-            # Check if model indicates it's a constraint (might be misrouted)
-            if response.startswith("[INTENT:constraint]"):
-                return {
-                    "type": "redirect",
-                    "content": "constraint_parsing"
-                }
-            
+            result, _ = self._flights.do(
+                "answer", key, lambda: self._classify_answer(self._generate_text(prompt, max_tokens=150, temperature=0.3)))
+            return dict(result)
+        except (RequestCancelled, DeadlineExceeded):
+            raise       # the turn was abandoned: no fallback, nobody is waiting for it
+        except Exception as e:
+            print(f"[SemanticParser] Q&A failed ({e})")
             return {
-                "type": "answer",
-                "content": response
+                "type": "error",
+                "content": f"I encountered an error processing your question: {str(e)}"
             }
+
+    def stream_answer(self, question: str) -> Tuple[str, Iterator[str]]:
+        """
+        answer_question, with the answer text streamed as T5 decodes it.
+
+        Returns (type, pieces).  Decoding runs until the output can no longer
+        be a directive ("[QUERY:…", "[INTENT:constraint]"); an answer then
+        streams, while queries, redirects and errors arrive as one piece.
+        """
+        if not self._ready:
+            result = self.answer_question(question)
+            return result["type"], iter([result["content"]])
+
+        held = ""
+        try:
+            stream = self._stream_text(f"answer question: {question}", max_tokens=150, temperature=0.3)
+            for delta in stream:
+                held += delta
+                text = held.lstrip()
+                if text and not text.startswith("["):
+                    return "answer", itertools.chain([text], stream)
+            result = self._classify_answer(held.strip())
+        except (RequestCancelled, DeadlineExceeded):
+            raise       # the turn was abandoned: no fallback, nobody is waiting for it
         except Exception as e:
             print(f"[SemanticParser] Q&A failed ({e})")
-            return {
+            result = {
                 "type": "error",
                 "content": f"I encountered an error processing your question: {str(e)}"
             }
+        return result["type"], iter([result["content"]])
+
+    @staticmethod
+    def _classify_answer(response: str) -> Dict[str, Any]:
+        # Check if model is requesting data
+        if response.startswith("[QUERY:"):
+            return {
+                "type": "query",
+                "content": response
+            }
+
+        # Check if model indicates it's a constraint (might be misrouted)
+        if response.startswith("[INTENT:constraint]"):
+            return {
+                "type": "redirect",
+                "content": "constraint_parsing"
+            }
+
+        return {
+            "type": "answer",
+            "content": response
+        }
 
     def _generate_text(self, prompt: str, max_tokens: int = 128, temperature: float = 0.7) -> str:
         """
         Generic T5 text generation for multi-task inference.
         Used by both reply generation and Q&A methods.
         """
+        return self._generate(prompt, max_new_tokens=max_tokens, num_beams=1, temperature=temperature)
+
+    def _stream_text(self, prompt: str, max_tokens: int = 128, temperature: float = 0.7) -> Iterator[str]:
+        """
+        _generate_text, yielded as it decodes (see token_streaming.py).
+        generate() runs on a helper thread with the in-process model — the
+        micro-batcher and the inference pool only return whole sequences.
+        Closing the iterator early stops the decode.
+        """
         import torch
-        
-        enc = self._tokenizer(
-            prompt,
-            return_tensors="pt",
-            max_length=MAX_IN_LEN,
-            truncation=True,
-        ).to(self._device)
-        
+
+        from token_streaming import IncrementalDetokenizer, TokenStream
+
+        task = prompt.split(":", 1)[0]
+        start = time.perf_counter()
+        with self._tok_lock:
+            enc = self._tokenizer(prompt, return_tensors="pt", max_length=MAX_IN_LEN,
+                                  truncation=True).to(self._device)
+        STAGE_SECONDS.observe(time.perf_counter() - start, "tokenize")
+        input_len = int(enc["attention_mask"].sum())
+        budget = self._budget(task, max_tokens)
+        max_new_tokens = budget.budget(input_len) if self._budgets_enabled else budget.ceiling
+        stream = TokenStream(IncrementalDetokenizer(self._tokenizer, self._tok_lock))
+        ticket = current_ticket()
+        extra: Dict[str, Any] = {}
+        if ticket is not None:
+            from transformers import StoppingCriteriaList
+            from generation_limits import CancelledStoppingCriteria
+
+            extra["stopping_criteria"] = StoppingCriteriaList([CancelledStoppingCriteria(ticket)])
+
+        def decode():
+            try:
+                with torch.no_grad():
+                    self._model.generate(
+                        **enc,
+                        max_new_tokens=max_new_tokens,
+                        num_beams=1,
+                        temperature=temperature,
+                        do_sample=temperature > 0,
+                        streamer=stream,
+                        **extra,
+                    )
+            except BaseException as e:      # StreamCancelled included; nobody is reading then
+                stream.fail(e)
+
+        decode_start = time.perf_counter()
+        threading.Thread(target=decode, name="t5-stream", daemon=True).start()
+        try:
+            yield from stream
+        finally:
+            stream.close()
+        if ticket is not None:
+            ticket.check()
+        self._observe_lengths(task, budget, [input_len], [stream.token_ids], max_new_tokens)
+        timings = request_timing.current()
+        if timings is not None:
+            timings.decode(task, time.perf_counter() - decode_start, 1, 1, len(stream.token_ids) - 1)
+
+    def _generate(self, prompt: str, **gen_kwargs) -> str:
+        """Decode one prompt, through the micro-batcher when batching is on."""
+        check_cancelled()
+        start = time.perf_counter()
+        batcher, future = self._batcher, None
+        if batcher is not None:
+            try:
+                future = batcher.submit(prompt, **gen_kwargs)
+            except BatcherStopped:
+                pass        # stopped since we looked (hot reload): decode here instead
+        if future is not None:
+            text = wait_for(future)
+        else:
+            text = self._run_batch([prompt], gen_kwargs)[0]
+        self._time_decode([prompt], gen_kwargs, [text], start)
+        return text
+
+    def _generate_all(self, prompts: List[str], gen_kwargs: Dict[str, Any]) -> List[str]:
+        """Decode several prompts in one padded call (parse_many)."""
+        start = time.perf_counter()
+        texts = self._run_batch(prompts, gen_kwargs)
+        self._time_decode(prompts, gen_kwargs, texts, start)
+        return texts
+
+    def _time_decode(self, prompts: List[str], gen_kwargs: Dict[str, Any], texts: List[str], start: float):
+        """Add a T5 call to the request's timing breakdown, if it asked for one (see request_timing.py)."""
+        timings = request_timing.current()
+        if timings is None:
+            return
+        elapsed = time.perf_counter() - start
+        with self._tok_lock:
+            steps = sum(len(ids) for ids in self._tokenizer(texts)["input_ids"])     # + EOS each
+        timings.decode(prompts[0].split(":", 1)[0], elapsed, gen_kwargs.get("num_beams", 1), len(prompts), steps)
+
+    def _run_batch(self, prompts: List[str], gen_kwargs: Dict[str, Any]) -> List[str]:
+        """_generate_batch, in a pool worker when the inference pool is on."""
+        pool = self._pool
+        if pool is not None:
+            with STAGE_SECONDS.time("pool_generate"):
+                return wait_for(pool.submit(prompts, gen_kwargs))
+        return self._generate_batch(prompts, gen_kwargs)
+
+    def _generate_batch(self, prompts: List[str], gen_kwargs: Dict[str, Any]) -> List[str]:
+        """
+        One padded `model.generate` call for several prompts that share the same
+        generation settings (max_new_tokens, num_beams, temperature).
+        `constrained=True` masks decoding to the parse-output grammar and
+        rebuilds the text from the grammar's words.
+
+        max_new_tokens is a ceiling: the task's OutputBudget may lower it, and
+        free-form parses stop as soon as their JSON object is closed.
+        """
+        import torch
+        from transformers import LogitsProcessorList, StoppingCriteriaList
+        from generation_limits import BalancedJsonStoppingCriteria, CancelledStoppingCriteria
+
+        temperature = gen_kwargs.get("temperature", 0.0)
+        grammar = self._grammar if gen_kwargs.get("constrained") else None
+        task = prompts[0].split(":", 1)[0]
+        ticket = current_ticket()       # None on the batcher thread: a batch serves several turns
+        extra: Dict[str, Any] = {}
+        stopping = StoppingCriteriaList()
+        if grammar is not None:
+            from constrained_decoding import SchemaLogitsProcessor
+
+            extra["logits_processor"] = LogitsProcessorList([SchemaLogitsProcessor(grammar)])
+        elif self._stop_balanced and prompts[0].startswith(PREFIX):
+            stopping.append(BalancedJsonStoppingCriteria(self._stop_symbols))
+        if ticket is not None:
+            stopping.append(CancelledStoppingCriteria(ticket))
+        if stopping:
+            extra["stopping_criteria"] = stopping
+
+        start = time.perf_counter()
+        with self._tok_lock:
+            enc = self._tokenizer(
+                prompts,
+                return_tensors="pt",
+                max_length=MAX_IN_LEN,
+                truncation=True,
+                padding=True,
+            ).to(self._device)
+        tokenized = time.perf_counter()
+
+        input_lens = enc["attention_mask"].sum(dim=1).tolist()
+        budget = self._budget(task, gen_kwargs["max_new_tokens"])
+        max_new_tokens = budget.budget(max(input_lens)) if self._budgets_enabled else budget.ceiling
+
         with torch.no_grad():
+            if self._backend == "torch":
+                # Encoder run separately (generate() reuses it) so its time is measured on its own
+                extra["encoder_outputs"] = self._model.get_encoder()(**enc, return_dict=True)
+            encoded = time.perf_counter()
             out = self._model.generate(
                 **enc,
-                max_new_tokens=max_tokens,
-                num_beams=1,  # Pure greedy decoding (was 3)
+                max_new_tokens=max_new_tokens,
+                num_beams=gen_kwargs.get("num_beams", 1),
                 temperature=temperature,
                 do_sample=temperature > 0,
                 early_stopping=True,
+                **extra,
             )
-        
-        return self._tokenizer.decode(out[0], skip_special_tokens=True).strip()
+        decoded = time.perf_counter()
+        if ticket is not None:
+            ticket.check()              # stopped early: the partial output must not be used or cached
+        STAGE_SECONDS.observe(tokenized - start, "tokenize")
+        if self._backend == "torch":
+            STAGE_SECONDS.observe(encoded - tokenized, "encode")
+        STAGE_SECONDS.observe(decoded - encoded, "decode")     # encoder included on ONNX
+
+        rows = out.tolist()
+        self._observe_lengths(task, budget, input_lens, rows, max_new_tokens)
+        if grammar is not None:
+            return [grammar.text(row[1:]) for row in rows]   # row[0] is the decoder start token
+        with self._tok_lock:
+            return [text.strip() for text in self._tokenizer.batch_decode(out, skip_special_tokens=True)]
+
+    def _budget(self, task: str, ceiling: int):
+        from generation_limits import OutputBudget
+
+        budget = self._budgets.get(task)
+        if budget is None:
+            budget = self._budgets.setdefault(task, OutputBudget(ceiling))
+        return budget
+
+    def _observe_lengths(self, task: str, budget, input_lens: List[int], rows: List[List[int]],
+                         max_new_tokens: int):
+        """Feed each row's decoder step count back into the task's budget and the token metrics."""
+        eos, pad = self._tokenizer.eos_token_id, self._tokenizer.pad_token_id
+        for input_len, row in zip(input_lens, rows):
+            generated = row[1:]
+            if eos in generated:
+                steps, stopped_early = generated.index(eos) + 1, False
+            else:
+                steps = len(generated)
+                while steps and generated[steps - 1] == pad:
+                    steps -= 1
+                stopped_early = steps < max_new_tokens
+            budget.observe(input_len, steps, max_new_tokens, stopped_early)
+            INPUT_TOKENS.observe(input_len, task)
+            OUTPUT_TOKENS.observe(steps, task)
+
+    def _count_tokens(self, text: str) -> int:
+        with self._tok_lock:
+            return len(self._tokenizer(text, max_length=MAX_IN_LEN, truncation=True)["input_ids"])
 
     # ─────────────────────────────────────────────────────────────────────────
     # Internal
     # ─────────────────────────────────────────────────────────────────────────
 
     def _parse_t5(self, text: str) -> Dict[str, Any]:
-        import torch
+        return self._decode_parses([text], self._generate_each)[0]
+
+    def _generate_each(self, prompts: List[str], gen_kwargs: Dict[str, Any]) -> List[str]:
+        return [self._generate(prompt, **gen_kwargs) for prompt in prompts]
+
+    def _decode_parses(self, texts: List[str], generate) -> List[Dict[str, Any]]:
+        """
+        Parse-task decoding for one or more messages.  `generate(prompts,
+        gen_kwargs)` is either _generate_each (one decode per message, through
+        the micro-batcher) or _generate_all (one padded call for all).
+        Timings are recorded per message.
+        """
         # Add task-specific prefix for multi-task T5
-        prompt = f"parse constraint: {text}"
-        enc = self._tokenizer(
-            prompt,
-            return_tensors="pt",
-            max_length=MAX_IN_LEN,
-            truncation=True,
-        ).to(self._device)
-        with torch.no_grad():
-            out = self._model.generate(
-                **enc,
-                max_new_tokens=MAX_OUT_LEN,
-                num_beams=4,
-                early_stopping=True,
-            )
-        decoded = self._tokenizer.decode(out[0], skip_special_tokens=True).strip()
+        prompts = [f"{PREFIX}{text}" for text in texts]
+        if self._grammar is not None:
+            results = []
+            for decoded in generate(prompts, dict(max_new_tokens=MAX_OUT_LEN, num_beams=1, constrained=True)):
+                self._record_decode("constrained")
+                try:
+                    results.append(_validate(json.loads(decoded)))
+                except json.JSONDecodeError:
+                    # only when MAX_OUT_LEN cut the object short
+                    results.append(self._interpret_t5_output(decoded))
+            return results
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+        pending = list(range(len(prompts)))
+        greedy_ms = 0.0
+        if self._adaptive:
+            # Greedy costs ~1/4 of 4-beam search; keep it when it validates cleanly
+            start = time.perf_counter()
+            decoded = generate(prompts, dict(max_new_tokens=MAX_OUT_LEN, num_beams=1))
+            greedy_ms = (time.perf_counter() - start) * 1000 / len(prompts)
+            for i, text in enumerate(decoded):
+                results[i] = self._interpret_t5_output(text, strict=True)
+                if results[i] is not None:
+                    self._record_decode("greedy", greedy_ms)
+            pending = [i for i, result in enumerate(results) if result is None]
+            if self._num_beams == 1:
+                # Nothing to escalate to: repair the greedy output instead
+                for i in pending:
+                    self._record_decode("greedy", greedy_ms)
+                    results[i] = self._interpret_t5_output(decoded[i])
+                pending = []
+
+        if pending:
+            start = time.perf_counter()
+            decoded = generate([prompts[i] for i in pending], dict(max_new_tokens=MAX_OUT_LEN, num_beams=self._num_beams))
+            beam_ms = (time.perf_counter() - start) * 1000 / len(pending)
+            for i, text in zip(pending, decoded):
+                self._record_decode("escalated" if self._adaptive else "beam", greedy_ms, beam_ms)
+                results[i] = self._interpret_t5_output(text)
+        return results
+
+    def _record_decode(self, path: str, greedy_ms: float = 0.0, beam_ms: float = 0.0):
+        _decode_path.set(path)
+        with self._decode_lock:
+            st = self._decode_stats
+            st[path] += 1
+            if path == "greedy":
+                st["greedy_ms"] += greedy_ms
+            elif path in ("escalated", "beam"):
+                st["escalated_greedy_ms"] += greedy_ms
+                st["beam_ms"] += beam_ms
+
+    def _decoding_stats(self) -> Dict[str, Any]:
+        with self._decode_lock:
+            st = dict(self._decode_stats)
+        beams = st["escalated"] + st["beam"]
+        adaptive = st["greedy"] + st["escalated"]
+        avg_greedy_ms = st["greedy_ms"] / st["greedy"] if st["greedy"] else 0.0
+        avg_beam_ms   = st["beam_ms"] / beams if beams else 0.0
+        # Accepted greedy parses avoided a beam decode; escalations paid for a wasted greedy one
+        saved_ms = st["greedy"] * (avg_beam_ms - avg_greedy_ms) - st["escalated_greedy_ms"] if beams else 0.0
+        return {
+            "adaptive":        self._adaptive,
+            "greedy_accepted": st["greedy"],
+            "escalated":       st["escalated"],
+            "beam_only":       st["beam"],
+            "constrained":     st["constrained"],
+            "escalation_rate": round(st["escalated"] / adaptive, 4) if adaptive else 0.0,
+            "avg_greedy_ms":   round(avg_greedy_ms, 2),
+            "avg_beam_ms":     round(avg_beam_ms, 2),
+            "est_saved_ms":    round(saved_ms, 1),
+        }
+
+    def _interpret_t5_output(self, decoded: str, strict: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Turn raw (often malformed) T5 parse output into a validated schema.
+
+        With strict=True only a confident reading is returned — valid JSON or a
+        repair that recovers every group the raw text implies — and None
+        otherwise, so the caller can retry with beam search.
+        """
+        start = time.perf_counter()
+        result, strategy = self._repair_t5_output(decoded, strict)
+        REPAIR_SECONDS.observe(time.perf_counter() - start, strategy)
+        return result
+
+    def _repair_t5_output(self, decoded: str, strict: bool) -> Tuple[Optional[Dict[str, Any]], str]:
+        """_interpret_t5_output, plus the name of the strategy that produced the result."""
+        # The "{}" label decodes to "" (T5 has no brace tokens): nothing to extract
+        if strict and not decoded.strip():
+            return _validate({}), "empty"
 
         # How many groups does the raw text imply? (count the "count": occurrences)
         implied_groups = len(re.findall(r'"count"\s*:', decoded))
@@ -473,7 +1365,7 @@ class SemanticParser:
             validated = _validate(json.loads(decoded))
             # If JSON collapsed multi-groups, fall through to better strategies
             if implied_groups <= len(validated.get("groups", [])) or implied_groups == 0:
-                return validated
+                return validated, "json"
         except json.JSONDecodeError:
             pass
 
@@ -482,18 +1374,23 @@ class SemanticParser:
         if extracted is not None:
             validated = _validate(extracted)
             if len(validated.get("groups", [])) >= implied_groups or implied_groups == 0:
-                return validated
+                return validated, "regex"
 
         # Strategy 3: structural JSON fix (handles simple missing-brace cases)
         fixed = self._fix_t5_json(decoded)
         if fixed is not None:
-            return _validate(fixed)
+            validated = _validate(fixed)
+            if not strict or len(validated.get("groups", [])) >= implied_groups:
+                return validated, "structural"
+
+        if strict:
+            return None, "rejected"
 
         # Fallback
         if extracted is not None:
-            return _validate(extracted)
+            return _validate(extracted), "regex_partial"
 
-        return dict(EMPTY_RESULT)
+        return dict(EMPTY_RESULT), "empty_result"
 
     def _parse_legacy(self, text: str) -> Dict[str, Any]:
         """Convert old flat ConstraintParser output to new multi-group schema."""
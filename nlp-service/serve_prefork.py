@@ -0,0 +1,128 @@
+"""
+Pre-fork Launcher
+=================
+Runs the service as N uvicorn workers that share one copy of the model.
+
+`uvicorn --workers N` starts N fresh interpreters, and each one imports torch
+and loads its own T5 (and, in fallback mode, its own MiniLM encoder).  This
+launcher instead:
+
+  1. imports main.py and loads the parser once, with the T5 weights
+     memory-mapped from model.safetensors (NLP_MMAP_WEIGHTS, see mmap_weights.py)
+  2. binds the listening socket
+  3. gc.freeze()s the heap, so the collector never writes to the inherited
+     objects and their pages stay shared copy-on-write
+  4. forks the workers, which serve the inherited socket
+
+Each worker still builds its own batcher thread and warms the model after the
+fork (threads don't survive fork()), but both the mapped weights and the
+parent's heap are shared, so a worker costs a few tens of MB instead of a full
+model.  No inference runs before the fork: torch's OpenMP pool is not
+fork-safe.
+
+Usage:
+  python serve_prefork.py --workers 8
+  python serve_prefork.py --workers 4 --port 8001 --threads 2
+
+Measure the difference with:  python benchmark_startup.py
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+from typing import List
+
+from service_config import env_int
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, threads: int):
+    import torch
+    import uvicorn
+
+    gc.enable()
+    if threads > 0:
+        torch.set_num_threads(threads)
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def serve(host: str, port: int, workers: int, threads: int) -> int:
+    os.environ.setdefault("NLP_MMAP_WEIGHTS", "1")
+    gc.disable()    # no collections while the shared heap is being built
+
+    import main
+    from semantic_parser import SemanticParser
+
+    main.apply_tuning()     # before the parser reads its settings
+    print(f"[prefork] Loading the model once for {workers} workers…")
+    parser = SemanticParser(defer_load=True)
+    parser.preload()
+    main.semantic_parser = parser       # each worker's startup prepares it and switches
+
+    sock = _bind(host, port)
+    gc.freeze()
+
+    children: List[int] = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                _run_worker(main.app, sock, threads)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    sock.close()
+    print(f"[prefork] Serving on http://{host}:{port} with workers {children}")
+
+    def _stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    status = 0
+    while children:
+        try:
+            pid, code = os.wait()
+        except ChildProcessError:
+            break
+        if pid in children:
+            children.remove(pid)
+            if os.waitstatus_to_exitcode(code) != 0:
+                print(f"[prefork] Worker {pid} exited with {os.waitstatus_to_exitcode(code)}")
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    if not hasattr(os, "fork"):
+        sys.exit("serve_prefork.py needs fork(); use uvicorn main:app --workers N instead")
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Serve the NLP service from pre-forked workers sharing one model")
+    parser.add_argument("--host",    default="0.0.0.0")
+    parser.add_argument("--port",    type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=env_int("NLP_WORKERS", cpus),
+                        help="Worker processes (default NLP_WORKERS, else one per CPU)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="torch intra-op threads per worker (default CPUs / workers)")
+    args = parser.parse_args()
+    threads = args.threads or max(1, cpus // max(1, args.workers))
+    sys.exit(serve(args.host, args.port, max(1, args.workers), threads))
@@ -0,0 +1,54 @@
+"""
+Service Configuration
+=====================
+Environment-driven tuning knobs for the NLP service.
+
+Every knob has a sensible default so the service runs unconfigured; set the
+matching ``NLP_*`` environment variable to override it, e.g.
+
+  NLP_BATCH_MAX_SIZE=16 NLP_BATCH_MAX_WAIT_MS=4 uvicorn main:app --port 8001
+
+Values measured by autotune.py for this host and model are installed with
+use_tuned() at startup; they replace the defaults, never an explicit variable.
+"""
+
+import os
+from typing import Any, Dict
+
+_tuned: Dict[str, str] = {}
+
+
+def use_tuned(settings: Dict[str, Any]):
+    """Defaults for unset NLP_* variables, e.g. from autotune.json."""
+    _tuned.clear()
+    _tuned.update({name: str(value) for name, value in settings.items()})
+
+
+def env_str(name: str, default: str) -> str:
+    value = os.environ.get(name)
+    if value is not None and value.strip():
+        return value.strip()
+    return _tuned.get(name, default)
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(env_str(name, str(default)))
+    except ValueError:
+        print(f"[config] Ignoring non-integer {name}={os.environ.get(name)!r}")
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(env_str(name, str(default)))
+    except ValueError:
+        print(f"[config] Ignoring non-numeric {name}={os.environ.get(name)!r}")
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = env_str(name, "").lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
@@ -0,0 +1,214 @@
+"""
+Service Metrics
+===============
+Prometheus metrics for the running service, served by GET /metrics in the
+text exposition format (version 0.0.4).
+
+Recorded per request (histograms):
+
+  nlp_stage_seconds{stage}           intent, history, parse, tokenize,
+                                     encode, decode, pool_generate, merge,
+                                     reply, answer, redirect
+  nlp_parse_repair_seconds{strategy} turning raw T5 parse output into the
+                                     schema, by the _interpret_t5_output
+                                     strategy that produced the result
+  nlp_input_tokens{task}             prompt tokens per T5 call
+  nlp_output_tokens{task}            decoder steps per T5 call
+  nlp_chat_seconds{endpoint,response_type}
+                                     whole /chat and /chat/stream turns
+
+Read from the components' own stats() at scrape time (collectors), so they
+cost nothing per request: cache hits / misses / hit ratio, executor
+in-flight / queued / rejected, decode paths, batcher and pool counters.
+
+The hot path only pays for Histogram.observe(): one bisect and three
+additions under an uncontended lock, about a microsecond.  That is why this
+is not prometheus_client, whose per-observation cost is similar but which
+would be a new dependency for a dozen series.
+
+With the inference pool on, tokenize / encode / decode happen in the worker
+processes.  Workers call forward_observations() and send what they observed
+back with each result (take_forwarded()); the service process replays it
+into its own histograms (Registry.replay), next to the whole round trip as
+stage="pool_generate".
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TOKEN_BUCKETS   = (4, 8, 16, 32, 64, 96, 128, 192, 256)
+
+# (name, type, help, [(labels, value), …]) — what a collector returns per metric family
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+# (histogram name, value, labels) — one observation made in an inference_pool worker
+Observation = Tuple[str, float, Tuple[str, ...]]
+
+_forwarded: Optional[List[Observation]] = None
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], List] = {}    # labels → [bucket counts, sum, count]
+
+    def observe(self, value: float, *labels: str):
+        if _forwarded is not None:
+            _forwarded.append((self.name, value, labels))
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Observe the duration of the with-block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        with self._lock:
+            return {labels: (list(s[0]), s[1], s[2]) for labels, s in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Histograms recorded in-process plus collectors read at scrape time."""
+
+    def __init__(self):
+        self._histograms: List[Histogram] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        histogram = Histogram(name, help, labelnames, buckets)
+        with self._lock:
+            self._histograms.append(histogram)
+        return histogram
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Iterable[Family]]):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def replay(self, observations: Iterable[Observation]):
+        """Record observations another process forwarded (see forward_observations)."""
+        with self._lock:
+            by_name = {h.name: h for h in self._histograms}
+        for name, value, labels in observations:
+            histogram = by_name.get(name)
+            if histogram is not None:
+                histogram.observe(value, *labels)
+
+    def render(self) -> str:
+        with self._lock:
+            histograms, collectors = list(self._histograms), list(self._collectors)
+        lines: List[str] = []
+        for histogram in histograms:
+            lines.extend(histogram.render())
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def forward_observations():
+    """
+    From now on keep this process's observations for another process to
+    record instead of recording them here.  For inference_pool workers,
+    whose /metrics nobody scrapes.
+    """
+    global _forwarded
+    _forwarded = []
+
+
+def take_forwarded() -> List[Observation]:
+    """The observations kept since the last call (empty unless forwarding)."""
+    if _forwarded is None:
+        return []
+    taken = list(_forwarded)
+    del _forwarded[:len(taken)]
+    return taken
+
+
+def family(name: str, kind: str, help: str, samples: Iterable[Tuple[Optional[Dict[str, str]], float]]) -> Family:
+    """A collector result; `kind` is 'gauge' or 'counter'."""
+    return name, kind, help, [(labels or {}, value) for labels, value in samples if value is not None]
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "nlp_stage_seconds", "Latency of one pipeline stage.", ("stage",))
+REPAIR_SECONDS = REGISTRY.histogram(
+    "nlp_parse_repair_seconds", "Turning raw T5 parse output into the schema, by the strategy that succeeded.",
+    ("strategy",))
+INPUT_TOKENS = REGISTRY.histogram(
+    "nlp_input_tokens", "Prompt tokens per T5 call.", ("task",), TOKEN_BUCKETS)
+OUTPUT_TOKENS = REGISTRY.histogram(
+    "nlp_output_tokens", "Decoder steps per T5 call.", ("task",), TOKEN_BUCKETS)
+CHAT_SECONDS = REGISTRY.histogram(
+    "nlp_chat_seconds", "Whole chat turns.", ("endpoint", "response_type"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
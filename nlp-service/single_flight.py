@@ -0,0 +1,106 @@
+"""
+Single-Flight
+=============
+Coalesces identical concurrent inference work.
+
+Bursts of the same message arrive together — several organisers confirming
+at once, or the frontend retrying after a timeout while the first attempt is
+still decoding.  The caches only help once the first decode has finished;
+until then every copy would run its own T5 generation.
+
+SingleFlight.do(task, key, fn) runs fn for the first caller with a given key
+(the leader).  Callers that arrive with the same key while it runs wait for
+it and receive the same value, or the same exception.  The key is released
+as soon as fn returns, so later callers go through the caches as usual.
+
+The leader runs fn under its own turn's deadline and cancel flag
+(inference_executor.Ticket).  When the leader's turn is abandoned —
+RequestCancelled or DeadlineExceeded — the work itself did not fail, so
+waiting callers don't inherit the error: they start over, and one of them
+becomes the new leader.  While waiting, each caller watches its own ticket
+and leaves as soon as its own turn is cancelled or out of time.
+
+SemanticParser uses one per parser for parse(), generate_reply_from_json()
+and answer_question(), keyed like its caches on the model version and the
+normalized input.  The values are shared between threads, so callers must
+copy mutable ones before handing them out.  Per-task leader and coalesced
+counts are in stats() and on /metrics.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from inference_executor import CANCEL_POLL_S, DeadlineExceeded, RequestCancelled, current_ticket
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Concurrent callers with the same key share one run of the work."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}    # task → leaders / coalesced
+
+    def do(self, task: str, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (value, shared); shared is True when another caller's run was joined."""
+        if not self.enabled:
+            return fn(), False
+        key = (task, key)
+        while True:
+            with self._lock:
+                counts = self._counts.setdefault(task, {"leaders": 0, "coalesced": 0})
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call()
+                    counts["leaders"] += 1
+                    break
+
+            self._wait(call)
+            if isinstance(call.error, (RequestCancelled, DeadlineExceeded)):
+                continue        # the leader's turn was abandoned: run it ourselves
+            # Counted once the join has paid off, so the exported counter never goes down
+            with self._lock:
+                counts["coalesced"] += 1
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+    @staticmethod
+    def _wait(call: _Call):
+        """Wait for the leader, giving up when the caller's own turn is cancelled or out of time."""
+        ticket = current_ticket()
+        if ticket is None:
+            call.done.wait()
+            return
+        while not call.done.wait(CANCEL_POLL_S):
+            if ticket.stop_requested():
+                ticket.check()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled":   self.enabled,
+                "in_flight": len(self._calls),
+                "tasks":     {task: dict(counts) for task, counts in self._counts.items()},
+            }
@@ -89,6 +89,46 @@ def test_cases() -> list:
         return json.load(f)
 
 
+@pytest.fixture(scope="session")
+def corpus_inputs(test_cases) -> list:
+    """Every user message in test_cases.json, including multi-turn turns."""
+    inputs = []
+    for tc in test_cases:
+        if "input" in tc:
+            inputs.append(tc["input"])
+        for turn in tc.get("conversation", []):
+            inputs.append(turn["input"])
+    return inputs
+
+
+@pytest.fixture
+def service_app(monkeypatch):
+    """
+    main.py wired for in-process requests: a fresh intent router and
+    inference executor, no conversation store and no parser.  Tests set
+    main.semantic_parser (see chat_client) and replace whatever else they need.
+    """
+    import main
+    from inference_executor import InferenceExecutor
+    from intent_router import IntentRouter
+
+    executor = InferenceExecutor()
+    monkeypatch.setattr(main, "intent_router", IntentRouter())
+    monkeypatch.setattr(main, "inference_executor", executor)
+    monkeypatch.setattr(main, "conversation_store", None)
+    yield main
+    executor.shutdown()
+
+
+@pytest.fixture
+def chat_client(service_app, semantic_parser, monkeypatch):
+    """TestClient for main.app, serving with the session's SemanticParser."""
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(service_app, "semantic_parser", semantic_parser)
+    return TestClient(service_app.app)
+
+
 @pytest.fixture
 def performance_timer():
     """Context manager for measuring performance metrics."""
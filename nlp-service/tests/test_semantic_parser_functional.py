@@ -17,8 +17,11 @@ Tests:
 import pytest
 import json
 import logging
+import time
 from typing import Dict, Any
 
+from inference_cache import MISSING, LRUCache, normalize_text
+
 logger = logging.getLogger(__name__)
 
 
@@ -729,3 +732,1516 @@ class TestBatchFunctionalSuite:
         
         # Minimum acceptance: 85% passing
         assert passed / total >= 0.85, f"Only {passed}/{total} cases passed"
+
+
+class TestParseCache:
+    """Parse-result cache in front of SemanticParser.parse."""
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2, ttl_s=None)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert cache.get("b") is MISSING
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_entries_expire_after_ttl(self):
+        cache = LRUCache(max_size=4, ttl_s=0.05)
+        cache.put("yes", {"is_confirming": True})
+        time.sleep(0.1)
+
+        assert cache.get("yes") is MISSING
+        assert cache.stats()["expirations"] == 1
+
+    def test_normalization_ignores_case_and_whitespace(self):
+        assert normalize_text("  2 from   CCE ") == normalize_text("2 FROM cce")
+
+    def test_repeated_message_is_served_from_cache(self, semantic_parser):
+        semantic_parser.clear_caches()
+        before = semantic_parser.stats()["parse_cache"]["hits"]
+
+        # Two groups: beyond the rule fast path, so this one reaches T5
+        first = semantic_parser.parse("2 from CCE and 1 from CAE")
+        second = semantic_parser.parse("  2 FROM cce and 1 from cae ")
+
+        assert second == first
+        assert semantic_parser.stats()["parse_cache"]["hits"] == before + 1
+
+    def test_cached_results_are_private_copies(self, semantic_parser):
+        semantic_parser.clear_caches()
+        first = semantic_parser.parse("2 females and 1 male pls")
+        expected = json.loads(json.dumps(first))
+
+        # Merging shares group dicts with the override; mutating them must not leak
+        merged = semantic_parser.merge({"groups": [{"count": 3}], "global": {}}, first)
+        for g in merged["groups"]:
+            g["college"] = "CCE"
+        first["global"]["priority_rules"].append("male_first")
+
+        assert semantic_parser.parse("2 females and 1 male pls") == expected
+
+
+class TestReplyCache:
+    """Reply cache in front of generate_reply_from_json."""
+
+    MERGED = {
+        "groups": [{"count": 2, "college": "CCE", "gender": "F"}],
+        "global": {"conflict_ok": False, "priority_rules": [], "height_rule": None},
+        "is_confirming": False,
+    }
+
+    def test_seen_state_costs_no_generation(self, semantic_parser):
+        semantic_parser.clear_caches()
+        first = semantic_parser.generate_reply_from_json(self.MERGED)
+        hits = semantic_parser.stats()["reply_cache"]["hits"]
+
+        # Same state again, as after a repeated modifier turn
+        assert semantic_parser.generate_reply_from_json(self.MERGED) == first
+        assert semantic_parser.stats()["reply_cache"]["hits"] == hits + 1
+
+    def test_key_ignores_dict_order_and_per_turn_fields(self, semantic_parser):
+        semantic_parser.clear_caches()
+        first = semantic_parser.generate_reply_from_json(self.MERGED)
+        reordered = {
+            "is_confirming": True,
+            "global": {"priority_rules": [], "conflict_ok": False},
+            "groups": [{"gender": "F", "college": "CCE", "count": 2}],
+        }
+        hits = semantic_parser.stats()["reply_cache"]["hits"]
+
+        assert semantic_parser.generate_reply_from_json(reordered) == first
+        assert semantic_parser.stats()["reply_cache"]["hits"] == hits + 1
+
+
+class TestConstrainedDecoding:
+    """Schema-constrained decoding: every parse output is valid JSON by construction."""
+
+    LABELS = [
+        {"groups": [{"count": 2, "gender": "F"}], "global": {"conflict_ok": False}},
+        {"groups": [{"count": 2, "college": "CCE"},
+                    {"count": 1, "college": "CEE", "gender": "M", "new_old": "old", "height_min": 170}],
+         "global": {"conflict_ok": True, "priority_rules": ["new_first", "attendance_first"],
+                    "height_rule": "tallest_first"}},
+        {"global": {"priority_rules": ["male_first"]}},
+        {"is_confirming": True},
+        {},
+    ]
+
+    @pytest.fixture
+    def constrained_parser(self, semantic_parser):
+        semantic_parser.enable_constrained_decoding()
+        yield semantic_parser
+        semantic_parser.disable_constrained_decoding()
+
+    @staticmethod
+    def _accepts(grammar, tokenizer, label: str) -> bool:
+        cursor = grammar.start()
+        for token_id in tokenizer(label, add_special_tokens=False)["input_ids"]:
+            if token_id not in grammar.allowed(cursor):
+                return False
+            cursor = grammar.advance(cursor, token_id)
+        return grammar.eos_token_id in grammar.allowed(cursor)
+
+    def test_grammar_accepts_training_labels(self, constrained_parser):
+        grammar, tokenizer = constrained_parser._grammar, constrained_parser._tokenizer
+        for obj in self.LABELS:
+            label = json.dumps(obj, ensure_ascii=False)   # generate_semantic_data.py format
+            ids = tokenizer(label, add_special_tokens=False)["input_ids"]
+            assert self._accepts(grammar, tokenizer, label), label
+            assert grammar.text(ids + [tokenizer.eos_token_id]) == label
+
+    def test_grammar_rejects_off_schema_output(self, constrained_parser):
+        grammar, tokenizer = constrained_parser._grammar, constrained_parser._tokenizer
+        assert not self._accepts(grammar, tokenizer, '{"groups": [{"count": 2, "college": "XYZ"}]}')
+        assert not self._accepts(grammar, tokenizer, '{"groups": [{"gender": "F", "count": 2}]}')
+        assert not self._accepts(grammar, tokenizer, '{"groups": [{"count": 2}]')
+
+    def test_corpus_decodes_to_valid_json(self, constrained_parser, corpus_inputs):
+        for text in corpus_inputs:
+            decoded = constrained_parser._generate(
+                f"parse constraint: {text}", max_new_tokens=256, num_beams=1, constrained=True
+            )
+            parsed = json.loads(decoded)
+            assert set(parsed) <= {"groups", "global", "is_confirming"}, decoded
+
+
+class TestAdaptiveDecoding:
+    """Greedy first; beam search only when the greedy parse doesn't validate."""
+
+    GOOD = '"groups": ["count": 2, "college": "CCE"], "global": "conflict_ok": false'
+    BAD  = 'volunteers volunteers volunteers'
+
+    @pytest.fixture
+    def fake_generate(self, semantic_parser, monkeypatch):
+        calls = []
+
+        def install(greedy: str, beam: str):
+            def fake(prompt, **gen_kwargs):
+                calls.append(gen_kwargs["num_beams"])
+                return greedy if gen_kwargs["num_beams"] == 1 else beam
+            monkeypatch.setattr(semantic_parser, "_generate", fake)
+            monkeypatch.setattr(semantic_parser, "_adaptive", True)
+            monkeypatch.setattr(semantic_parser, "_grammar", None)
+            monkeypatch.setattr(semantic_parser, "_fast_path", None)
+            semantic_parser.clear_caches()
+            return calls
+        return install
+
+    def test_strict_interpretation(self, semantic_parser):
+        assert semantic_parser._interpret_t5_output(self.GOOD, strict=True)["groups"] == [
+            {"count": 2, "college": "CCE"}
+        ]
+        assert semantic_parser._interpret_t5_output("", strict=True)["groups"] == []
+        assert semantic_parser._interpret_t5_output(self.BAD, strict=True) is None
+        assert semantic_parser._interpret_t5_output(self.BAD)["groups"] == []
+
+    def test_valid_greedy_is_kept(self, semantic_parser, fake_generate):
+        calls = fake_generate(greedy=self.GOOD, beam=self.BAD)
+        before = semantic_parser.stats()["decoding"]["greedy_accepted"]
+
+        result = semantic_parser.parse("2 from CCE")
+        assert result["groups"] == [{"count": 2, "college": "CCE"}]
+        assert calls == [1]
+        assert semantic_parser.decode_path == "greedy"
+        assert semantic_parser.stats()["decoding"]["greedy_accepted"] == before + 1
+
+    def test_invalid_greedy_escalates_to_beam(self, semantic_parser, fake_generate):
+        calls = fake_generate(greedy=self.BAD, beam=self.GOOD)
+        before = semantic_parser.stats()["decoding"]["escalated"]
+
+        result = semantic_parser.parse("2 from CCE please")
+        assert result["groups"] == [{"count": 2, "college": "CCE"}]
+        assert calls == [1, 4]
+        assert semantic_parser.decode_path == "escalated"
+        assert semantic_parser.stats()["decoding"]["escalated"] == before + 1
+
+    def test_cache_hit_path(self, semantic_parser, fake_generate):
+        fake_generate(greedy=self.GOOD, beam=self.GOOD)
+        semantic_parser.parse("2 from CCE")
+        semantic_parser.parse("2 from  cce")
+        assert semantic_parser.decode_path == "cache"
+
+
+class TestGenerationLimits:
+    """Balanced-JSON stopping criterion and adaptive output budgets."""
+
+    @staticmethod
+    def _stop_index(semantic_parser, text: str):
+        from generation_limits import BalancedJsonStoppingCriteria
+
+        ids = semantic_parser._tokenizer(text, add_special_tokens=False)["input_ids"]
+        criteria = BalancedJsonStoppingCriteria(semantic_parser._stop_symbols)
+        for i in range(1, len(ids) + 1):
+            if criteria._state(tuple(ids[:i]))[4]:
+                return semantic_parser._tokenizer.decode(ids[:i], skip_special_tokens=True)
+        return None
+
+    @pytest.mark.parametrize("label", [
+        '{"groups": [{"count": 2, "college": "CCE"}, {"count": 1, "gender": "M"}]}',
+        '{"global": {"conflict_ok": true}, "is_confirming": true}',
+        '{"is_confirming": true}',
+    ])
+    def test_stops_when_object_closes(self, semantic_parser, label):
+        stopped = self._stop_index(semantic_parser, label + ' "groups": ["count": 9')
+        plain = semantic_parser._tokenizer.decode(
+            semantic_parser._tokenizer(label, add_special_tokens=False)["input_ids"], skip_special_tokens=True
+        )
+        assert stopped == plain
+
+    def test_fused_double_close_stops_on_next_token(self, semantic_parser):
+        # "}}" is a single <unk>; the object is known complete one token later
+        stopped = self._stop_index(semantic_parser, '{"global": {"conflict_ok": false}} extra tokens')
+        assert stopped is not None and stopped.startswith('"global": "conflict_ok": false')
+        assert "tokens" not in stopped
+
+    def test_incomplete_object_keeps_decoding(self, semantic_parser):
+        assert self._stop_index(semantic_parser, '{"groups": [{"count": 2, "college": "CCE"}, {"count":') is None
+
+    def test_budget_tracks_observed_lengths(self):
+        from generation_limits import OutputBudget
+
+        budget = OutputBudget(ceiling=256, min_samples=8)
+        assert budget.budget(10) == 256                     # no data yet
+        for n in range(40):
+            budget.observe(10 + n % 5, 20 + n % 5, 256)      # outputs ≈ input + 10
+        assert budget.budget(12) < 64
+        assert budget.budget(12) >= 22                       # covers the observed p99
+        assert budget.stats()["truncated"] == 0
+
+
+class TestRuleFastPath:
+    """Simple messages are answered by the rule parser; anything else reaches T5."""
+
+    @pytest.fixture
+    def rules(self):
+        from fast_path import RuleParser
+        return RuleParser()
+
+    @pytest.mark.parametrize("text,expected", [
+        ("yes", {"is_confirming": True}),
+        ("sige na", {"is_confirming": True}),
+        ("all female pls", {"groups": [{"gender": "F"}]}),
+        ("I need 3 volunteers", {"groups": [{"count": 3}]}),
+        ("From CCE", {"groups": [{"college": "CCE"}]}),
+        ("2 freshie females from CCE", {"groups": [{"count": 2, "college": "CCE", "gender": "F", "new_old": "new"}]}),
+        ("girls first", {"global": {"priority_rules": ["female_first"]}}),
+    ])
+    def test_answers_simple_messages(self, rules, text, expected):
+        assert rules.parse(text) == expected
+
+    @pytest.mark.parametrize("text", [
+        "2 from CCE and 1 from CTE",
+        "Anyone except CCE",
+        "no females",
+        "ok but add one more from CAFE",
+        "get it",
+        "",
+    ])
+    def test_defers_everything_else(self, rules, text):
+        assert rules.parse(text) is None
+
+    def test_parse_reports_rules_path(self, semantic_parser):
+        if semantic_parser._fast_path is None:
+            pytest.skip("Fast path disabled (NLP_FAST_PATH=0)")
+        result = semantic_parser.parse("3 volunteers from CASE")
+        assert semantic_parser.decode_path == "rules"
+        assert result["groups"] == [{"count": 3, "college": "CASE"}]
+        assert result["is_confirming"] is False
+
+
+class TestIntentRouting:
+    """Constraint/question routing is settled before any T5 decode."""
+
+    @pytest.fixture
+    def router(self):
+        from intent_router import IntentRouter
+        return IntentRouter()
+
+    @pytest.mark.parametrize("text", [
+        "What is UMAL?",
+        "Who has the highest attendance?",
+        "What events are scheduled this week?",
+        "Show me CCE members",
+        "help",
+        "Hi! How are you?",
+    ])
+    def test_questions_go_to_qa(self, router, text):
+        assert router.classify(text) == "question"
+
+    @pytest.mark.parametrize("text", [
+        "yes",
+        "3 girls please",
+        "Can I get 2 females from CCE?",
+        "how about males first",
+        "change CCE to CTE",
+        "ok but add one more from CAFE",
+        "no",
+        "no thanks",
+        "nope",
+    ])
+    def test_constraints_skip_qa(self, router, text):
+        assert router.classify(text) == "constraint"
+
+    def test_corpus_constraints_routed_to_parser(self, router, test_cases):
+        cases = [tc for tc in test_cases
+                 if tc.get("type") != "multi_turn" and tc.get("expected_output", {}).get("groups")]
+        misrouted = [tc["input"] for tc in cases if router.classify(tc["input"]) != "constraint"]
+        logger.info(f"\nIntent routing: {len(cases) - len(misrouted)}/{len(cases)} constraint cases routed to the parser")
+        assert len(misrouted) <= 0.05 * len(cases), misrouted
+
+    def test_training_leaves_global_rng_alone(self):
+        import random
+        from intent_router import training_examples
+
+        random.seed(7)
+        expected = random.random()
+        random.seed(7)
+        training_examples()
+        assert random.random() == expected
+
+    def test_stats(self, router):
+        before = router.stats()
+        router.classify("What is UMAL?")
+        router.record_redirect()
+        after = router.stats()
+        assert after["question"] == before["question"] + 1
+        assert after["redirected"] == before["redirected"] + 1
+
+
+class TestConversationStore:
+    """Merged state per conversation id, on every backend."""
+
+    class _RespStandIn:
+        """Just enough of a Redis server (GET / SET PX / DEL / PING) for the RESP client."""
+
+        def __init__(self):
+            import socketserver
+            import threading
+
+            data: Dict[bytes, tuple] = {}
+
+            class Handler(socketserver.StreamRequestHandler):
+                def handle(self):
+                    while True:
+                        line = self.rfile.readline()
+                        if not line:
+                            return
+                        args = []
+                        for _ in range(int(line[1:])):
+                            length = int(self.rfile.readline()[1:])
+                            args.append(self.rfile.read(length + 2)[:-2])
+                        cmd = args[0].upper()
+                        if cmd == b"PING":
+                            self.wfile.write(b"+PONG\r\n")
+                        elif cmd == b"SET":
+                            ttl = int(args[4]) / 1000 if len(args) > 4 else None
+                            data[args[1]] = (args[2], time.time() + ttl if ttl else None)
+                            self.wfile.write(b"+OK\r\n")
+                        elif cmd == b"GET":
+                            value, expires = data.get(args[1], (None, None))
+                            if value is None or (expires and expires < time.time()):
+                                self.wfile.write(b"$-1\r\n")
+                            else:
+                                self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+                        elif cmd == b"DEL":
+                            self.wfile.write(b":%d\r\n" % (data.pop(args[1], None) is not None))
+                        else:
+                            self.wfile.write(b"-ERR unknown command\r\n")
+
+            self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+            self.server.daemon_threads = True
+            self.url = f"redis://127.0.0.1:{self.server.server_address[1]}/0"
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        def close(self):
+            self.server.shutdown()
+            self.server.server_close()
+
+    @pytest.fixture(params=["memory", "sqlite", "redis"])
+    def make_store(self, request, tmp_path):
+        import conversation_store as cs
+
+        stores, stand_ins = [], []
+
+        def make(ttl_s: float = 60.0):
+            if request.param == "memory":
+                store = cs.MemoryConversationStore(max_size=16, ttl_s=ttl_s)
+            elif request.param == "sqlite":
+                store = cs.SqliteConversationStore(str(tmp_path / "state.db"), ttl_s=ttl_s)
+            else:
+                stand_ins.append(self._RespStandIn())
+                store = cs.RedisConversationStore(stand_ins[-1].url, ttl_s=ttl_s)
+            stores.append(store)
+            return store
+
+        yield make
+        for store in stores:
+            store.close()
+        for stand_in in stand_ins:
+            stand_in.close()
+
+    STATE = {"groups": [{"count": 2, "college": "CCE"}],
+             "global": {"conflict_ok": False, "priority_rules": ["female_first"]},
+             "is_confirming": False}
+
+    def test_round_trip(self, make_store):
+        store = make_store()
+        assert store.get("conv-1") is None
+        store.put("conv-1", self.STATE)
+        assert store.get("conv-1") == self.STATE
+        assert store.get("conv-2") is None
+
+        store.put("conv-1", {"groups": [], "global": {}, "is_confirming": True})
+        assert store.get("conv-1")["is_confirming"] is True
+        store.delete("conv-1")
+        assert store.get("conv-1") is None
+
+        stats = store.stats()
+        assert (stats["hits"], stats["writes"], stats["errors"]) == (2, 2, 0)
+
+    def test_entries_expire(self, make_store):
+        store = make_store(ttl_s=0.05)
+        store.put("conv-1", self.STATE)
+        time.sleep(0.1)
+        assert store.get("conv-1") is None
+
+    def test_corrupt_entry_is_a_miss(self, make_store):
+        store = make_store()
+        store._put("conv-1", '{"groups": [{"count": 2')      # truncated write
+        assert store.get("conv-1") is None
+        assert store.stats()["errors"] == 1
+
+    def test_sqlite_shared_between_instances(self, tmp_path):
+        from conversation_store import SqliteConversationStore
+
+        writer = SqliteConversationStore(str(tmp_path / "state.db"))
+        reader = SqliteConversationStore(str(tmp_path / "state.db"))
+        writer.put("conv-1", self.STATE)
+        assert reader.get("conv-1") == self.STATE
+        writer.close()
+        reader.close()
+
+    def test_unreachable_backend_is_a_miss(self):
+        import socket
+        from conversation_store import RedisConversationStore
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]          # closed again before use
+        store = RedisConversationStore(f"redis://127.0.0.1:{port}/0", timeout_s=0.2)
+        store.put("conv-1", self.STATE)
+        assert store.get("conv-1") is None
+        assert store.stats()["errors"] == 2
+
+
+class TestBatchedHistoryParse:
+    """parse_many: one batched decode for the turns that actually need T5."""
+
+    @pytest.fixture
+    def spy_batch(self, semantic_parser, monkeypatch):
+        batches = []
+        real = semantic_parser._generate_batch
+
+        def spy(prompts, gen_kwargs):
+            batches.append(list(prompts))
+            return real(prompts, gen_kwargs)
+
+        monkeypatch.setattr(semantic_parser, "_generate_batch", spy)
+        semantic_parser.clear_caches()
+        return batches
+
+    def test_matches_sequential_parse(self, semantic_parser):
+        history = ["2 from CCE and 1 from CTE", "Prioritize best attendance", "3 volunteers", "yes"]
+        semantic_parser.clear_caches()
+        batched = semantic_parser.parse_many(history)
+        semantic_parser.clear_caches()
+        assert batched == [semantic_parser.parse(text) for text in history]
+
+    def test_skips_fast_path_and_cached_turns(self, semantic_parser, spy_batch):
+        semantic_parser.parse("Anyone except CCE")                  # now cached
+        spy_batch.clear()
+        semantic_parser.parse_many(["yes", "Anyone except CCE", "2 from CCE and 1 from CAE",
+                                    "2 from CCE and 1 from CAE"])
+        # Only the new turn (once, despite the duplicate), plus "yes" if the fast path is off
+        expected = 1 if semantic_parser._fast_path is not None else 2
+        assert len(spy_batch[0]) == expected
+        assert all("Anyone except CCE" not in p for batch in spy_batch for p in batch)
+
+    def test_one_generate_call_per_stage(self, semantic_parser, spy_batch):
+        history = ["2 from CCE and 1 from CTE", "No conflicts allowed but best attendance must apply",
+                   "Need 3 females from CAFE (veterans preferred) with attendance priority"]
+        semantic_parser.parse_many(history)
+        assert 1 <= len(spy_batch) <= 2                             # greedy, plus one beam for escalations
+        assert len(spy_batch[0]) == len(history)
+
+
+class TestWarmup:
+    """Startup warmup exercises every task without touching caches or stats."""
+
+    def test_warmup_leaves_state_alone(self, semantic_parser):
+        semantic_parser.clear_caches()
+        before = semantic_parser.stats()
+        info = semantic_parser.warmup()
+        after = semantic_parser.stats()
+
+        assert info["batch_sizes"] == [1]
+        assert info["generates"] >= 4
+        assert after["warmup"] == info
+        assert after["decoding"] == before["decoding"]
+        assert after["parse_cache"]["size"] == 0 and after["reply_cache"]["size"] == 0
+
+    def test_all_batch_sizes(self, semantic_parser, monkeypatch):
+        from types import SimpleNamespace
+
+        calls = []
+        monkeypatch.setattr(semantic_parser, "_generate_batch", lambda prompts, kw: calls.append(len(prompts)))
+        monkeypatch.setattr(semantic_parser, "_batcher", SimpleNamespace(max_batch_size=6))
+        info = semantic_parser.warmup(all_batch_sizes=True)
+        assert info["batch_sizes"] == [1, 2, 4, 6]
+        assert sorted(set(calls)) == [1, 2, 4, 6]
+
+
+class TestBackgroundLoad:
+    """A deferred parser serves the fallback until load() switches it to T5."""
+
+    def test_fallback_until_loaded(self, semantic_parser):
+        from semantic_parser import SemanticParser
+
+        parser = SemanticParser(defer_load=True)
+        assert not parser.is_fine_tuned
+        parser.parse("2 from CCE and 1 from CTE")
+        assert parser.decode_path == "fallback"
+        assert parser.parse("3 volunteers")["groups"][0]["count"] == 3
+        assert parser.decode_path == "rules"
+
+        seen = []
+        assert parser.load(before_ready=lambda p: seen.append(p.is_fine_tuned))
+        assert seen == [False]      # the hook runs before the switch
+        assert parser.is_fine_tuned
+        parser.parse("2 from CCE and 1 from CTE")
+        assert parser.decode_path != "fallback"
+        assert parser.load()        # idempotent
+
+
+class TestMmapWeights:
+    """Weights mapped from model.safetensors parse exactly like a normal load."""
+
+    def test_mapped_model_matches(self, semantic_parser, test_cases):
+        from mmap_weights import WEIGHTS_FILE, mapped_fraction
+        from semantic_parser import MODEL_DIR, SemanticParser
+
+        parser = SemanticParser(defer_load=True, mmap_weights=True)
+        assert parser.preload() and not parser.is_fine_tuned    # loaded, not switched yet
+        assert parser.load()
+        assert mapped_fraction(parser._model, MODEL_DIR / WEIGHTS_FILE) == 1.0
+        assert not any(p.requires_grad for p in parser._model.parameters())
+
+        for tc in test_cases[:10]:
+            if "input" in tc:
+                assert parser._parse_t5(tc["input"]) == semantic_parser._parse_t5(tc["input"])
+
+
+class TestInferencePool:
+    """Generation dispatched to worker processes returns what in-process decoding does."""
+
+    def test_pool_matches_in_process(self, semantic_parser):
+        texts = ["2 from CCE and 1 from CTE", "Need 3 females from CAFE and 1 veteran male", "What is UMAL?"]
+        expected = [semantic_parser._parse_t5(t) for t in texts]
+
+        from service_metrics import OUTPUT_TOKENS
+
+        def output_tokens():
+            return sum(count for _, _, count in OUTPUT_TOKENS.snapshot().values())
+
+        assert semantic_parser.enable_pool(workers=2) is not None
+        try:
+            before = output_tokens()
+            assert [semantic_parser._parse_t5(t) for t in texts] == expected
+            assert output_tokens() >= before + len(texts)      # recorded in the workers, seen here
+            semantic_parser.clear_caches()
+            assert semantic_parser.parse_many(texts) == expected
+            stats = semantic_parser.stats()["pool"]
+            assert stats["alive"] == 2
+            assert sum(w["prompts"] for w in stats["per_worker"]) >= 2 * len(texts)
+            assert semantic_parser.warmup()["workers"] == 2
+        finally:
+            semantic_parser.disable_pool()
+            semantic_parser.clear_caches()
+        assert semantic_parser.stats()["pool"] is None
+
+    def test_broken_result_queue_fails_waiting_jobs(self):
+        import queue
+
+        import inference_pool
+        from inference_pool import InferencePool
+
+        class Process:
+            pid = 0
+
+            def is_alive(self):
+                return True
+
+        class BrokenQueue:
+            def get(self, timeout=None):
+                raise EOFError("pipe closed")
+
+        pool = InferencePool(workers=1)
+        jobs = queue.Queue()
+        pool._workers.append(inference_pool._Worker(0, Process(), jobs))
+        waiting = pool.submit(["parse constraint: 2 from CCE"], {})
+        pool._results = BrokenQueue()
+        pool._collect()         # returns at once, as the collector thread would
+        with pytest.raises(RuntimeError, match="result queue failed"):
+            waiting.result(1)
+        assert jobs.qsize() == 1 and pool.stats()["alive"] == 0
+
+
+class TestAutotune:
+    """autotune.json is applied only for the host and weights it was measured on."""
+
+    @pytest.fixture
+    def tuned_file(self, tmp_path, monkeypatch):
+        import semantic_parser as semantic_parser_module
+        import service_config
+
+        path = tmp_path / "autotune.json"
+        monkeypatch.setattr(semantic_parser_module, "TUNED_FILE", path)
+        yield path
+        service_config.use_tuned({})
+
+    def test_settings_need_matching_host_and_model(self, tuned_file):
+        from semantic_parser import host_fingerprint, tuned_settings
+
+        assert tuned_settings("abc")[0] is None
+        tuned_file.write_text(json.dumps({
+            "model_version": "abc", "host": host_fingerprint(), "settings": {"NLP_BATCH_MAX_SIZE": 4},
+        }))
+        assert tuned_settings("abc") == ({"NLP_BATCH_MAX_SIZE": 4}, "tuned")
+        assert tuned_settings("retrained")[0] is None
+        tuned_file.write_text(json.dumps({"model_version": "abc", "host": "other", "settings": {}}))
+        assert tuned_settings("abc")[0] is None
+
+    def test_tuned_values_are_defaults_not_overrides(self, tuned_file, monkeypatch):
+        from service_config import env_bool, env_int, use_tuned
+
+        monkeypatch.delenv("NLP_BATCH_MAX_SIZE", raising=False)
+        use_tuned({"NLP_BATCH_MAX_SIZE": 4, "NLP_BATCHING": False})
+        assert env_int("NLP_BATCH_MAX_SIZE", 8) == 4
+        assert env_bool("NLP_BATCHING", True) is False
+        monkeypatch.setenv("NLP_BATCH_MAX_SIZE", "16")
+        assert env_int("NLP_BATCH_MAX_SIZE", 8) == 16
+
+    def test_pareto_front(self):
+        from autotune import pareto_front
+
+        points = [
+            {"throughput_rps": 10, "p95_ms": 100},
+            {"throughput_rps": 20, "p95_ms": 300},
+            {"throughput_rps": 15, "p95_ms": 400},     # slower and later than the 20 rps point
+            {"throughput_rps": 5,  "p95_ms": 90},
+        ]
+        assert [p["throughput_rps"] for p in pareto_front(points)] == [20, 10, 5]
+
+
+class TestModelRegistry:
+    """Published checkpoints are immutable versions; CURRENT picks the one to serve."""
+
+    @staticmethod
+    def _checkpoint(root, weights: bytes):
+        model, tok = root / "model", root / "tok"
+        model.mkdir(parents=True)
+        tok.mkdir(parents=True)
+        (model / "model.safetensors").write_bytes(weights)
+        (tok / "tokenizer.json").write_text("{}")
+        return model, tok
+
+    def test_publish_activate_and_resolve(self, tmp_path):
+        from model_registry import ModelRegistry, resolve_model
+
+        registry = ModelRegistry(tmp_path / "registry")
+        assert resolve_model(registry=registry).name == "legacy"
+
+        v1 = registry.publish(*self._checkpoint(tmp_path / "a", b"one"), training={"epochs": 3})
+        manifest = registry.manifest(v1.name)
+        assert v1.name.startswith("v0001-") and v1.version == manifest["content_hash"][:12]
+        assert manifest["training"] == {"epochs": 3}
+        assert set(manifest["files"]) == {"model/model.safetensors", "tokenizer/tokenizer.json"}
+        assert (v1.model_dir / "model.safetensors").read_bytes() == b"one"
+
+        v2 = registry.publish(*self._checkpoint(tmp_path / "b", b"two"), activate=False)
+        assert v2.name.startswith("v0002-") and v2.version != v1.version
+        assert resolve_model(registry=registry) == v1          # not activated
+        assert resolve_model(v2.name, registry=registry) == v2
+        registry.activate(v2.name)
+        assert resolve_model(registry=registry) == v2
+
+        # Same content again: no new version
+        assert registry.publish(*self._checkpoint(tmp_path / "c", b"one")) == v1
+        assert len(registry.versions()) == 2
+        assert not list(registry.root.glob(".staging-*"))
+
+    def test_unknown_version(self, tmp_path):
+        from model_registry import ModelRegistry, resolve_model
+
+        with pytest.raises(KeyError):
+            resolve_model("v0042-deadbeef", registry=ModelRegistry(tmp_path))
+
+    def test_version_cannot_escape_registry(self, tmp_path):
+        from model_registry import MANIFEST_FILE, ModelRegistry
+
+        registry = ModelRegistry(tmp_path / "registry")
+        registry.publish(*self._checkpoint(tmp_path / "a", b"one"))
+        outside = tmp_path / "outside"
+        outside.mkdir()
+        (outside / MANIFEST_FILE).write_text('{"content_hash": "0000000000000000"}')
+
+        for name in ("../outside", "..", str(outside), "..\\outside"):
+            with pytest.raises(KeyError):
+                registry.get(name)
+            with pytest.raises(KeyError):
+                registry.activate(name)
+
+    def test_prune_keeps_current(self, tmp_path):
+        from model_registry import ModelRegistry
+
+        registry = ModelRegistry(tmp_path / "registry")
+        names = [registry.publish(*self._checkpoint(tmp_path / str(i), bytes([i])), activate=False).name
+                 for i in range(4)]
+        registry.activate(names[0])
+        assert registry.prune(keep=2) == names[1:2]
+        assert [m["name"] for m in registry.versions()] == [names[0], *names[2:]]
+
+    def test_parser_loads_published_version(self, semantic_parser, tmp_path):
+        from model_registry import ModelRegistry
+        from semantic_parser import MODEL_DIR, TOK_DIR, SemanticParser
+
+        version = ModelRegistry(tmp_path).publish(MODEL_DIR, TOK_DIR)
+        parser = SemanticParser(model=version)
+        assert parser.is_fine_tuned
+        assert parser.model_name == version.name and parser.model_version == version.version
+        assert parser._parse_t5("2 from CCE and 1 from CTE") == semantic_parser._parse_t5("2 from CCE and 1 from CTE")
+
+
+class TestHotReload:
+    """A reload swaps the serving parser at once and retires the old one after its requests finish."""
+
+    class _StandIn:
+        is_fine_tuned = True
+
+        def __init__(self, model=None, **kwargs):
+            self.model_name = model.name
+            self.model_version = model.version
+            self.retired = False
+
+        def disable_batching(self):
+            self.retired = True
+
+        def disable_pool(self):
+            pass
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        import main
+        import model_registry
+        from model_registry import ModelRegistry, ModelVersion
+
+        monkeypatch.setattr(model_registry, "REGISTRY_DIR", tmp_path / "registry")
+        monkeypatch.setattr(main, "SemanticParser", self._StandIn)
+        monkeypatch.setattr(main, "_prepare_model", lambda parser: None)
+        monkeypatch.setattr(main, "semantic_parser",
+                            self._StandIn(ModelVersion("legacy", tmp_path, tmp_path, "legacy-hash")))
+        checkpoint = tmp_path / "checkpoint"
+        (checkpoint / "model").mkdir(parents=True)
+        (checkpoint / "model" / "model.safetensors").write_bytes(b"v1")
+        (checkpoint / "tok").mkdir()
+        version = ModelRegistry().publish(checkpoint / "model", checkpoint / "tok")
+        return main, version
+
+    def test_old_parser_drains_before_retiring(self, service):
+        import threading
+
+        main, version = service
+        old = main.semantic_parser
+        results = []
+        with main._lease_parser() as leased:
+            assert leased is old
+            reload = threading.Thread(target=lambda: results.append(main.reload_model()))
+            reload.start()
+            deadline = time.monotonic() + 5
+            while main.semantic_parser is old and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert main.semantic_parser.model_name == version.name   # new requests see the new model
+            with main._lease_parser() as fresh:
+                assert fresh is main.semantic_parser
+            reload.join(0.2)
+            assert reload.is_alive() and not old.retired            # still draining our request
+        reload.join(5)
+        assert old.retired
+        assert results[0]["status"] == "reloaded" and results[0]["drained"]
+        assert results[0]["model_version"] == version.version
+        assert main.reload_model()["status"] == "unchanged"
+
+    def test_queued_requests_survive_the_swap(self, service):
+        from inference_batcher import BatcherStopped, InferenceBatcher
+
+        main, version = service
+        old = main.semantic_parser
+        batcher = InferenceBatcher(lambda prompts, kw: [p.upper() for p in prompts], max_wait_ms=2000).start()
+        old.disable_batching = batcher.stop
+        queued = batcher.submit("parse constraint: 2 from CCE")     # waiting for company
+
+        assert main.reload_model()["status"] == "reloaded"
+        assert queued.result(1) == "PARSE CONSTRAINT: 2 FROM CCE"
+        with pytest.raises(BatcherStopped):
+            batcher.submit("parse constraint: 1 from CTE")
+
+    def test_straggler_decodes_in_its_own_thread(self, semantic_parser):
+        from inference_batcher import InferenceBatcher
+
+        # A request that read the old parser's batcher just before the swap stopped it
+        stopped = InferenceBatcher(semantic_parser._generate_batch).start()
+        stopped.stop()
+        prompt = "parse constraint: 2 from CCE"
+        previous, semantic_parser._batcher = semantic_parser._batcher, stopped
+        try:
+            assert semantic_parser._generate(prompt, max_new_tokens=16) == \
+                semantic_parser._generate_batch([prompt], {"max_new_tokens": 16})[0]
+        finally:
+            semantic_parser._batcher = previous
+
+    def test_admin_reload_requires_token(self, service, monkeypatch):
+        import threading
+
+        from fastapi.testclient import TestClient
+
+        main, version = service
+        ready = threading.Event()
+        ready.set()
+        monkeypatch.setattr(main, "service_ready", ready)
+        monkeypatch.setenv("NLP_ADMIN_TOKEN", "s3cret")
+        client = TestClient(main.app)
+
+        assert client.post("/admin/reload").status_code == 403
+        assert client.post("/admin/reload", json={"version": "v0042-deadbeef"},
+                           headers={"X-Admin-Token": "s3cret"}).status_code == 404
+        assert client.post("/admin/reload", json={"version": "../../etc"},
+                           headers={"X-Admin-Token": "s3cret"}).status_code == 404
+        response = client.post("/admin/reload", headers={"X-Admin-Token": "s3cret"})
+        assert response.status_code == 200 and response.json()["model"] == version.name
+        assert client.get("/admin/models").json()["serving"] == version.name
+
+
+class TestStreaming:
+    """Streamed replies and answers add up to what the non-streaming calls return."""
+
+    STATES = [
+        {"groups": [{"count": 2, "college": "CCE", "gender": "F"}], "global": {"priority_rules": []}},
+        {"groups": [{"count": 1, "college": "CTE"}, {"count": 3, "new_old": "old"}],
+         "global": {"conflict_ok": True, "priority_rules": ["male_first"]}},
+    ]
+
+    def test_detokenizer_matches_decode(self, semantic_parser, test_cases):
+        from token_streaming import IncrementalDetokenizer
+
+        tokenizer = semantic_parser._tokenizer
+        texts = ["Got it — I'll look for 2 female volunteers from CCE.", "Ñoño's café: naïve 123!"]
+        texts += [tc["input"] for tc in test_cases[:20] if "input" in tc]
+        for text in texts:
+            ids = [tokenizer.pad_token_id] + tokenizer(text)["input_ids"]
+            detok = IncrementalDetokenizer(tokenizer)
+            pieces = [detok.push([i]) for i in ids] + [detok.flush()]
+            assert "".join(pieces) == tokenizer.decode(ids, skip_special_tokens=True)
+
+    def test_stream_reply_matches_generate(self, semantic_parser):
+        for state in self.STATES:
+            semantic_parser.clear_caches()
+            expected = semantic_parser.generate_reply_from_json(state)
+            semantic_parser.clear_caches()
+            assert "".join(semantic_parser.stream_reply_from_json(state)).strip() == expected
+            # The streamed reply is cached like a generated one
+            assert list(semantic_parser.stream_reply_from_json(state)) == [expected]
+
+    def test_stream_answer_types(self, semantic_parser):
+        kind, pieces = semantic_parser.stream_answer("What is UMAL?")
+        assert kind in ("answer", "query", "redirect", "error")
+        assert isinstance("".join(pieces), str)
+
+    def test_closing_stops_decode(self, semantic_parser):
+        import threading
+
+        before = threading.active_count()
+        stream = semantic_parser._stream_text("answer question: What is UMAL?", max_tokens=150)
+        next(stream, None)
+        stream.close()
+        deadline = time.monotonic() + 5
+        while threading.active_count() > before and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert threading.active_count() <= before
+
+    def test_chat_stream_endpoint(self, semantic_parser, chat_client):
+        client = chat_client
+
+        for message in ["2 females from CCE and 1 from CTE", "What is UMAL?"]:
+            semantic_parser.clear_caches()
+            expected = client.post("/chat", json={"message": message}).json()
+            semantic_parser.clear_caches()
+            with client.stream("POST", "/chat/stream", json={"message": message}) as response:
+                assert response.headers["content-type"].startswith("text/event-stream")
+                events = [
+                    (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+                    for block in response.read().decode().strip().split("\n\n")
+                ]
+            names = [name for name, _ in events]
+            assert names[0] == "parse" and names[-1] == "done"
+            assert set(names[1:-1]) <= {"token"}
+            assert "natural_reply" not in events[0][1]
+            done = events[-1][1]
+            assert done["natural_reply"] == "".join(d["text"] for n, d in events if n == "token").strip()
+            assert done["merged_constraints"] == expected["merged_constraints"]
+            assert done["response_type"] == expected["response_type"]
+            if expected["response_type"] == "constraint":
+                assert done["natural_reply"] == expected["natural_reply"]
+
+
+class TestMetrics:
+    """Prometheus exposition of stage latencies, token counts and component counters."""
+
+    def test_histogram_exposition(self):
+        from service_metrics import Registry, family
+
+        registry = Registry()
+        hist = registry.histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            hist.observe(value, "decode")
+        registry.register_collector(lambda: [family("demo_queue", "gauge", "Queue.", [({"pool": 'a"b'}, 2), (None, None)])])
+        lines = registry.render().splitlines()
+
+        assert "# TYPE demo_seconds histogram" in lines
+        assert 'demo_seconds_bucket{stage="decode",le="0.1"} 2' in lines     # le is inclusive
+        assert 'demo_seconds_bucket{stage="decode",le="1.0"} 3' in lines
+        assert 'demo_seconds_bucket{stage="decode",le="+Inf"} 4' in lines
+        assert 'demo_seconds_count{stage="decode"} 4' in lines
+        assert 'demo_seconds_sum{stage="decode"} 3.65' in lines
+        assert 'demo_queue{pool="a\\"b"} 2' in lines
+        assert not any(line.startswith("demo_queue ") for line in lines)      # None samples are skipped
+
+    def test_failing_collector_does_not_break_scrape(self):
+        from service_metrics import Registry
+
+        registry = Registry()
+        registry.register_collector(lambda: 1 / 0)
+        assert "failed" in registry.render()
+
+    def test_worker_observations_are_forwarded(self, monkeypatch):
+        import service_metrics
+        from service_metrics import Registry
+
+        worker, service = Registry(), Registry()
+        tokens = worker.histogram("demo_tokens", "Demo.", ("task",), buckets=(8, 16))
+        service.histogram("demo_tokens", "Demo.", ("task",), buckets=(8, 16))
+
+        monkeypatch.setattr(service_metrics, "_forwarded", None)
+        service_metrics.forward_observations()          # what an inference_pool worker does
+        tokens.observe(12, "parse constraint")
+        tokens.observe(20, "generate reply")
+        forwarded = service_metrics.take_forwarded()
+        assert service_metrics.take_forwarded() == []
+        assert worker.render().count("demo_tokens_count") == 0      # kept, not recorded
+
+        monkeypatch.setattr(service_metrics, "_forwarded", None)    # the service process records
+        service.replay(forwarded)
+        body = service.render()
+        assert 'demo_tokens_count{task="parse constraint"} 1' in body
+        assert 'demo_tokens_bucket{task="generate reply",le="+Inf"} 1' in body
+
+    def test_metrics_endpoint(self, semantic_parser, chat_client):
+        client = chat_client
+
+        semantic_parser.clear_caches()
+        assert client.post("/chat", json={"message": "2 females from CCE and 1 veteran from CTE"}).status_code == 200
+        response = client.get("/metrics")
+        assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        for stage in ("intent", "tokenize", "encode", "decode", "merge", "reply"):
+            assert f'nlp_stage_seconds_count{{stage="{stage}"}}' in body
+        assert "nlp_parse_repair_seconds_count{strategy=" in body
+        assert 'nlp_input_tokens_count{task="parse constraint"}' in body
+        assert 'nlp_output_tokens_count{task="generate reply"}' in body
+        assert 'nlp_chat_seconds_count{endpoint="chat",response_type="constraint"}' in body
+        assert 'nlp_cache_hit_ratio{cache="parse"}' in body
+        assert "nlp_requests_in_flight 0" in body and "nlp_requests_queued 0" in body
+
+
+class TestRequestTiming:
+    """X-Debug-Timing: stage and T5 breakdown of one turn, off unless asked for."""
+
+    def test_server_timing_format(self):
+        from request_timing import RequestTimings, requested
+
+        timings = RequestTimings()
+        timings.add("parse", 0.012)
+        timings.add("parse", 0.003)
+        timings.decode("parse constraint", 0.010, 1, 1, 20)
+        timings.decode("parse constraint", 0.020, 4, 1, 22)
+        header = timings.server_timing()
+
+        assert header.startswith("parse;dur=15.00, ")
+        assert 't5;dur=30.00;desc="2 calls, 42 steps, beams 1/4"' in header
+        assert header.split(", ")[-1].startswith("total;dur=")
+        body = timings.as_dict()
+        assert body["stages"] == {"parse": 15.0} and len(body["decodes"]) == 2
+        assert requested("1") and requested("true") and not requested(None) and not requested("0")
+
+    def test_chat_timings(self, semantic_parser, chat_client):
+        client = chat_client
+        request = {
+            "message": "2 females from CCE and 1 veteran from CTE",
+            "conversation_history": [{"role": "user", "content": "3 males from CEE"}],
+        }
+
+        semantic_parser.clear_caches()
+        plain = client.post("/chat", json=request)
+        assert "server-timing" not in plain.headers and plain.json()["timings"] is None
+
+        semantic_parser.clear_caches()
+        response = client.post("/chat", json=request, headers={"X-Debug-Timing": "1"})
+        assert response.status_code == 200
+        timings = response.json()["timings"]
+        assert {"queue", "intent", "history", "parse", "merge", "reply"} <= set(timings["stages"])
+        assert timings["total_ms"] >= sum(timings["stages"].values()) - 1
+        tasks = {d["task"] for d in timings["decodes"]}
+        assert "generate reply" in tasks
+        for decode in timings["decodes"]:
+            assert decode["beams"] >= 1 and decode["steps"] >= decode["sequences"] >= 1
+        assert "total;dur=" in response.headers["server-timing"]
+
+    def test_chat_stream_timings(self, semantic_parser, chat_client):
+        client = chat_client
+
+        semantic_parser.clear_caches()
+        with client.stream("POST", "/chat/stream", json={"message": "2 females from CCE"},
+                           headers={"X-Debug-Timing": "1"}) as response:
+            blocks = response.read().decode().strip().split("\n\n")
+        done = json.loads(blocks[-1].split("\n")[1][len("data: "):])
+        assert {"queue", "parse", "reply"} <= set(done["timings"]["stages"])
+        assert any(d["task"] == "generate reply" for d in done["timings"]["decodes"])
+
+
+class TestProfiling:
+    """On-demand profiling sessions: nothing while off, pstats / torch / sampled stacks while on."""
+
+    @staticmethod
+    def _wait_finished():
+        import profiling
+
+        deadline = time.monotonic() + 10
+        while profiling.active() is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert profiling.active() is None
+
+    def test_off_is_a_shared_nullcontext(self):
+        import profiling
+
+        assert profiling.active() is None
+        assert profiling.request() is profiling.request() is profiling._NULL
+
+    def test_deterministic_session(self, tmp_path):
+        import pstats
+
+        import profiling
+        import torch
+
+        session = profiling.start(requests=2, root=tmp_path)
+        with pytest.raises(profiling.ProfilerBusy):
+            profiling.start(root=tmp_path)
+        for _ in range(2):
+            with profiling.request():
+                torch.randn(64, 64) @ torch.randn(64, 64)
+        self._wait_finished()
+
+        assert session.done and session.captured == 2
+        assert {"python.pstats", "python.txt", "torch_ops.txt", "torch-001.json", "torch-002.json"} <= set(session.files)
+        assert pstats.Stats(str(session.dir / "python.pstats")).total_calls > 0
+        assert "aten::mm" in (session.dir / "torch_ops.txt").read_text()
+        assert profiling.sessions(tmp_path)[0]["id"] == session.id
+        assert profiling.session_file(session.id, "python.txt", tmp_path).exists()
+        with pytest.raises(FileNotFoundError):
+            profiling.session_file(session.id, "../../etc/passwd", tmp_path)
+
+    def test_sampling_session(self, tmp_path):
+        import profiling
+
+        session = profiling.start(profiling.SAMPLING, seconds=5, root=tmp_path)
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            sum(range(1000))
+        assert profiling.stop() is session and session.done
+        assert {"stacks.txt", "sampling.txt"} <= set(session.files)
+        assert "test_sampling_session" in (session.dir / "stacks.txt").read_text()
+
+    def test_admin_profile_endpoint(self, semantic_parser, chat_client, tmp_path, monkeypatch):
+        monkeypatch.setenv("NLP_PROFILE_DIR", str(tmp_path))
+        monkeypatch.setenv("NLP_ADMIN_TOKEN", "s3cret")
+        admin = {"X-Admin-Token": "s3cret"}
+        client = chat_client
+
+        assert client.post("/admin/profile", json={"requests": 1}).status_code == 403
+        started = client.post("/admin/profile", json={"requests": 1}, headers=admin).json()
+        assert started["status"] == "running"
+        semantic_parser.clear_caches()
+        assert client.post("/chat", json={"message": "2 females from CCE"}).status_code == 200
+
+        deadline = time.monotonic() + 10
+        while client.get("/admin/profile", headers=admin).json()["active"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        finished = client.get("/admin/profile", headers=admin).json()["sessions"][0]
+        assert finished["id"] == started["id"] and finished["captured"] == 1
+        report = client.get(f"/admin/profile/{started['id']}/python.txt", headers=admin)
+        assert report.status_code == 200 and "semantic_parser.py" in report.text
+        assert client.get(f"/admin/profile/{started['id']}/nope.txt", headers=admin).status_code == 404
+        assert client.delete("/admin/profile", headers=admin).status_code == 404
+
+
+class TestSingleFlight:
+    """Identical concurrent parses, replies and answers share one T5 run."""
+
+    @staticmethod
+    def _burst(fn, args_list):
+        import threading
+
+        results = [None] * len(args_list)
+        threads = [threading.Thread(target=lambda i=i, a=a: results.__setitem__(i, fn(*a)))
+                   for i, a in enumerate(args_list)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        return results
+
+    @staticmethod
+    def _slow(monkeypatch, obj, name, calls):
+        original = getattr(obj, name)
+
+        def wrapped(*args, **kwargs):
+            calls.append(args)
+            time.sleep(0.3)         # long enough for the whole burst to arrive
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(obj, name, wrapped)
+
+    def test_joins_and_propagates_errors(self):
+        import threading
+
+        from single_flight import SingleFlight
+
+        flights = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return {"value": 42}
+
+        threading.Timer(0.2, release.set).start()
+        results = self._burst(lambda: flights.do("parse", "k", work), [()] * 5)
+        assert len(calls) == 1
+        assert all(value == {"value": 42} for value, _ in results)
+        assert sorted(shared for _, shared in results) == [False] + [True] * 4
+        assert flights.stats()["tasks"]["parse"] == {"leaders": 1, "coalesced": 4}
+        assert flights.stats()["in_flight"] == 0
+
+        def fail():
+            time.sleep(0.2)
+            raise ValueError("boom")
+
+        errors = self._burst(lambda: self._error_of(lambda: flights.do("reply", "k", fail)), [()] * 3)
+        assert [type(e) for e in errors] == [ValueError] * 3
+        assert flights.stats()["tasks"]["reply"] == {"leaders": 1, "coalesced": 2}
+
+        flights.enabled = False
+        assert flights.do("parse", "k", lambda: 1) == (1, False)
+
+    def test_abandoned_leader_hands_over(self):
+        import threading
+
+        from inference_executor import InferenceExecutor, RequestCancelled, check_cancelled
+        from single_flight import SingleFlight
+
+        flights = SingleFlight()
+        executor = InferenceExecutor()
+        leader_cancel, follower_cancel = threading.Event(), threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            for _ in range(20):
+                time.sleep(0.01)
+                check_cancelled()
+            return len(calls)
+
+        try:
+            # The leader's client leaves: the follower runs the work itself and succeeds
+            leader = executor.submit(flights.do, "parse", "k", work, cancel=leader_cancel)
+            time.sleep(0.05)
+            follower = executor.submit(flights.do, "parse", "k", work)
+            time.sleep(0.05)
+            assert flights.stats()["tasks"]["parse"]["coalesced"] == 0     # counted once the join pays off
+            leader_cancel.set()
+            with pytest.raises(RequestCancelled):
+                leader.result(5)
+            assert follower.result(5) == (2, False)
+            assert flights.stats()["tasks"]["parse"] == {"leaders": 2, "coalesced": 0}
+
+            # A follower whose own client leaves stops waiting; the leader carries on
+            leader = executor.submit(flights.do, "reply", "k", lambda: time.sleep(0.5) or "done")
+            time.sleep(0.05)
+            follower = executor.submit(flights.do, "reply", "k", lambda: "never", cancel=follower_cancel)
+            time.sleep(0.05)
+            start = time.perf_counter()
+            follower_cancel.set()
+            with pytest.raises(RequestCancelled):
+                follower.result(5)
+            assert time.perf_counter() - start < 0.3
+            assert leader.result(5) == ("done", False)
+        finally:
+            executor.shutdown()
+
+    @staticmethod
+    def _error_of(fn):
+        try:
+            fn()
+        except Exception as e:
+            return e
+
+    def test_parse_burst_decodes_once(self, semantic_parser, monkeypatch):
+        monkeypatch.setattr(semantic_parser, "_fast_path", None)
+        semantic_parser.clear_caches()
+        calls = []
+        self._slow(monkeypatch, semantic_parser, "_parse_t5", calls)
+        texts = ["2 females from CCE and 1 veteran from CTE", "  2 Females from CCE and 1 veteran from CTE "] * 3
+
+        def parse(text):
+            return semantic_parser.parse(text), semantic_parser.decode_path
+
+        results = self._burst(parse, [(t,) for t in texts])
+        assert len(calls) == 1
+        assert sum(path == "coalesced" for _, path in results) == len(texts) - 1
+        parsed = [r for r, _ in results]
+        assert all(r == parsed[0] for r in parsed)
+        parsed[0]["groups"].append({"count": 99})      # every caller got a private copy
+        assert all(r != parsed[0] for r in parsed[1:])
+        assert semantic_parser.parse(texts[0]) == parsed[1]
+
+    def test_reply_and_answer_bursts_decode_once(self, semantic_parser, monkeypatch):
+        semantic_parser.clear_caches()
+        calls = []
+        self._slow(monkeypatch, semantic_parser, "_generate_text", calls)
+        state = {"groups": [{"count": 2, "college": "CCE", "gender": "F"}], "global": {"priority_rules": []}}
+
+        replies = self._burst(semantic_parser.generate_reply_from_json, [(state,)] * 4)
+        assert len(calls) == 1 and len(set(replies)) == 1
+
+        answers = self._burst(semantic_parser.answer_question, [("What is UMAL?",), ("what is  umal?",)] * 2)
+        assert len(calls) == 2 and all(a == answers[0] for a in answers)
+
+        tasks = semantic_parser.stats()["single_flight"]["tasks"]
+        assert tasks["reply"]["coalesced"] >= 3 and tasks["answer"]["coalesced"] >= 3
+
+    def test_coalesced_metric(self, semantic_parser, monkeypatch):
+        import main
+        from service_metrics import REGISTRY
+
+        from single_flight import SingleFlight
+
+        flights = SingleFlight()
+        monkeypatch.setattr(semantic_parser, "_flights", flights)
+        monkeypatch.setattr(main, "semantic_parser", semantic_parser)
+        self._burst(lambda: flights.do("answer", "k", lambda: time.sleep(0.2)), [()] * 3)
+        body = REGISTRY.render()
+        assert 'nlp_single_flight_leaders_total{task="answer"} 1' in body
+        assert 'nlp_coalesced_requests_total{task="answer"} 2' in body
+
+
+class TestDeadlinesAndPriorities:
+    """Cheap turns first, hopeless turns dropped before they start, abandoned turns stopped."""
+
+    @staticmethod
+    def _blocked_executor():
+        import threading
+
+        from inference_executor import InferenceExecutor
+
+        executor = InferenceExecutor(max_in_flight=1, max_queue=8)
+        release = threading.Event()
+        executor.submit(release.wait)
+        time.sleep(0.05)        # the single slot is now taken
+        return executor, release
+
+    def test_cheap_turns_overtake_long_ones(self):
+        from inference_executor import CHEAP, LONG, NORMAL
+
+        executor, release = self._blocked_executor()
+        order = []
+        futures = [executor.submit(order.append, p, priority=p) for p in (LONG, NORMAL, CHEAP)]
+        release.set()
+        for f in futures:
+            f.result(5)
+        executor.shutdown()
+        assert order == [CHEAP, NORMAL, LONG]
+
+    def test_long_turns_are_not_starved(self, monkeypatch):
+        import inference_executor
+        from inference_executor import CHEAP, LONG
+
+        monkeypatch.setattr(inference_executor, "PRIORITY_DELAY_S", {CHEAP: 0.0, "normal": 0.05, LONG: 0.1})
+        executor, release = self._blocked_executor()
+        order = []
+        futures = [executor.submit(order.append, LONG, priority=LONG)]
+        time.sleep(0.2)         # waited longer than its delay
+        futures.append(executor.submit(order.append, CHEAP, priority=CHEAP))
+        release.set()
+        for f in futures:
+            f.result(5)
+        executor.shutdown()
+        assert order == [LONG, CHEAP]
+
+    def test_hopeless_turns_are_dropped_before_starting(self):
+        from inference_executor import DeadlineExceeded, InferenceExecutor
+
+        # Dropped at the front of the queue: its deadline passed while it waited
+        executor, release = self._blocked_executor()
+        ran = []
+        late = executor.submit(ran.append, 1, deadline=time.monotonic() + 0.05)
+        time.sleep(0.1)
+        release.set()
+        with pytest.raises(DeadlineExceeded):
+            late.result(5)
+        assert ran == [] and executor.stats()["expired"] == 1
+        executor.shutdown()
+
+        # Refused at submit: turns of its kind take longer than it has left
+        executor = InferenceExecutor(max_in_flight=1)
+        executor.submit(time.sleep, 0.2).result(5)
+        with pytest.raises(DeadlineExceeded):
+            executor.submit(ran.append, 1, deadline=time.monotonic() + 0.05)
+        assert executor.submit(ran.append, 2, deadline=time.monotonic() + 5).result(5) is None
+        assert ran == [2] and executor.stats()["queue_depth"] == 0
+        executor.shutdown()
+
+    def test_cancelled_turns_never_start_or_stop_running(self):
+        import threading
+
+        from inference_executor import RequestCancelled, check_cancelled
+
+        executor, release = self._blocked_executor()
+        ran = []
+        cancel = threading.Event()
+        queued = executor.submit(ran.append, 1, cancel=cancel)
+        dropped = executor.submit(ran.append, 2)
+        cancel.set()
+        dropped.cancel()
+        assert executor.stats()["queue_depth"] == 1
+        release.set()
+        with pytest.raises(RequestCancelled):
+            queued.result(5)
+        assert ran == [] and executor.stats()["cancelled"] == 2
+
+        def until_cancelled():
+            while True:
+                check_cancelled()
+                time.sleep(0.01)
+
+        cancel = threading.Event()
+        running = executor.submit(until_cancelled, cancel=cancel)
+        time.sleep(0.05)
+        cancel.set()
+        with pytest.raises(RequestCancelled):
+            running.result(5)
+        executor.shutdown()
+
+    def test_abandoned_pool_job_does_not_stop_the_pool(self):
+        import queue
+        import threading
+
+        import inference_pool
+        from inference_executor import InferenceExecutor, RequestCancelled, wait_for
+        from inference_pool import InferencePool
+
+        class Process:
+            pid = 0
+
+            def is_alive(self):
+                return True
+
+        # A worker that answers each job after a short decode, standing in for a spawned process
+        pool = InferencePool(workers=1)
+        jobs = queue.Queue()
+        pool._workers.append(inference_pool._Worker(0, Process(), jobs))
+
+        def worker():
+            while (job := jobs.get()) is not None:
+                time.sleep(0.2)
+                pool._results.put((0, job[0], "ok", [f"decoded {job[1][0]}"], 0.2, []))
+
+        threading.Thread(target=worker, daemon=True).start()
+        pool._collector = threading.Thread(target=pool._collect, daemon=True)
+        pool._collector.start()
+
+        executor = InferenceExecutor()
+        cancel = threading.Event()
+        threading.Timer(0.05, cancel.set).start()
+        try:
+            with pytest.raises(RequestCancelled):
+                executor.submit(lambda: wait_for(pool.submit(["first"], {})), cancel=cancel).result(5)
+            time.sleep(0.3)         # the abandoned job's result reaches the collector
+            assert pool._collector.is_alive()
+            assert pool.submit(["second"], {}).result(5) == ["decoded second"]
+        finally:
+            executor.shutdown()
+            jobs.put(None)
+            with pool._lock:
+                pool._closed = True
+
+    def test_stream_ends_when_dropped_before_starting(self, service_app, monkeypatch):
+        import threading
+
+        from fastapi.testclient import TestClient
+
+        class Parser:
+            def is_cheap(self, text):
+                return False
+
+        executor, release = self._blocked_executor()
+        monkeypatch.setattr(service_app, "semantic_parser", Parser())
+        monkeypatch.setattr(service_app, "inference_executor", executor)
+        threading.Timer(0.3, release.set).start()
+        try:
+            start = time.perf_counter()
+            response = TestClient(service_app.app).post("/chat/stream", json={"message": "2 from CCE"},
+                                                 headers={"X-Request-Timeout": "0.1"})
+            assert time.perf_counter() - start < 5
+        finally:
+            release.set()
+            executor.shutdown()
+        assert response.status_code == 200
+        assert "event: error" in response.text and "Deadline" in response.text
+        assert executor.stats()["expired"] == 1
+
+    def test_cancel_stops_generation(self, semantic_parser):
+        import threading
+
+        from inference_executor import InferenceExecutor, RequestCancelled
+
+        semantic_parser.clear_caches()
+        state = {"groups": [{"count": 4, "college": "CAS", "gender": "M"}], "global": {"priority_rules": []}}
+        executor = InferenceExecutor()
+        batcher, semantic_parser._batcher = semantic_parser._batcher, None
+        try:
+            start = time.perf_counter()
+            executor.submit(semantic_parser.generate_reply_from_json, state).result(60)
+            full_s = time.perf_counter() - start
+            semantic_parser.clear_caches()
+
+            cancel = threading.Event()
+            threading.Timer(full_s / 10, cancel.set).start()
+            start = time.perf_counter()
+            with pytest.raises(RequestCancelled):
+                executor.submit(semantic_parser.generate_reply_from_json, state, cancel=cancel).result(60)
+            assert time.perf_counter() - start < full_s / 2
+            assert semantic_parser.stats()["reply_cache"]["size"] == 0      # partial output not cached
+        finally:
+            semantic_parser._batcher = batcher
+            executor.shutdown()
+
+    def test_chat_deadline_and_priority(self, semantic_parser, service_app, chat_client):
+        import asyncio
+        import threading
+        from concurrent.futures import Future
+
+        from inference_executor import CHEAP, LONG, NORMAL, RequestCancelled
+
+        main, client = service_app, chat_client
+
+        assert main._priority(main.ChatRequest(message="yes")) == CHEAP
+        assert main._priority(main.ChatRequest(message="What is UMAL?")) == LONG
+        semantic_parser.clear_caches()
+        message = "2 females from CCE and 1 veteran from CTE"
+        if not semantic_parser.is_cheap(message):
+            assert main._priority(main.ChatRequest(message=message)) == NORMAL
+
+        response = client.post("/chat", json={"message": message}, headers={"X-Request-Timeout": "0"})
+        assert response.status_code == 504
+        assert client.post("/chat", json={"message": message}, headers={"X-Request-Timeout": "60"}).status_code == 200
+
+        class Gone:
+            async def is_disconnected(self):
+                return True
+
+        cancel, turn = threading.Event(), Future()
+        with pytest.raises(RequestCancelled):
+            asyncio.run(main._await_turn(Gone(), turn, cancel))
+        assert cancel.is_set() and turn.cancelled()
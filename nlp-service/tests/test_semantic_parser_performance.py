@@ -13,12 +13,21 @@ Tests:
 """
 
 import pytest
+import asyncio
 import json
 import logging
 import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 from pathlib import Path
 
+from inference_batcher import InferenceBatcher
+from inference_executor import InferenceExecutor, InferenceQueueFull
+
 logger = logging.getLogger(__name__)
 
 
@@ -389,6 +398,560 @@ class TestBatchPerformance:
             logger.info(f"\nPerformance stats saved to: {stats_file}")
 
 
+class TestMicroBatching:
+    """Dynamic micro-batching of concurrent generate calls."""
+
+    @staticmethod
+    def _concurrent_latencies(parse_fn, inputs: List[str], clients: int) -> List[float]:
+        def timed(text):
+            start = time.perf_counter()
+            parse_fn(text)
+            return (time.perf_counter() - start) * 1000
+
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            return sorted(pool.map(timed, inputs))
+
+    @pytest.mark.performance
+    def test_concurrent_submissions_share_batches(self):
+        """Prompts submitted together are decoded in one call per bucket."""
+        calls = []
+
+        def run_batch(prompts, gen_kwargs):
+            calls.append(list(prompts))
+            time.sleep(0.01)
+            return [p.upper() for p in prompts]
+
+        batcher = InferenceBatcher(run_batch, max_batch_size=4, max_wait_ms=50).start()
+        try:
+            futures = [batcher.submit(f"parse constraint: {i} from CCE", max_new_tokens=8) for i in range(4)]
+            futures.append(batcher.submit("answer question: what is UMAL?", max_new_tokens=8))
+            results = [f.result(timeout=5) for f in futures]
+        finally:
+            batcher.stop()
+
+        assert results[0] == "PARSE CONSTRAINT: 0 FROM CCE"
+        assert sorted(len(c) for c in calls) == [1, 4], "tasks must not share a batch"
+        assert batcher.stats["largest_batch"] == 4
+
+    @pytest.mark.performance
+    def test_batched_p95_not_worse_than_unbatched(self, semantic_parser, test_cases):
+        """Under concurrent load, batching must not regress p95 latency."""
+        inputs = [tc["input"] for tc in test_cases if tc.get("input", "").strip()][:32]
+        clients = 8
+        semantic_parser.parse("Warm up")
+
+        # Unbatched baseline: one generate at a time, as when /chat blocked the event loop
+        lock = threading.Lock()
+
+        def serial_parse(text):
+            with lock:
+                return semantic_parser.parse(text)
+
+        semantic_parser.clear_caches()
+        unbatched = self._concurrent_latencies(serial_parse, inputs, clients)
+
+        semantic_parser.clear_caches()
+        semantic_parser.enable_batching()
+        try:
+            batched = self._concurrent_latencies(semantic_parser.parse, inputs, clients)
+        finally:
+            semantic_parser.disable_batching()
+
+        p95_unbatched = unbatched[int(len(unbatched) * 0.95)]
+        p95_batched = batched[int(len(batched) * 0.95)]
+        logger.info(f"\nConcurrent load ({clients} clients, {len(inputs)} requests):")
+        logger.info(f"  Unbatched P50/P95: {statistics.median(unbatched):.2f} / {p95_unbatched:.2f} ms")
+        logger.info(f"  Batched   P50/P95: {statistics.median(batched):.2f} / {p95_batched:.2f} ms")
+
+        assert p95_batched <= p95_unbatched * 1.10, \
+            f"Batching regressed P95: {p95_batched:.0f}ms vs {p95_unbatched:.0f}ms"
+
+
+class TestInferencePool:
+    """Throughput of generation dispatched to worker processes."""
+
+    @pytest.mark.performance
+    def test_batcher_hands_off_batches(self):
+        """With submit_batch, the batcher keeps dispatching while earlier batches decode."""
+        from concurrent.futures import Future
+
+        in_flight, peak = [], []
+
+        def submit_batch(prompts, gen_kwargs):
+            future = Future()
+            in_flight.append(future)
+            peak.append(len([f for f in in_flight if not f.done()]))
+            threading.Timer(0.05, future.set_result, args=([p.upper() for p in prompts],)).start()
+            return future
+
+        batcher = InferenceBatcher(lambda prompts, kw: [], max_batch_size=2, max_wait_ms=1,
+                                   submit_batch=submit_batch).start()
+        try:
+            futures = [batcher.submit(f"parse constraint: {i} from CCE", max_new_tokens=8) for i in range(8)]
+            results = [f.result(timeout=5) for f in futures]
+        finally:
+            batcher.stop()
+
+        assert results[3] == "PARSE CONSTRAINT: 3 FROM CCE"
+        assert max(peak) > 1, "batches must overlap instead of decoding one at a time"
+
+    @pytest.mark.performance
+    def test_throughput_scales_with_workers(self, semantic_parser, test_cases):
+        """Requests/s at 1 worker vs one worker per core (up to 4)."""
+        import os
+
+        inputs = [tc["input"] for tc in test_cases if tc.get("input", "").strip()][:48]
+        cores = min(4, os.cpu_count() or 1)
+
+        def throughput(workers: int) -> float:
+            semantic_parser.enable_pool(workers=workers, threads=1)
+            semantic_parser.enable_batching()
+            try:
+                semantic_parser.clear_caches()
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=16) as pool:
+                    list(pool.map(semantic_parser.parse, inputs))
+                return len(inputs) / (time.perf_counter() - start)
+            finally:
+                semantic_parser.disable_batching()
+                semantic_parser.disable_pool()
+                semantic_parser.clear_caches()
+
+        single = throughput(1)
+        scaled = throughput(cores) if cores > 1 else single
+        efficiency = scaled / (single * cores)
+        logger.info(f"\n{'Inference Pool':-^50}")
+        logger.info(f"  1 worker: {single:.1f} req/s, {cores} workers: {scaled:.1f} req/s "
+                    f"({scaled / single:.2f}x, {efficiency:.0%} of linear)")
+        if cores < 2:
+            pytest.skip("single-core host: nothing to scale across")
+        assert efficiency >= 0.5, f"pool scaling only {efficiency:.0%} of linear on {cores} cores"
+
+
+class TestInferenceExecutor:
+    """Bounded off-loop execution of blocking inference."""
+
+    @pytest.mark.performance
+    def test_event_loop_stays_responsive(self):
+        """A slow decode must not block other coroutines on the loop."""
+        executor = InferenceExecutor(max_in_flight=1, max_queue=1)
+
+        async def scenario():
+            slow = asyncio.ensure_future(executor.run(time.sleep, 0.3))
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            loop_latency_ms = (time.perf_counter() - start) * 1000
+            await slow
+            return loop_latency_ms
+
+        try:
+            loop_latency_ms = asyncio.run(scenario())
+        finally:
+            executor.shutdown()
+        logger.info(f"\nEvent loop latency during decode: {loop_latency_ms:.2f}ms")
+        assert loop_latency_ms < 100
+
+    @pytest.mark.performance
+    def test_full_queue_fails_fast(self):
+        """Beyond in-flight + queue capacity, requests are rejected immediately."""
+        executor = InferenceExecutor(max_in_flight=1, max_queue=1)
+        release = threading.Event()
+
+        async def scenario():
+            running = asyncio.ensure_future(executor.run(release.wait))
+            queued = asyncio.ensure_future(executor.run(release.wait))
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            with pytest.raises(InferenceQueueFull) as exc:
+                await executor.run(release.wait)
+            rejected_ms = (time.perf_counter() - start) * 1000
+            stats = executor.stats()
+            release.set()
+            await asyncio.gather(running, queued)
+            return rejected_ms, exc.value.retry_after, stats
+
+        try:
+            rejected_ms, retry_after, stats = asyncio.run(scenario())
+        finally:
+            executor.shutdown()
+        assert rejected_ms < 50
+        assert retry_after >= 1
+        assert stats["in_flight"] == 1 and stats["queue_depth"] == 1
+        assert stats["rejected"] == 1
+
+    @pytest.mark.performance
+    def test_burst_is_rejected_beyond_capacity(self):
+        """A burst submitted in one go is capped at in-flight + queue capacity, the rest fail fast."""
+        import sys
+
+        executor = InferenceExecutor(max_in_flight=2, max_queue=2)
+        for f in [executor.submit(time.sleep, 0.01) for _ in range(2)]:
+            f.result(5)             # both workers now idle, waiting for work
+        time.sleep(0.05)
+        accepted, rejected = [], 0
+        # Keep the woken workers off the GIL while the burst is submitted, as
+        # on a busy box: neither has claimed a job when the last one arrives
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1.0)
+        try:
+            start = time.perf_counter()
+            for _ in range(50):
+                try:
+                    accepted.append(executor.submit(time.sleep, 0.2))
+                except InferenceQueueFull:
+                    rejected += 1
+            rejected_ms = (time.perf_counter() - start) * 1000
+        finally:
+            sys.setswitchinterval(interval)
+        try:
+            for f in accepted:
+                f.result(5)
+        finally:
+            executor.shutdown()
+        logger.info(f"\nBurst of 50 on 2 + 2 slots: {len(accepted)} accepted, {rejected} rejected in {rejected_ms:.1f}ms")
+        assert len(accepted) == 4 and rejected == 46
+        assert executor.stats()["rejected"] == 46
+
+    @pytest.mark.performance
+    def test_cheap_turn_skips_backlog(self):
+        """A cheap turn behind a queue of Q&A generations waits for one, not all of them."""
+        from inference_executor import CHEAP, LONG
+
+        executor = InferenceExecutor(max_in_flight=1, max_queue=16)
+        try:
+            backlog = [executor.submit(time.sleep, 0.1, priority=LONG) for _ in range(8)]
+            time.sleep(0.01)
+            start = time.perf_counter()
+            executor.submit(lambda: None, priority=CHEAP).result(5)
+            cheap_ms = (time.perf_counter() - start) * 1000
+            for f in backlog:
+                f.result(5)
+        finally:
+            executor.shutdown()
+        logger.info(f"\nCheap turn behind 8 queued 100ms generations: {cheap_ms:.0f}ms")
+        assert cheap_ms < 250
+
+
+# Runs in a fresh interpreter so each backend's RSS is measured in isolation
+BACKEND_PROBE = """
+import json, sys, time, psutil
+sys.path.insert(0, sys.argv[1])
+proc = psutil.Process()
+rss_start = proc.memory_info().rss
+from semantic_parser import SemanticParser
+parser = SemanticParser(backend=sys.argv[2])
+rss_loaded = proc.memory_info().rss
+parser._parse_t5("Warm up")
+latencies = []
+for text in json.loads(sys.stdin.read()):
+    start = time.perf_counter()
+    parser._parse_t5(text)
+    latencies.append((time.perf_counter() - start) * 1000)
+print(json.dumps({
+    "backend": parser.backend,
+    "model_rss_mb": (rss_loaded - rss_start) / 2**20,
+    "peak_rss_mb": proc.memory_info().rss / 2**20,
+    "latencies_ms": latencies,
+}))
+"""
+
+
+class TestBackendComparison:
+    """PyTorch vs ONNX Runtime inference backends."""
+
+    @staticmethod
+    def _probe(backend: str, inputs: List[str]) -> Dict[str, Any]:
+        proc = subprocess.run(
+            [sys.executable, "-c", BACKEND_PROBE, str(Path(__file__).parent.parent), backend],
+            input=json.dumps(inputs), capture_output=True, text=True, timeout=900,
+        )
+        assert proc.returncode == 0, proc.stderr[-2000:]
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    @pytest.mark.performance
+    def test_onnx_vs_torch_latency_and_rss(self, semantic_parser, corpus_inputs):
+        """Report latency and memory difference between the two backends."""
+        pytest.importorskip("optimum.onnxruntime")
+        inputs = [text for text in corpus_inputs if text.strip()][:30]
+
+        results = {backend: self._probe(backend, inputs) for backend in ("torch", "onnx")}
+        if results["onnx"]["backend"] != "onnx":
+            pytest.skip("No usable ONNX export — run: python export_onnx.py")
+
+        logger.info(f"\n{'Backend Comparison':-^50}")
+        for backend, r in results.items():
+            lat = sorted(r["latencies_ms"])
+            logger.info(
+                f"  {backend:5s}: P50 {statistics.median(lat):7.2f}ms  "
+                f"P95 {lat[int(len(lat) * 0.95)]:7.2f}ms  "
+                f"model RSS {r['model_rss_mb']:7.1f}MB  peak RSS {r['peak_rss_mb']:7.1f}MB"
+            )
+        speedup = statistics.mean(results["torch"]["latencies_ms"]) / statistics.mean(results["onnx"]["latencies_ms"])
+        rss_delta = results["onnx"]["peak_rss_mb"] - results["torch"]["peak_rss_mb"]
+        logger.info(f"  ONNX speedup: {speedup:.2f}x, peak RSS delta: {rss_delta:+.1f}MB")
+
+
+class TestConstrainedDecodingSpeed:
+    """Greedy schema-constrained decoding vs 4-beam free decoding."""
+
+    @pytest.mark.performance
+    def test_constrained_faster_than_beam(self, semantic_parser, corpus_inputs):
+        inputs = [text for text in corpus_inputs if text.strip()][:20]
+
+        def p50(parser) -> float:
+            parser.clear_caches()
+            latencies = []
+            for text in inputs:
+                start = time.perf_counter()
+                parser._parse_t5(text)
+                latencies.append((time.perf_counter() - start) * 1000)
+            return statistics.median(latencies)
+
+        beam_ms = p50(semantic_parser)
+        semantic_parser.enable_constrained_decoding()
+        try:
+            constrained_ms = p50(semantic_parser)
+        finally:
+            semantic_parser.disable_constrained_decoding()
+
+        logger.info(f"\nParse P50: 4-beam free {beam_ms:.2f}ms, greedy constrained {constrained_ms:.2f}ms "
+                    f"({beam_ms / constrained_ms:.2f}x)")
+        assert constrained_ms <= beam_ms
+
+
+class TestAdaptiveDecoding:
+    """Escalation rate and latency of greedy-first decoding vs always-beam."""
+
+    @pytest.mark.performance
+    def test_escalation_rate_and_latency_saved(self, semantic_parser, corpus_inputs):
+        inputs = [text for text in corpus_inputs if text.strip()][:30]
+
+        def mean_ms(adaptive: bool) -> float:
+            semantic_parser._adaptive = adaptive
+            semantic_parser.clear_caches()
+            start = time.perf_counter()
+            for text in inputs:
+                semantic_parser._parse_t5(text)
+            return (time.perf_counter() - start) * 1000 / len(inputs)
+
+        original = semantic_parser._adaptive
+        try:
+            beam_ms = mean_ms(False)
+            before = semantic_parser.stats()["decoding"]
+            adaptive_ms = mean_ms(True)
+            after = semantic_parser.stats()["decoding"]
+        finally:
+            semantic_parser._adaptive = original
+
+        greedy = after["greedy_accepted"] - before["greedy_accepted"]
+        escalated = after["escalated"] - before["escalated"]
+        assert greedy + escalated == len(inputs)
+
+        logger.info(f"\n{'Adaptive Decoding':-^50}")
+        logger.info(f"  Greedy accepted: {greedy}/{len(inputs)}  escalated: {escalated} "
+                    f"({escalated / len(inputs):.1%})")
+        logger.info(f"  Mean parse: always-beam {beam_ms:.2f}ms, adaptive {adaptive_ms:.2f}ms "
+                    f"(saved {beam_ms - adaptive_ms:+.2f}ms/request)")
+
+
+class TestGenerationLimits:
+    """Decoder steps saved by the balanced-JSON stop and adaptive output budgets."""
+
+    @pytest.mark.performance
+    def test_decoder_steps_saved(self, semantic_parser, corpus_inputs):
+        inputs = [text for text in corpus_inputs if text.strip()][:30]
+
+        def avg_steps(limits: bool) -> float:
+            semantic_parser._stop_balanced = limits
+            semantic_parser._budgets_enabled = limits
+            semantic_parser.clear_caches()
+            before = semantic_parser.stats()["output_budgets"].get("parse constraint", {})
+            for text in inputs:
+                semantic_parser._parse_t5(text)
+            after = semantic_parser.stats()["output_budgets"]["parse constraint"]
+            calls = after["calls"] - before.get("calls", 0)
+            steps = after["avg_steps"] * after["calls"] - before.get("avg_steps", 0) * before.get("calls", 0)
+            return steps / calls
+
+        original = (semantic_parser._stop_balanced, semantic_parser._budgets_enabled)
+        try:
+            unlimited = avg_steps(False)
+            limited = avg_steps(True)
+        finally:
+            semantic_parser._stop_balanced, semantic_parser._budgets_enabled = original
+
+        budget = semantic_parser.stats()["output_budgets"]["parse constraint"]
+        logger.info(f"\n{'Generation Limits':-^50}")
+        logger.info(f"  Avg decoder steps per parse generate: {unlimited:.1f} → {limited:.1f} "
+                    f"(saved {unlimited - limited:.1f})")
+        logger.info(f"  Stopped early: {budget['stopped_early']}  truncated: {budget['truncated']}  "
+                    f"fit: {budget['fit']}")
+        assert limited <= unlimited
+
+
+class TestHistoryReconstruction:
+    """Rebuilding merged state from a long history: batched vs turn by turn."""
+
+    HISTORY = [
+        "2 from CCE and 1 from CTE", "Make them all females please", "Prioritize best attendance",
+        "Add 1 veteran from CEE", "No class conflicts", "Actually 3 from CCE",
+        "Experienced members only", "Include 2 from CAFE as well", "Tallest first", "Same as before but males",
+    ]
+
+    @pytest.mark.performance
+    def test_batched_reconstruction_latency(self, semantic_parser):
+        def rebuild(parse_all) -> float:
+            semantic_parser.clear_caches()
+            start = time.perf_counter()
+            state = {"groups": [], "global": {"conflict_ok": None, "priority_rules": []}, "is_confirming": False}
+            for parsed in parse_all(self.HISTORY):
+                state = semantic_parser.merge(state, parsed)
+            return (time.perf_counter() - start) * 1000
+
+        sequential_ms = rebuild(lambda turns: [semantic_parser.parse(t) for t in turns])
+        batched_ms = rebuild(semantic_parser.parse_many)
+
+        logger.info(f"\n{'History Reconstruction':-^50}")
+        logger.info(f"  {len(self.HISTORY)} user turns: sequential {sequential_ms:.0f}ms → "
+                    f"batched {batched_ms:.0f}ms ({sequential_ms / batched_ms:.1f}x)")
+        assert batched_ms < sequential_ms
+
+
+class TestWarmup:
+    """First-request latency of a fresh parser, with and without warmup()."""
+
+    @pytest.mark.performance
+    def test_warmup_removes_cold_start(self, semantic_parser):
+        from semantic_parser import SemanticParser
+
+        def parse_ms(parser) -> float:
+            start = time.perf_counter()
+            parser._parse_t5("I need 3 females from CCE")
+            return (time.perf_counter() - start) * 1000
+
+        def first_parse_ms(warm: bool) -> float:
+            parser = SemanticParser(backend=semantic_parser.backend)
+            if warm:
+                parser.warmup()
+            return parse_ms(parser)
+
+        cold_ms = first_parse_ms(warm=False)
+        warm_ms = first_parse_ms(warm=True)
+        steady_ms = min(parse_ms(semantic_parser) for _ in range(3))
+        logger.info(f"\n{'Warmup':-^50}")
+        logger.info(f"  First parse: cold {cold_ms:.0f}ms, after warmup {warm_ms:.0f}ms, steady {steady_ms:.0f}ms")
+        # In one test process torch itself is already warm, so only the warmed
+        # parser's first call is gated: it should look like a steady-state call
+        assert warm_ms < 2 * steady_ms + 100
+
+
+class TestStreaming:
+    """Time to the first streamed reply piece vs the whole reply."""
+
+    @pytest.mark.performance
+    def test_first_piece_before_full_reply(self, semantic_parser):
+        state = {"groups": [{"count": 2, "college": "CCE", "gender": "F"}, {"count": 1, "new_old": "old"}]}
+        semantic_parser.clear_caches()
+        start = time.perf_counter()
+        arrivals = [time.perf_counter() - start for _ in semantic_parser.stream_reply_from_json(state)]
+        total_ms, first_ms = arrivals[-1] * 1000, arrivals[0] * 1000
+
+        semantic_parser.clear_caches()
+        start = time.perf_counter()
+        semantic_parser.generate_reply_from_json(state)
+        blocking_ms = (time.perf_counter() - start) * 1000
+
+        logger.info(f"\n{'Reply streaming':-^50}")
+        logger.info(f"  First piece {first_ms:.0f}ms, last {total_ms:.0f}ms ({len(arrivals)} pieces), "
+                    f"non-streaming {blocking_ms:.0f}ms")
+        if len(arrivals) > 3:       # a template or cached reply arrives whole
+            assert first_ms < total_ms / 2
+
+
+class TestMetrics:
+    """Metrics must stay within a few microseconds per request."""
+
+    @pytest.mark.performance
+    def test_observation_overhead(self, semantic_parser):
+        import service_metrics
+        from service_metrics import Histogram
+
+        hist = Histogram("bench_seconds", "Bench.", ("stage",))
+        n = 100_000
+        start = time.perf_counter()
+        for i in range(n):
+            hist.observe(0.003, "decode")
+        per_observe_us = (time.perf_counter() - start) / n * 1e6
+
+        # How many observations one uncached constraint turn records
+        histograms = [service_metrics.STAGE_SECONDS, service_metrics.REPAIR_SECONDS,
+                      service_metrics.INPUT_TOKENS, service_metrics.OUTPUT_TOKENS]
+
+        def observations():
+            return sum(count for h in histograms for _, _, count in h.snapshot().values())
+
+        semantic_parser.clear_caches()
+        before = observations()
+        merged = semantic_parser.merge({"groups": [], "global": {}}, semantic_parser.parse("2 females from CCE"))
+        semantic_parser.generate_reply_from_json(merged)
+        per_turn = observations() - before + 6      # + intent, parse, history, merge, reply, chat recorded by main.py
+
+        logger.info(f"\n{'Metrics overhead':-^50}")
+        logger.info(f"  {per_observe_us:.2f}µs per observation, {per_turn} per turn "
+                    f"→ {per_observe_us * per_turn:.1f}µs per request")
+        assert per_observe_us < 5
+        assert per_observe_us * per_turn < 50
+
+
+class TestProfiling:
+    """With no profiling session running, wrapping a turn must cost next to nothing."""
+
+    @pytest.mark.performance
+    def test_overhead_while_off(self):
+        import profiling
+
+        assert profiling.active() is None
+        n = 100_000
+        start = time.perf_counter()
+        for _ in range(n):
+            with profiling.request():
+                pass
+        per_turn_us = (time.perf_counter() - start) / n * 1e6
+
+        logger.info(f"\n{'Profiling hook (off)':-^50}")
+        logger.info(f"  {per_turn_us:.3f}µs per turn")
+        assert per_turn_us < 2
+
+
+class TestSingleFlight:
+    """A burst of identical messages should cost about one decode, not one each."""
+
+    @pytest.mark.performance
+    def test_identical_burst(self, semantic_parser, monkeypatch):
+        monkeypatch.setattr(semantic_parser, "_fast_path", None)
+        text = "2 females from CCE and 1 veteran male from CEE, no class conflicts"
+        burst = 8
+
+        semantic_parser.clear_caches()
+        start = time.perf_counter()
+        semantic_parser.parse(text)
+        single_ms = (time.perf_counter() - start) * 1000
+
+        before = semantic_parser.stats()["single_flight"]["tasks"]["parse"]["coalesced"]
+        semantic_parser.clear_caches()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=burst) as pool:
+            list(pool.map(semantic_parser.parse, [text] * burst))
+        burst_ms = (time.perf_counter() - start) * 1000
+        coalesced = semantic_parser.stats()["single_flight"]["tasks"]["parse"]["coalesced"] - before
+
+        logger.info(f"\n{'Single-flight burst':-^50}")
+        logger.info(f"  one parse {single_ms:.0f}ms, {burst} identical at once {burst_ms:.0f}ms "
+                    f"({coalesced} coalesced)")
+        assert coalesced >= burst // 2
+        assert burst_ms < single_ms * burst / 2
+
+
 @pytest.fixture(scope="session", autouse=True)
 def performance_report(request):
     """Generate performance report after all tests."""
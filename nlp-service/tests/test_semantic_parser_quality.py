@@ -17,6 +17,8 @@ import json
 import logging
 from typing import Dict, Any, List, Tuple
 
+import semantic_parser as semantic_parser_module
+
 logger = logging.getLogger(__name__)
 
 
@@ -929,4 +931,133 @@ class TestT5MultiTurnHallucination:
             assert "count" not in g or g["count"] is None, (
                 f"COUNT HALLUCINATION in modifier context: T5 invented count={g.get('count')} "
                 f"for 'switch to CEE'. group={g}"
-            )
\ No newline at end of file
+            )
+
+class TestOnnxBackendParity:
+    """ONNX Runtime backend must reproduce the PyTorch backend's outputs."""
+
+    @pytest.fixture(scope="class")
+    def onnx_parser(self):
+        pytest.importorskip("optimum.onnxruntime")
+        if not (semantic_parser_module.ONNX_DIR / semantic_parser_module.ONNX_MANIFEST).exists():
+            pytest.skip("No ONNX export — run: python export_onnx.py")
+        parser = semantic_parser_module.SemanticParser(backend="onnx")
+        if parser.backend != "onnx":
+            pytest.skip("ONNX export could not be loaded (stale or incompatible)")
+        return parser
+
+    def test_identical_validated_outputs_on_corpus(self, semantic_parser, onnx_parser, corpus_inputs):
+        """Every test_cases.json message parses to the same validated schema."""
+        mismatches = []
+        for text in corpus_inputs:
+            expected = semantic_parser._parse_t5(text)
+            actual = onnx_parser._parse_t5(text)
+            if actual != expected:
+                mismatches.append((text, expected, actual))
+
+        logger.info(f"\nONNX parity: {len(corpus_inputs) - len(mismatches)}/{len(corpus_inputs)} identical")
+        for text, expected, actual in mismatches[:5]:
+            logger.info(f"  {text!r}: torch={expected} onnx={actual}")
+        assert not mismatches, f"{len(mismatches)} outputs differ between backends"
+
+    def test_identical_replies(self, semantic_parser, onnx_parser):
+        merged = {"groups": [{"count": 2, "college": "CCE", "gender": "F"}],
+                  "global": {"conflict_ok": False, "priority_rules": []}}
+        assert onnx_parser._generate_text(
+            "generate reply: " + json.dumps(merged), max_tokens=128, temperature=0.0
+        ) == semantic_parser._generate_text(
+            "generate reply: " + json.dumps(merged), max_tokens=128, temperature=0.0
+        )
+
+
+class TestInt8QuantizationGate:
+    """int8 mode is only enabled for weights that passed quantize_gate.py."""
+
+    @pytest.fixture
+    def gate_file(self, tmp_path, monkeypatch):
+        path = tmp_path / "quantization_gate.json"
+        monkeypatch.setattr(semantic_parser_module, "QUANT_GATE_FILE", path)
+        return path
+
+    def test_gate_status(self, gate_file):
+        status = semantic_parser_module.int8_gate_status
+        assert status("abc123")[0] is False                       # never gated
+
+        gate_file.write_text(json.dumps({"model_version": "abc123", "approved": False, "drop": 0.1}))
+        assert status("abc123")[0] is False                       # rejected
+
+        gate_file.write_text(json.dumps({"model_version": "abc123", "approved": True, "drop": 0.0}))
+        assert status("abc123") == (True, "approved")
+        assert status("def456")[0] is False                       # retrained since
+
+    def test_exact_match_ignores_group_order(self):
+        from quantize_gate import exact_match
+
+        expected = {"groups": [{"count": 2, "college": "CCE"}, {"count": 1, "gender": "F"}],
+                    "global": {"conflict_ok": False}}
+        result = {"groups": [{"count": 1, "gender": "F"}, {"count": 2, "college": "CCE"}],
+                  "global": {"conflict_ok": False, "priority_rules": []}, "is_confirming": False}
+        assert exact_match(result, expected)
+        result["global"]["conflict_ok"] = True
+        assert not exact_match(result, expected)
+
+    def test_unapproved_int8_loads_fp32(self, semantic_parser, gate_file):
+        parser = semantic_parser_module.SemanticParser(backend="torch", quantize="int8")
+        assert parser.is_fine_tuned
+        assert parser.quantization is None
+
+    def test_int8_accuracy_within_gate(self, semantic_parser, test_cases):
+        """The int8 model stays within the gate's exact-match budget on test_cases.json."""
+        from quantize_gate import DEFAULT_MAX_DROP, evaluate
+
+        int8 = semantic_parser_module.SemanticParser(backend="torch", quantize="int8",
+                                                     enforce_quant_gate=False)
+        assert int8.quantization == "int8"
+        cases = [tc for tc in test_cases if "expected_output" in tc]
+        fp32_eval = evaluate(semantic_parser, cases)
+        int8_eval = evaluate(int8, cases)
+
+        logger.info(f"\nint8 gate: exact match fp32={fp32_eval['exact_match']:.1%} "
+                    f"int8={int8_eval['exact_match']:.1%}, p50 "
+                    f"{fp32_eval['p50_ms']:.1f}ms → {int8_eval['p50_ms']:.1f}ms")
+        assert fp32_eval["exact_match"] - int8_eval["exact_match"] <= DEFAULT_MAX_DROP
+
+
+class TestRuleFastPathAgreement:
+    """The rule fast path must never answer differently from the labels."""
+
+    def test_covered_cases_match_expected(self, test_cases):
+        from fast_path import RuleParser
+
+        rules = RuleParser()
+        cases = [tc for tc in test_cases if tc.get("type") != "multi_turn" and "expected_output" in tc]
+        covered, wrong = 0, []
+        for tc in cases:
+            result = rules.parse(tc["input"])
+            if result is None:
+                continue
+            covered += 1
+            expected = tc["expected_output"]
+            if sorted(json.dumps(g, sort_keys=True) for g in result.get("groups", [])) != \
+               sorted(json.dumps(g, sort_keys=True) for g in expected.get("groups", [])):
+                wrong.append((tc["input"], expected, result))
+
+        logger.info(f"\nRule fast path: answered {covered}/{len(cases)} single-turn cases")
+        assert covered > 0
+        assert not wrong, f"Fast path disagrees with labels: {wrong[:3]}"
+
+    def test_agreement_with_t5(self, semantic_parser, corpus_inputs):
+        """Covered messages parse to the same groups through T5 (logged, not gated)."""
+        from fast_path import RuleParser
+
+        rules = RuleParser()
+        covered = agree = 0
+        for text in corpus_inputs:
+            raw = rules.parse(text)
+            if raw is None:
+                continue
+            covered += 1
+            agree += semantic_parser_module._validate(raw)["groups"] == semantic_parser._parse_t5(text)["groups"]
+        logger.info(f"\nRule fast path: coverage {covered}/{len(corpus_inputs)}, "
+                    f"agreement with T5 {agree}/{covered}")
+        assert covered > 0
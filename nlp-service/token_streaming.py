@@ -0,0 +1,117 @@
+"""
+Token Streaming
+===============
+Text from T5 while it decodes, instead of after the last decoder step.
+
+TokenStream
+    A transformers streamer.  generate() runs on a helper thread and hands it
+    every new token; the request thread iterates the stream and gets text
+    pieces as soon as they are printable.  Closing the stream makes the next
+    put() raise, which ends generate() early when the client has gone away.
+
+IncrementalDetokenizer
+    Decoding one token at a time is wrong for SentencePiece: "▁" pieces carry
+    the space before a word, and byte-fallback pieces only form a character
+    together.  Instead, each step decodes a short window — the tokens since
+    the last emitted piece plus the ones just before them — and emits what
+    the new tokens added, holding text back while it ends in an incomplete
+    character (U+FFFD).  The pieces concatenate to decode(all tokens).
+
+Tokens are detokenized on the consuming thread under the parser's tokenizer
+lock (fast tokenizers are not thread-safe), which is why this is not
+transformers' TextIteratorStreamer: that one decodes on the generate thread.
+"""
+
+import queue
+import threading
+from typing import Iterator, List, Optional
+
+from transformers.generation import BaseStreamer
+
+_END = object()
+
+
+class StreamCancelled(Exception):
+    """Raised inside generate() once the consumer has closed the stream."""
+
+
+class IncrementalDetokenizer:
+    """Token ids in, text deltas out (see module docstring)."""
+
+    def __init__(self, tokenizer, lock: Optional[threading.Lock] = None):
+        self._tokenizer = tokenizer
+        self._lock = lock or threading.Lock()
+        self.token_ids: List[int] = []
+        self._prefix = 0    # start of the decode window
+        self._read = 0      # tokens already turned into emitted text
+
+    def push(self, token_ids: List[int]) -> str:
+        """Add tokens; return the text they completed ("" if none yet)."""
+        self.token_ids.extend(token_ids)
+        prefix_text, text = self._decode_window()
+        if len(text) <= len(prefix_text) or text.endswith("\ufffd"):
+            return ""
+        self._prefix, self._read = self._read, len(self.token_ids)
+        return text[len(prefix_text):]
+
+    def flush(self) -> str:
+        """Whatever is still held back, once no more tokens will come."""
+        prefix_text, text = self._decode_window()
+        self._prefix = self._read = len(self.token_ids)
+        return text[len(prefix_text):]
+
+    def _decode_window(self):
+        with self._lock:
+            decode = self._tokenizer.decode
+            return (
+                decode(self.token_ids[self._prefix:self._read], skip_special_tokens=True),
+                decode(self.token_ids[self._prefix:], skip_special_tokens=True),
+            )
+
+
+class TokenStream(BaseStreamer):
+    """
+    Streamer for one generate() call with batch size 1.  Iterate it on the
+    consuming thread; every token generate() produced is kept in
+    `token_ids` (decoder start token first, like a row of generate's output).
+    """
+
+    def __init__(self, detokenizer: IncrementalDetokenizer):
+        self._detokenizer = detokenizer
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = threading.Event()
+
+    @property
+    def token_ids(self) -> List[int]:
+        return self._detokenizer.token_ids
+
+    # Called by generate() on its own thread
+    def put(self, value):
+        if self._closed.is_set():
+            raise StreamCancelled()
+        self._queue.put(value.reshape(-1).tolist())
+
+    def end(self):
+        self._queue.put(_END)
+
+    def fail(self, error: BaseException):
+        """Hand an exception from the generate thread to the consumer."""
+        self._queue.put(error)
+
+    def close(self):
+        """Stop generate() at its next step; the consumer is no longer reading."""
+        self._closed.set()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                tail = self._detokenizer.flush()
+                if tail:
+                    yield tail
+                return
+            if isinstance(item, BaseException):
+                raise item
+            delta = self._detokenizer.push(item)
+            if delta:
+                yield delta